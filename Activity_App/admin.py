@@ -1,10 +1,18 @@
 from django.contrib import admin
-from .models import Activity
+from .models import Activity, EmissionFactor
 
 
 @admin.register(Activity)
 class ActivityAdmin(admin.ModelAdmin):
 	list_display = ('id', 'user', 'category', 'subtype', 'impact', 'date', 'created_at')
-	list_filter = ('category', 'date')
+	list_filter = ('category', 'impact_unrated', 'date')
 	search_fields = ('user__username', 'subtype')
 	readonly_fields = ('created_at',)
+
+
+@admin.register(EmissionFactor)
+class EmissionFactorAdmin(admin.ModelAdmin):
+	list_display = ('category', 'subtype', 'basis', 'factor', 'version', 'effective_from')
+	list_filter = ('category', 'basis')
+	search_fields = ('subtype',)
+	readonly_fields = ('version', 'created_at')
@@ -0,0 +1,54 @@
+"""Filling ``Activity.effective_date`` for rows written without it.
+
+save() and the API write paths set the column themselves; rows from before it
+existed (and raw inserts) are filled here. An undated activity counts for the
+day it was logged in its user's timezone, so the rows are updated one zone at
+a time: once per zone some profile selects, then once more in the site
+default for everyone else.
+"""
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+
+from EcoTrack.days import default_timezone_name, is_valid_timezone, local_date_expression
+
+from .models import Activity
+
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _fill(activities, tz, chunk_size, last_pk):
+	value = Coalesce('date', local_date_expression('created_at', tz))
+	if chunk_size is None:
+		return activities.update(effective_date=value)
+	filled = 0
+	# by primary key range, so no single statement holds the table for long
+	for start in range(0, last_pk, chunk_size):
+		filled += activities.filter(id__gt=start, id__lte=start + chunk_size).update(effective_date=value)
+	return filled
+
+
+def fill_effective_dates(user_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+	"""Set the missing effective dates of ``user_ids``' activities, or everyone's; returns rows filled.
+
+	A few users' rows are updated in one statement per zone; the whole table
+	in ``chunk_size`` primary key ranges.
+	"""
+	from Profile_App.models import Profile
+
+	missing = Activity.objects.filter(effective_date__isnull=True)
+	profiles = Profile.objects.exclude(timezone='')
+	last_pk = 0
+	if user_ids is not None:
+		missing = missing.filter(user_id__in=user_ids)
+		profiles = profiles.filter(user_id__in=user_ids)
+		chunk_size = None
+	else:
+		last_pk = Activity.objects.aggregate(m=Max('id'))['m'] or 0
+
+	filled = 0
+	zones = {name for name in profiles.values_list('timezone', flat=True).distinct() if is_valid_timezone(name)}
+	for name in sorted(zones):
+		filled += _fill(missing.filter(user__profile__timezone=name), name, chunk_size, last_pk)
+	# no profile, no zone set, or one this system doesn't know: the site default (see user_timezone)
+	return filled + _fill(missing, default_timezone_name(), chunk_size, last_pk)
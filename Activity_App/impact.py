@@ -0,0 +1,201 @@
+"""Server-side impact computation from the ``EmissionFactor`` catalogue.
+
+The catalogue is loaded once per process and kept in memory. EmissionFactor
+signals bump a version number in Django's cache, which makes every process
+reload on its next lookup. ``DEFAULT_FACTORS`` hold the values the activity
+page used to hardcode. They apply to any (category, subtype) until an
+EmissionFactor row takes effect for it.
+"""
+import hashlib
+import threading
+from bisect import bisect_right
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.cache import cache
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from .models import Activity, EmissionFactor
+
+
+VERSION_CACHE_KEY = 'emission-factors:version'
+TWO_PLACES = Decimal('0.01')
+
+# (category, subtype) -> (basis, kg CO2 per unit)
+DEFAULT_FACTORS = {
+	('transportation', 'car'): (EmissionFactor.BASIS_DISTANCE, '0.21'),
+	('transportation', 'bus'): (EmissionFactor.BASIS_DISTANCE, '0.1'),
+	('transportation', 'train'): (EmissionFactor.BASIS_DISTANCE, '0.04'),
+	('transportation', 'bicycle'): (EmissionFactor.BASIS_DISTANCE, '0'),
+	('transportation', 'walk'): (EmissionFactor.BASIS_DISTANCE, '0'),
+	('diet', 'vegetarian'): (EmissionFactor.BASIS_FIXED, '1.7'),
+	('diet', 'vegan'): (EmissionFactor.BASIS_FIXED, '1.5'),
+	('diet', 'meat'): (EmissionFactor.BASIS_FIXED, '6.0'),
+	('diet', 'fish'): (EmissionFactor.BASIS_FIXED, '3.5'),
+	('energy', 'electricity'): (EmissionFactor.BASIS_AMOUNT, '0.5'),
+	('energy', 'heating'): (EmissionFactor.BASIS_AMOUNT, '0.3'),
+	('energy', 'renewable'): (EmissionFactor.BASIS_AMOUNT, '0.05'),
+}
+
+
+class FactorCatalogue:
+	"""Factors per (category, subtype), each a date-sorted list of versions."""
+
+	def __init__(self, rows, version=0):
+		self.version = version
+		# defaults sit underneath as "version 0, since forever"; any row overrides them from its date
+		self._entries = {key: [(date.min, 0, basis, Decimal(factor))] for key, (basis, factor) in DEFAULT_FACTORS.items()}
+		for row in rows:
+			key = (row.category, row.subtype.lower())
+			self._entries.setdefault(key, []).append((row.effective_from, row.version, row.basis, row.factor))
+		for entries in self._entries.values():
+			entries.sort(key=lambda e: (e[0], e[1]))
+		self._starts = {key: [e[0] for e in entries] for key, entries in self._entries.items()}
+		self._fingerprint = None
+
+	@property
+	def fingerprint(self):
+		"""Hash of every factor version (defaults included); changes whenever any computed impact could."""
+		if self._fingerprint is None:
+			digest = hashlib.sha1()
+			for key in sorted(self._entries):
+				for start, version, basis, factor in self._entries[key]:
+					digest.update(f'{key[0]}|{key[1]}|{start.isoformat()}|{version}|{basis}|{factor}\n'.encode())
+			self._fingerprint = digest.hexdigest()
+		return self._fingerprint
+
+	def lookup(self, category, subtype, on=None):
+		"""``(basis, factor, version)`` in effect on ``on`` (default today), or None."""
+		key = ((category or '').lower(), (subtype or '').lower())
+		entries = self._entries.get(key)
+		if not entries:
+			return None
+		i = bisect_right(self._starts[key], on or timezone.now().date())
+		if i == 0:
+			return None
+		_, version, basis, factor = entries[i - 1]
+		return basis, factor, version
+
+	def current(self, on=None):
+		"""``{category: {subtype: {'basis', 'factor'}}}`` in effect on ``on``, for the activity page."""
+		table = {}
+		for category, subtype in self._entries:
+			found = self.lookup(category, subtype, on)
+			if found:
+				table.setdefault(category, {})[subtype] = {'basis': found[0], 'factor': float(found[1])}
+		return table
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def _current_version():
+	try:
+		return cache.get(VERSION_CACHE_KEY, 0)
+	except Exception:
+		return 0
+
+
+def get_factor_catalogue():
+	"""Return the process-wide catalogue, reloading it if missing or stale."""
+	global _catalogue
+	version = _current_version()
+	catalogue = _catalogue
+	if catalogue is not None and catalogue.version == version:
+		return catalogue
+	with _catalogue_lock:
+		if _catalogue is None or _catalogue.version != version:
+			_catalogue = FactorCatalogue(list(EmissionFactor.objects.all()), version=version)
+		return _catalogue
+
+
+def invalidate_factor_catalogue():
+	"""Drop the local catalogue and bump the shared version for other processes."""
+	global _catalogue
+	with _catalogue_lock:
+		_catalogue = None
+	try:
+		cache.add(VERSION_CACHE_KEY, 0, timeout=None)
+		cache.incr(VERSION_CACHE_KEY)
+	except Exception:
+		pass
+
+
+def _as_decimal(value):
+	try:
+		return Decimal(str(value or 0))
+	except Exception:
+		return Decimal('0')
+
+
+def compute_impact(category, subtype, distance=None, amount=None, on=None, catalogue=None):
+	"""kg CO2 for one activity, rounded to 2 places; None when no factor is known."""
+	found = (catalogue or get_factor_catalogue()).lookup(category, subtype, on)
+	if found is None:
+		return None
+	basis, factor, _ = found
+	if basis == EmissionFactor.BASIS_DISTANCE:
+		quantity = _as_decimal(distance)
+	elif basis == EmissionFactor.BASIS_AMOUNT:
+		quantity = _as_decimal(amount)
+	else:
+		quantity = Decimal('1')
+	return (factor * quantity).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def activity_impact(activity, catalogue=None):
+	"""Impact of an Activity under the factors in effect on its date."""
+	return compute_impact(activity.category, activity.subtype, activity.distance, activity.amount, on=activity.date, catalogue=catalogue)
+
+
+def recompute_impacts(after_pk=0, shard=None, chunk_size=2000, on_chunk=None):
+	"""Rewrite ``Activity.impact`` from the catalogue, walking primary keys above ``after_pk``.
+
+	``shard`` is ``(index, count)`` to only visit users with
+	``user_id % count == index``. Rows are streamed in pk order and only
+	changed impacts are written, one ``bulk_update`` per chunk. Unrated rows
+	whose (category, subtype) has gained a factor are rated. Signals do
+	not fire, so derived aggregates must be rebuilt by the caller.
+	``on_chunk(last_pk, scanned, updated, user_ids)`` is called after each
+	chunk is written. Returns ``(scanned, updated, user_ids)`` where
+	``user_ids`` are the users whose impacts changed.
+	"""
+	catalogue = get_factor_catalogue()
+	qs = Activity.objects.filter(pk__gt=after_pk)
+	if shard is not None:
+		index, count = shard
+		qs = qs.annotate(shard=Mod('user_id', count)).filter(shard=index)
+	qs = qs.order_by('pk').only('id', 'user_id', 'category', 'subtype', 'distance', 'amount', 'impact', 'impact_unrated', 'date')
+
+	scanned = updated = 0
+	changed_users = set()
+
+	def flush(chunk):
+		nonlocal scanned, updated
+		changed = []
+		for activity in chunk:
+			impact = activity_impact(activity, catalogue)
+			if impact is not None and (impact != activity.impact or activity.impact_unrated):
+				activity.impact = impact
+				activity.impact_unrated = False
+				changed.append(activity)
+		if changed:
+			Activity.objects.bulk_update(changed, ['impact', 'impact_unrated'], batch_size=500)
+		scanned += len(chunk)
+		updated += len(changed)
+		chunk_users = {a.user_id for a in changed}
+		changed_users.update(chunk_users)
+		if on_chunk is not None:
+			on_chunk(chunk[-1].pk, len(chunk), len(changed), chunk_users)
+
+	chunk = []
+	for activity in qs.iterator(chunk_size=chunk_size):
+		chunk.append(activity)
+		if len(chunk) >= chunk_size:
+			flush(chunk)
+			chunk = []
+	if chunk:
+		flush(chunk)
+	return scanned, updated, changed_users
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Activity_App.effective_dates import DEFAULT_CHUNK_SIZE, fill_effective_dates
+
+
+class Command(BaseCommand):
+	help = (
+		'Fill Activity.effective_date (the history sort key) for rows written before the column existed. '
+		'build.sh runs it on every deploy; new rows get the key on save. Safe to re-run.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+			help=f'Rows per UPDATE, by primary key range, so no single statement holds the table for long (default {DEFAULT_CHUNK_SIZE}).')
+
+	def handle(self, *args, **options):
+		chunk = options['chunk_size']
+		if chunk < 1:
+			raise CommandError('--chunk-size must be at least 1.')
+		filled = fill_effective_dates(chunk_size=chunk)
+		self.stdout.write(self.style.SUCCESS(f'Filled the effective date of {filled} activit(ies).'))
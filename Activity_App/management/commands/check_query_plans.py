@@ -0,0 +1,79 @@
+import re
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from Activity_App.models import Activity
+
+
+# Plan lines that mean a full pass over a table rather than an index lookup
+FULL_SCAN_PATTERNS = {
+	# SQLite: "SCAN <table>" (optionally "USING INDEX", which is still a full pass);
+	# "SEARCH" lines are index lookups, "SCAN CONSTANT ROW" is not a table
+	'sqlite': re.compile(r'\bSCAN (?!CONSTANT ROW)(?!\()\S+'),
+	'postgresql': re.compile(r'\bSeq Scan on\b'),
+}
+
+
+def query_shapes(user_id=0):
+	"""The queries the views run on every request, by name.
+
+	Built with a placeholder user id; only the plan matters.
+	"""
+	from Challenges_App.daily import assignments
+	from Dashboard_App.badges import ECO_TRIP_Q, TRIP_DAY
+	from Dashboard_App.models import DailyFootprint
+	from EcoTrack.days import day_cutoff, default_timezone_name, today_q
+	from History_App.export import export_queryset
+	from History_App.views import encode_cursor, history_queryset
+
+	today = date.today()
+	cursor = encode_cursor(Activity(id=1, effective_date=today, created_at=timezone.now()))
+	mine = Activity.objects.filter(user_id=user_id)
+	tz = default_timezone_name()
+	return {
+		'history first page': history_queryset(user_id)[:51],
+		'history next page': history_queryset(user_id, cursor)[:51],
+		'history export': export_queryset(user_id, start=today - timedelta(days=365)),
+		'recent activities': mine.order_by('-created_at')[:20],
+		'category breakdown': mine.values('category').annotate(total=Sum('impact')).order_by(),
+		'today breakdown': mine.filter(today_q('date', tz=tz)).values('category').annotate(total=Sum('impact')).order_by(),
+		'eco trips per day': mine.filter(ECO_TRIP_Q).values(day=TRIP_DAY).annotate(cnt=Count('id')).order_by('-cnt')[:1],
+		'queued evaluations': mine.filter(pending_evaluation=True).order_by('id'),
+		'daily challenge slots': assignments(user_id, today, day_cutoff(tz=tz)),
+		'timeseries window': DailyFootprint.objects.filter(user_id=user_id, day__gte=today - timedelta(days=30), day__lte=today).values('day').annotate(total=Sum('total')).order_by('day'),
+	}
+
+
+class Command(BaseCommand):
+	help = 'EXPLAIN the hot Activity queries and fail if any of them needs a full table scan.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--verbose-plans', action='store_true',
+			help='Print every plan, not only the failing ones.')
+
+	def handle(self, *args, **options):
+		pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+		if pattern is None:
+			raise CommandError(f'Query plan checks are not supported on {connection.vendor}.')
+
+		failures = []
+		with transaction.atomic():
+			if connection.vendor == 'postgresql':
+				# small or unanalyzed tables make a seq scan look cheap; only ask whether an index can serve the query
+				with connection.cursor() as cursor:
+					cursor.execute('SET LOCAL enable_seqscan = off')
+			for name, qs in query_shapes().items():
+				plan = qs.explain()
+				full_scan = pattern.search(plan)
+				if options['verbose_plans'] or full_scan:
+					self.stdout.write(f'-- {name}\n{plan}\n')
+				if full_scan:
+					failures.append(name)
+
+		if failures:
+			raise CommandError('Full table scan in: ' + ', '.join(failures))
+		self.stdout.write(self.style.SUCCESS('All checked queries use an index.'))
@@ -0,0 +1,169 @@
+import json
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from Activity_App.impact import get_factor_catalogue, recompute_impacts
+
+
+DEFAULT_CHECKPOINT = os.path.join(settings.BASE_DIR, '.recompute_impacts.json')
+# Users per aggregate rebuild query; keeps IN (...) lists under SQLite's variable limit
+USER_BATCH = 500
+
+
+def _init_worker():
+	import django
+	django.setup()
+
+
+def _run_shard(index, workers, after_pk, chunk_size, progress):
+	"""Process-pool entry point: recompute one user shard, reporting each chunk to ``progress``."""
+	def report(last_pk, scanned, updated, user_ids):
+		progress.put((index, last_pk, scanned, updated, sorted(user_ids)))
+	try:
+		scanned, updated, _ = recompute_impacts(after_pk, shard=(index, workers), chunk_size=chunk_size, on_chunk=report)
+	finally:
+		connections.close_all()
+	return scanned, updated
+
+
+def rebuild_aggregates(user_ids):
+	"""Rebuild everything derived from activity impacts for ``user_ids``."""
+	from Dashboard_App.badges import award_badges, progress_metrics
+	from Dashboard_App.models import BadgeProgress
+	from Dashboard_App.progress import rebuild_badge_progress
+	from Dashboard_App.rollups import backfill_daily_footprint
+	from Dashboard_App.snapshot import invalidate_dashboard_snapshot
+
+	user_ids = sorted(user_ids)
+	for start in range(0, len(user_ids), USER_BATCH):
+		batch = user_ids[start:start + USER_BATCH]
+		rebuild_badge_progress(user_ids=batch)
+		backfill_daily_footprint(user_ids=batch)
+		# new badges complete their challenges, which credits points through the ledger
+		for progress in BadgeProgress.objects.filter(user_id__in=batch).select_related('user'):
+			award_badges(progress.user, progress_metrics(progress))
+		for user_id in batch:
+			invalidate_dashboard_snapshot(user_id)
+
+
+class Command(BaseCommand):
+	help = (
+		'Recompute Activity.impact from the emission factor catalogue in primary-key chunks, '
+		'then rebuild footprint totals, badges and points for the affected users. '
+		'Progress is checkpointed so an interrupted run resumes where it stopped.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--chunk-size', type=int, default=2000,
+			help='Rows per read/bulk_update chunk (default 2000).')
+		parser.add_argument('--workers', type=int, default=1,
+			help='Process pool size; rows are sharded by user id across workers (default 1, in-process).')
+		parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+			help='Checkpoint file used to resume an interrupted run.')
+		parser.add_argument('--restart', action='store_true',
+			help='Ignore an existing checkpoint and start from the first row.')
+		parser.add_argument('--skip-aggregates', action='store_true',
+			help='Only rewrite impacts; leave footprint rollups, badges and points alone.')
+
+	def handle(self, *args, **options):
+		workers = options['workers']
+		chunk_size = options['chunk_size']
+		if workers < 1 or chunk_size < 1:
+			raise CommandError('--workers and --chunk-size must be at least 1.')
+		if workers > 1 and connections['default'].vendor == 'sqlite':
+			# each shard streams rows while it writes; SQLite allows a single writer
+			raise CommandError('--workers > 1 needs a database with concurrent writers (e.g. Postgres).')
+		self.checkpoint_path = options['checkpoint']
+		# rows before the checkpoint were computed with the factors of that run
+		catalogue = get_factor_catalogue().fingerprint
+
+		state = None if options['restart'] else self._load_checkpoint()
+		if state is None:
+			state = {'workers': workers, 'catalogue': catalogue, 'shards': {str(i): 0 for i in range(workers)}, 'users': []}
+		elif state.get('catalogue') != catalogue:
+			raise CommandError(
+				'The emission factors changed since the checkpoint was written, so the rows it '
+				'covers are stale; pass --restart to recompute from the first row.'
+			)
+		elif state['workers'] != workers:
+			raise CommandError(
+				f"The checkpoint was written with --workers {state['workers']}; "
+				f"rerun with that value or pass --restart."
+			)
+		else:
+			self.stdout.write(f"Resuming from checkpoint {self.checkpoint_path}.")
+		self.state = state
+		self.changed_users = set(state['users'])
+		self.scanned = self.updated = 0
+		self.started = time.monotonic()
+
+		if workers == 1:
+			def report(last_pk, scanned, updated, user_ids):
+				self._progress(0, last_pk, scanned, updated, user_ids)
+			recompute_impacts(state['shards']['0'], chunk_size=chunk_size, on_chunk=report)
+		else:
+			self._run_pool(workers, chunk_size)
+
+		elapsed = max(time.monotonic() - self.started, 1e-6)
+		self.stdout.write(
+			f'Recomputed {self.scanned} row(s), {self.updated} changed, '
+			f'in {elapsed:.1f}s ({self.scanned / elapsed:,.0f} rows/s).'
+		)
+		if not options['skip_aggregates'] and self.changed_users:
+			self.stdout.write(f'Rebuilding aggregates for {len(self.changed_users)} user(s)...')
+			rebuild_aggregates(self.changed_users)
+		if os.path.exists(self.checkpoint_path):
+			os.remove(self.checkpoint_path)
+		self.stdout.write(self.style.SUCCESS('Impact recompute complete.'))
+
+	def _run_pool(self, workers, chunk_size):
+		import multiprocessing
+		# children must not inherit this process's open connections
+		connections.close_all()
+		with multiprocessing.Manager() as manager:
+			progress = manager.Queue()
+			with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+				futures = [
+					pool.submit(_run_shard, i, workers, self.state['shards'][str(i)], chunk_size, progress)
+					for i in range(workers)
+				]
+				while not all(f.done() for f in futures):
+					try:
+						self._progress(*progress.get(timeout=0.5))
+					except queue.Empty:
+						pass
+				while not progress.empty():
+					self._progress(*progress.get())
+				for f in futures:
+					f.result()  # re-raise a worker failure; the checkpoint keeps finished chunks
+
+	def _progress(self, shard, last_pk, scanned, updated, user_ids):
+		self.scanned += scanned
+		self.updated += updated
+		self.changed_users.update(user_ids)
+		self.state['shards'][str(shard)] = last_pk
+		self.state['users'] = sorted(self.changed_users)
+		self._save_checkpoint()
+		elapsed = max(time.monotonic() - self.started, 1e-6)
+		self.stdout.write(f'{self.scanned} row(s) scanned, {self.updated} changed, {self.scanned / elapsed:,.0f} rows/s')
+
+	def _load_checkpoint(self):
+		try:
+			with open(self.checkpoint_path) as fh:
+				return json.load(fh)
+		except FileNotFoundError:
+			return None
+		except (OSError, ValueError) as e:
+			raise CommandError(f'Unreadable checkpoint {self.checkpoint_path}: {e}')
+
+	def _save_checkpoint(self):
+		tmp = self.checkpoint_path + '.tmp'
+		with open(tmp, 'w') as fh:
+			json.dump(self.state, fh)
+		os.replace(tmp, self.checkpoint_path)
@@ -1,9 +1,12 @@
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Upper
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
-from django.db.models import Count, Max
+
+from EcoTrack.days import local_date
 
 # Avoid circular import at top-level: import inside signal handler when needed
 
@@ -24,124 +27,154 @@ class Activity(models.Model):
 	impact = models.DecimalField(max_digits=9, decimal_places=2, default=0)
 	date = models.DateField(blank=True, null=True)
 	created_at = models.DateTimeField(auto_now_add=True)
+	# ``date`` or, when missing, the day the activity was logged in the user's timezone;
+	# the history sort key and the day the rollups and eco-trip counts file it under
+	effective_date = models.DateField(blank=True, null=True, editable=False)
+	# set while badge/challenge evaluation is queued (Dashboard_App.evaluation); the
+	# signals leave such rows alone and the derived-state rebuilds skip them
+	pending_evaluation = models.BooleanField(default=False, editable=False)
+	# no emission factor covered (category, subtype) when logged: impact is 0
+	# until a factor exists and recompute_impacts rates the row
+	impact_unrated = models.BooleanField(default=False, editable=False)
 
 	class Meta:
 		ordering = ['-created_at']
+		# one index per query shape; check_query_plans verifies the views use them
+		indexes = [
+			# history pages (keyset on the effective date)
+			models.Index(fields=['user', '-effective_date', '-created_at', '-id'], name='activity_history_idx'),
+			# recent activities on the dashboard / activity page
+			models.Index(fields=['user', '-created_at'], name='activity_user_recent_idx'),
+			# per-category breakdowns and per-date badge counts
+			models.Index(fields=['user', 'category', 'date'], name='activity_user_cat_date_idx'),
+			# "today" breakdown: date range across categories
+			models.Index(fields=['user', 'date'], name='activity_user_date_idx'),
+			# subtype__iexact compiles to UPPER(subtype) = UPPER(...) on Postgres
+			models.Index(F('user'), F('category'), Upper('subtype'), name='activity_user_subtype_idx'),
+			# the evaluation outbox: only queued rows are indexed
+			models.Index(fields=['user'], condition=Q(pending_evaluation=True), name='activity_pending_eval_idx'),
+		]
+
+	def local_day(self):
+		"""``date``, else the day the activity was logged in its user's timezone (``EcoTrack.days``)."""
+		return self.date or local_date(self.created_at or timezone.now(), user=self.user)
+
+	def set_effective_date(self):
+		"""Fill ``effective_date``; save() does this, bulk_create callers must call it.
+
+		Rows from before the column existed are filled by ``manage.py backfill_effective_dates``.
+		"""
+		self.effective_date = self.local_day()
+
+	def save(self, *args, **kwargs):
+		self.set_effective_date()
+		update_fields = kwargs.get('update_fields')
+		if update_fields is not None and 'date' in update_fields:
+			kwargs['update_fields'] = set(update_fields) | {'effective_date'}
+		super().save(*args, **kwargs)
 
 	def __str__(self):
 		return f"{self.user} - {self.category} - {self.impact} kg"
 
 
-# When an Activity is created, evaluate badge criteria and persist UserBadge records
+class EmissionFactor(models.Model):
+	"""kg CO2 per unit for one (category, subtype), valid from ``effective_from``.
+
+	A factor change is a new row with a later ``effective_from`` (and the next
+	``version``), so historical activities keep the factor that applied on
+	their date. See ``Activity_App.impact`` for how impacts are computed.
+	"""
+	BASIS_DISTANCE = 'distance'
+	BASIS_AMOUNT = 'amount'
+	BASIS_FIXED = 'fixed'
+	BASIS_CHOICES = [
+		(BASIS_DISTANCE, 'Per km'),
+		(BASIS_AMOUNT, 'Per kWh / unit'),
+		(BASIS_FIXED, 'Per activity'),
+	]
+
+	category = models.CharField(max_length=32, choices=Activity.CATEGORY_CHOICES)
+	subtype = models.CharField(max_length=64)
+	basis = models.CharField(max_length=16, choices=BASIS_CHOICES)
+	factor = models.DecimalField(max_digits=10, decimal_places=4)
+	version = models.PositiveIntegerField(blank=True)
+	effective_from = models.DateField(default=timezone.localdate)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		unique_together = ('category', 'subtype', 'version')
+		ordering = ['category', 'subtype', 'effective_from', 'version']
+
+	def save(self, *args, **kwargs):
+		if not self.version:
+			latest = EmissionFactor.objects.filter(category=self.category, subtype=self.subtype).aggregate(v=models.Max('version'))['v']
+			self.version = (latest or 0) + 1
+		super().save(*args, **kwargs)
+
+	def __str__(self):
+		return f"{self.category}/{self.subtype} v{self.version}: {self.factor} from {self.effective_from}"
+
+
+# When an Activity is created, update the user's badge counters and persist any newly earned UserBadge
 @receiver(post_save, sender='Activity_App.Activity')
 def award_badges_on_activity(sender, instance, created, **kwargs):
-	# Only evaluate on create to avoid re-running for updates
-	if not created:
+	# Only evaluate on create to avoid re-running for updates; queued rows are evaluated later
+	if not created or instance.pending_evaluation:
 		return
 
 	try:
 		# import here to avoid circular imports
-		from Dashboard_App.models import UserBadge
-		from django.db.models import Q, Sum
-
-		user = instance.user
-
-		# ECO COMMUTER: bike/walk trips or km
-		eco_qs = sender.objects.filter(user=user).filter(Q(category='transportation') | Q(category='transport'))
-		eco_qs = eco_qs.filter(Q(subtype__iexact='bicycle') | Q(subtype__iexact='walk'))
-		# Compute max number of bike/walk trips recorded on any single date
-		daily_counts = eco_qs.values('date').annotate(cnt=Count('id'))
-		max_daily = int(daily_counts.aggregate(max_cnt=Max('cnt'))['max_cnt'] or 0)
-		eco_km = float(eco_qs.aggregate(total_km=Sum('distance'))['total_km'] or 0)
-		# Award when user has >=5 bike/walk trips on the same date OR accumulated >=50 km
-		if (max_daily >= 5 or eco_km >= 50) and not UserBadge.objects.filter(user=user, key='eco_commuter').exists():
-			ub = UserBadge.objects.create(user=user, key='eco_commuter', earned_at=timezone.now())
-			# mark related Challenge as completed for points (prefer Challenge.key)
-			try:
-				from Challenges_App.models import Challenge, UserChallenge as CU
-				ch = Challenge.objects.filter(key__iexact='eco_commuter').first()
-				if not ch:
-					ch = Challenge.objects.filter(title__icontains='eco commuter').first() or Challenge.objects.filter(title__icontains='eco').first()
-				if ch:
-					uc_obj, _ = CU.objects.get_or_create(user=user, challenge=ch)
-					uc_obj.completed = True
-					uc_obj.completed_at = timezone.now()
-					uc_obj.save()
-			except Exception:
-				pass
-
-		# GREEN EATER: veg/vegan meals
-		green_qs = sender.objects.filter(user=user, category='diet').filter(Q(subtype__iexact='vegetarian') | Q(subtype__iexact='vegan'))
-		green_meals = green_qs.count()
-		if green_meals >= 7 and not UserBadge.objects.filter(user=user, key='green_eater').exists():
-			ub = UserBadge.objects.create(user=user, key='green_eater', earned_at=timezone.now())
-			try:
-				from Challenges_App.models import Challenge, UserChallenge as CU
-				ch = Challenge.objects.filter(key__iexact='green_eater').first()
-				if not ch:
-					ch = Challenge.objects.filter(title__icontains='green eater').first() or Challenge.objects.filter(title__icontains='green').first()
-				if ch:
-					uc_obj, _ = CU.objects.get_or_create(user=user, challenge=ch)
-					uc_obj.completed = True
-					uc_obj.completed_at = timezone.now()
-					uc_obj.save()
-			except Exception:
-				pass
-
-		# RECYCLING CHAMPION: shopping notes mention recycle/reused/upcycle
-		recycle_qs = sender.objects.filter(user=user, category='shopping').filter(
-			Q(subtype__icontains='recycle') | Q(subtype__icontains='reused') | Q(subtype__icontains='upcycle')
-		)
-		if recycle_qs.count() >= 5 and not UserBadge.objects.filter(user=user, key='recycling_champion').exists():
-			ub = UserBadge.objects.create(user=user, key='recycling_champion', earned_at=timezone.now())
-			try:
-				from Challenges_App.models import Challenge, UserChallenge as CU
-				ch = Challenge.objects.filter(key__iexact='recycling_champion').first()
-				if not ch:
-					ch = Challenge.objects.filter(title__icontains='recycle').first()
-				if ch:
-					uc_obj, _ = CU.objects.get_or_create(user=user, challenge=ch)
-					uc_obj.completed = True
-					uc_obj.completed_at = timezone.now()
-					uc_obj.save()
-			except Exception:
-				pass
-
-		# ENERGY SAVER: renewable energy uses
-		energy_qs = sender.objects.filter(user=user, category='energy').filter(Q(subtype__icontains='renew'))
-		if energy_qs.count() >= 5 and not UserBadge.objects.filter(user=user, key='energy_saver').exists():
-			ub = UserBadge.objects.create(user=user, key='energy_saver', earned_at=timezone.now())
-			try:
-				from Challenges_App.models import Challenge, UserChallenge as CU
-				ch = Challenge.objects.filter(key__iexact='energy_saver').first()
-				if not ch:
-					ch = Challenge.objects.filter(title__icontains='energy').first()
-				if ch:
-					uc_obj, _ = CU.objects.get_or_create(user=user, challenge=ch)
-					uc_obj.completed = True
-					uc_obj.completed_at = timezone.now()
-					uc_obj.save()
-			except Exception:
-				pass
-
-		# CARBON NEUTRAL: total footprint <= 0.5 kg (computed across activities)
-		totals = sender.objects.filter(user=user).aggregate(total=Sum('impact'))
-		total_footprint = float(totals['total'] or 0)
-		if total_footprint <= 0.5 and not UserBadge.objects.filter(user=user, key='carbon_neutral').exists():
-			ub = UserBadge.objects.create(user=user, key='carbon_neutral', earned_at=timezone.now())
-			try:
-				from Challenges_App.models import Challenge, UserChallenge as CU
-				ch = Challenge.objects.filter(key__iexact='carbon_neutral').first()
-				if not ch:
-					ch = Challenge.objects.filter(title__icontains='carbon').first() or Challenge.objects.filter(title__icontains='neutral').first()
-				if ch:
-					uc_obj, _ = CU.objects.get_or_create(user=user, challenge=ch)
-					uc_obj.completed = True
-					uc_obj.completed_at = timezone.now()
-					uc_obj.save()
-			except Exception:
-				pass
+		from Dashboard_App.badges import award_badges, progress_metrics
+		from Dashboard_App.progress import apply_activity
+
+		progress = apply_activity(instance)
+		award_badges(instance.user, progress_metrics(progress))
 
 	except Exception:
 		# Fail silently: awarding badges is best-effort and should not block activity creation
 		pass
+
+
+@receiver(post_delete, sender='Activity_App.Activity')
+def update_badge_progress_on_delete(sender, instance, **kwargs):
+	# a row still queued was never counted
+	if instance.pending_evaluation:
+		return
+	try:
+		from Dashboard_App.progress import apply_activity
+		apply_activity(instance, sign=-1)
+	except Exception:
+		pass
+
+
+# Keep the per-day footprint rollup behind the dashboard chart current
+@receiver(post_save, sender='Activity_App.Activity')
+def update_daily_footprint_on_save(sender, instance, created, **kwargs):
+	if not created or instance.pending_evaluation:
+		return
+	try:
+		from Dashboard_App.rollups import apply_to_rollup
+		apply_to_rollup(instance.user_id, [instance])
+	except Exception:
+		pass
+
+
+@receiver(post_delete, sender='Activity_App.Activity')
+def update_daily_footprint_on_delete(sender, instance, **kwargs):
+	if instance.pending_evaluation:
+		return
+	try:
+		from Dashboard_App.rollups import apply_to_rollup
+		apply_to_rollup(instance.user_id, [instance], sign=-1)
+	except Exception:
+		pass
+
+
+@receiver(post_save, sender='Activity_App.EmissionFactor')
+@receiver(post_delete, sender='Activity_App.EmissionFactor')
+def invalidate_emission_factors(sender, instance, **kwargs):
+	try:
+		from Activity_App.impact import invalidate_factor_catalogue
+		invalidate_factor_catalogue()
+	except Exception:
+		pass
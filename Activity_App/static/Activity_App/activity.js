@@ -140,32 +140,47 @@ document.addEventListener('DOMContentLoaded', function () {
 
             const csrftoken = getCookie('csrftoken') || document.querySelector('meta[name="csrf-token"]')?.getAttribute('content');
 
-            // send sequentially to avoid flooding and to preserve order
+            // send the queue in batch requests (server caps a batch at 500); order is preserved
+            const BATCH_SIZE = 200;
             (async function () {
-                for (const item of list) {
-                    try {
-                        const res = await fetch('/activity/api/add/', {
+                let sent = 0;
+                try {
+                    for (let start = 0; start < list.length; start += BATCH_SIZE) {
+                        const chunk = list.slice(start, start + BATCH_SIZE);
+                        const res = await fetch('/activity/api/add/batch/', {
                             method: 'POST',
                             headers: {
                                 'Content-Type': 'application/json',
                                 'X-CSRFToken': csrftoken || ''
                             },
-                            body: JSON.stringify(item)
+                            body: JSON.stringify(chunk)
                         });
                         const json = await res.json();
-                        if (!json.success) console.warn('Sync failed for item', json);
-                        else {
+                        if (!json.success) {
+                            // keep the unsent remainder queued for the next attempt
+                            console.warn('Batch sync failed', json);
+                            localStorage.setItem(key, JSON.stringify(list.slice(sent)));
+                            return;
+                        }
+                        (json.results || []).forEach(result => {
+                            const item = chunk[result.index] || {};
+                            if (!result.success) {
+                                console.warn('Sync failed for item', item, result.error);
+                                return;
+                            }
                             // reflect in UI
                             const cat = item.category || item.cat || 'transportation';
                             const shortCat = cat === 'transportation' ? 'transportation' : cat;
                             updateActivityCount(shortCat);
-                        }
-                    } catch (err) {
-                        console.warn('Error syncing pending activity', err);
+                        });
+                        sent = start + chunk.length;
                     }
+                    // clear pending list once the server has processed every batch
+                    localStorage.removeItem(key);
+                } catch (err) {
+                    console.warn('Error syncing pending activities', err);
+                    localStorage.setItem(key, JSON.stringify(list.slice(sent)));
                 }
-                // clear pending list after attempts
-                localStorage.removeItem(key);
             })();
         } catch (e) {
             console.warn('Could not sync pending activities', e);
@@ -533,40 +548,31 @@ document.addEventListener('DOMContentLoaded', function () {
         updateImpactPreview(category, 0);
     }
 
-    // Impact calculation functions
+    // Impact calculation functions (preview only: the server recomputes impact from its own factor table)
+    const EMISSION_FACTORS = (function () {
+        const el = document.getElementById('emission-factors');
+        try {
+            return el ? JSON.parse(el.textContent) : {};
+        } catch (e) {
+            return {};
+        }
+    })();
+
+    function emissionFactor(category, type) {
+        const entry = (EMISSION_FACTORS[category] || {})[type];
+        return entry ? entry.factor : 0;
+    }
+
     function calculateTransportImpact(type, distance) {
-        const factors = {
-            car: 0.21,
-            bus: 0.1,
-            train: 0.04,
-            bicycle: 0,
-            walk: 0
-        };
-
-        const factor = factors[type] || 0;
-        return (factor * parseFloat(distance)).toFixed(2);
+        return (emissionFactor('transportation', type) * parseFloat(distance)).toFixed(2);
     }
 
     function calculateDietImpact(type) {
-        const factors = {
-            vegetarian: 1.7,
-            vegan: 1.5,
-            meat: 6.0,
-            fish: 3.5
-        };
-
-        return (factors[type] || 0).toFixed(2);
+        return emissionFactor('diet', type).toFixed(2);
     }
 
     function calculateEnergyImpact(type, amount) {
-        const factors = {
-            electricity: 0.5,
-            heating: 0.3,
-            renewable: 0.05
-        };
-
-        const factor = factors[type] || 0;
-        return (factor * parseFloat(amount)).toFixed(2);
+        return (emissionFactor('energy', type) * parseFloat(amount)).toFixed(2);
     }
 
     function showNotification(message, type = 'success') {
@@ -0,0 +1,49 @@
+"""Per-user activity summaries shared by the JSON endpoints.
+
+``list_activities`` and the bootstrap API both report all-time totals and
+counts per category and the most recent activities; they read them through
+the same helpers so the shapes never drift apart.
+"""
+from django.db.models import Count, Sum
+
+from EcoTrack.aio import alist
+
+from .models import Activity
+
+
+CATEGORIES = ('transportation', 'diet', 'energy', 'shopping')
+
+
+def serialize_recent(a):
+	return {
+		'id': a.id,
+		'category': a.category,
+		'subtype': a.subtype,
+		'distance': a.distance,
+		'amount': a.amount,
+		'impact': float(a.impact),
+		'date': a.date.isoformat() if a.date else None,
+		'created_at': a.created_at.isoformat(),
+	}
+
+
+async def abreakdown(user):
+	"""All-time ``(breakdown, counts)`` per category for ``user`` from one grouped query."""
+	grouped = await alist(
+		Activity.objects.filter(user=user).values('category').annotate(total=Sum('impact'), count=Count('id'))
+	)
+	breakdown = dict.fromkeys(CATEGORIES, 0.0)
+	counts = dict.fromkeys(CATEGORIES, 0)
+	for t in grouped:
+		cat = t['category']
+		try:
+			breakdown[cat] = float(t['total'] or 0)
+		except Exception:
+			breakdown[cat] = 0.0
+		counts[cat] = int(t['count'] or 0)
+	return breakdown, counts
+
+
+async def arecent(user, limit):
+	"""The ``limit`` most recently logged activities of ``user``, serialized."""
+	return [serialize_recent(a) for a in await alist(Activity.objects.filter(user=user).order_by('-created_at')[:limit])]
@@ -79,6 +79,158 @@ class ActivityApiSmokeTests(TestCase):
 		self.assertGreaterEqual(int(counts.get('energy', 0)), 1)
 
 
+class ActivityBatchApiTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.user = User.objects.create_user(username='batchuser', password='password')
+		self.client = Client()
+		self.client.login(username='batchuser', password='password')
+
+	def test_batch_inserts_valid_items_and_reports_per_item(self):
+		from Challenges_App.models import Challenge
+		from Dashboard_App.models import BadgeProgress
+		from .models import Activity
+		ch = Challenge.objects.create(title='Bike to work', points=5)
+		payload = [
+			{'category': 'transportation', 'type': 'bicycle', 'distance': '3', 'date': '2025-11-22', 'impact': '0'},
+			{'type': 'vegan'},
+			{'category': 'diet', 'type': 'vegan', 'date': '2025-11-22', 'impact': '1.50'},
+			{'category': 'transportation', 'type': 'bicycle', 'distance': '2', 'date': '2025-11-22', 'impact': '0'},
+		]
+		resp = self.client.post(reverse('Activity_App:add_activities_batch'), data=json.dumps(payload), content_type='application/json')
+		self.assertEqual(resp.status_code, 200)
+		data = resp.json()
+		self.assertTrue(data['success'])
+		self.assertEqual(data['created'], 3)
+		self.assertEqual([r['success'] for r in data['results']], [True, False, True, True])
+		self.assertEqual(data['results'][1]['error'], 'Missing category')
+		self.assertEqual(data['challenges_completed'], [ch.id])
+		self.assertEqual(Activity.objects.filter(user=self.user).count(), 3)
+
+		progress = BadgeProgress.objects.get(user=self.user)
+		self.assertEqual(progress.eco_max_daily_trips, 2)
+		self.assertAlmostEqual(progress.eco_km, 5.0)
+		self.assertEqual(progress.veg_meals, 1)
+
+	def test_batch_rejects_non_list(self):
+		resp = self.client.post(reverse('Activity_App:add_activities_batch'), data=json.dumps({'category': 'diet'}), content_type='application/json')
+		self.assertEqual(resp.status_code, 400)
+
+
+class EmissionFactorTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		User = get_user_model()
+		self.user = User.objects.create_user(username='factoruser', password='password')
+		self.client = Client()
+		self.client.login(username='factoruser', password='password')
+
+	def post(self, **payload):
+		resp = self.client.post(reverse('Activity_App:add_activity'), data=json.dumps(payload), content_type='application/json')
+		return resp.json()['activity']
+
+	def test_server_computes_impact_and_ignores_client_value(self):
+		self.assertEqual(self.post(category='transportation', type='car', distance='10', date='2025-11-22', impact='999')['impact'], '2.10')
+		# unknown to the catalogue: counted as 0 and flagged, never the posted value
+		unrated = self.post(category='shopping', type='recycled bag', impact='0.30')
+		self.assertEqual(unrated['impact'], '0.00')
+		self.assertTrue(unrated['impact_unrated'])
+		from Activity_App.models import Activity
+		self.assertTrue(Activity.objects.get(pk=unrated['id']).impact_unrated)
+
+	def test_recompute_rates_unrated_activities_once_a_factor_exists(self):
+		from Activity_App.impact import recompute_impacts
+		from Activity_App.models import Activity, EmissionFactor
+		activity = self.post(category='shopping', type='recycled bag', date='2025-11-22')
+		EmissionFactor.objects.create(category='shopping', subtype='recycled bag', basis=EmissionFactor.BASIS_FIXED, factor='0.25', effective_from='2025-01-01')
+		recompute_impacts()
+		row = Activity.objects.get(pk=activity['id'])
+		self.assertEqual(str(row.impact), '0.25')
+		self.assertFalse(row.impact_unrated)
+
+	def test_new_factor_version_applies_from_its_effective_date(self):
+		from datetime import date
+		from Activity_App.impact import compute_impact
+		from Activity_App.models import EmissionFactor
+		self.assertEqual(str(compute_impact('diet', 'meat', on=date(2025, 6, 1))), '6.00')
+		factor = EmissionFactor.objects.create(category='diet', subtype='meat', basis=EmissionFactor.BASIS_FIXED, factor='7.2', effective_from=date(2025, 1, 1))
+		self.assertEqual(factor.version, 1)
+		self.assertEqual(str(compute_impact('diet', 'meat', on=date(2024, 12, 31))), '6.00')
+		self.assertEqual(str(compute_impact('diet', 'meat', on=date(2025, 6, 1))), '7.20')
+		self.assertEqual(self.post(category='diet', type='meat', date='2025-06-01')['impact'], '7.20')
+
+
+class RecomputeImpactsCommandTests(TestCase):
+	def setUp(self):
+		import os
+		import tempfile
+		from django.core.cache import cache
+		from Activity_App.models import Activity
+		cache.clear()
+		User = get_user_model()
+		self.user = User.objects.create_user(username='recomputeuser', password='password')
+		self.rows = [
+			Activity.objects.create(user=self.user, category='diet', subtype='meat', impact='6.00', date='2025-03-0%d' % day)
+			for day in range(1, 6)
+		]
+		self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+
+	def run_command(self, *args):
+		from io import StringIO
+		from django.core.management import call_command
+		out = StringIO()
+		call_command('recompute_impacts', '--checkpoint', self.checkpoint, '--chunk-size', '2', *args, stdout=out)
+		return out.getvalue()
+
+	def test_rewrites_impacts_and_rebuilds_aggregates(self):
+		from Activity_App.models import Activity, EmissionFactor
+		from Dashboard_App.models import BadgeProgress, DailyFootprint
+		EmissionFactor.objects.create(category='diet', subtype='meat', basis=EmissionFactor.BASIS_FIXED, factor='7', effective_from='2025-03-03')
+		out = self.run_command()
+		self.assertIn('rows/s', out)
+		self.assertEqual([str(a.impact) for a in Activity.objects.order_by('pk')], ['6.00', '6.00', '7.00', '7.00', '7.00'])
+		self.assertEqual(float(BadgeProgress.objects.get(user=self.user).total_footprint), 33.0)
+		self.assertEqual(float(DailyFootprint.objects.get(user=self.user, day='2025-03-05').total), 7.0)
+
+	def write_checkpoint(self, catalogue):
+		import json
+		# a previous run got through the first three rows before stopping
+		with open(self.checkpoint, 'w') as fh:
+			json.dump({'workers': 1, 'catalogue': catalogue, 'shards': {'0': self.rows[2].pk}, 'users': []}, fh)
+
+	def test_resumes_from_checkpoint(self):
+		import os
+		from Activity_App.impact import get_factor_catalogue
+		from Activity_App.models import Activity, EmissionFactor
+		EmissionFactor.objects.create(category='diet', subtype='meat', basis=EmissionFactor.BASIS_FIXED, factor='7', effective_from='2025-01-01')
+		self.write_checkpoint(get_factor_catalogue().fingerprint)
+		out = self.run_command()
+		self.assertIn('Resuming', out)
+		self.assertEqual([str(a.impact) for a in Activity.objects.order_by('pk')], ['6.00', '6.00', '6.00', '7.00', '7.00'])
+		self.assertFalse(os.path.exists(self.checkpoint))
+
+	def test_refuses_to_resume_after_factors_changed(self):
+		from django.core.management.base import CommandError
+		from Activity_App.impact import get_factor_catalogue
+		from Activity_App.models import Activity, EmissionFactor
+		self.write_checkpoint(get_factor_catalogue().fingerprint)
+		EmissionFactor.objects.create(category='diet', subtype='meat', basis=EmissionFactor.BASIS_FIXED, factor='7', effective_from='2025-01-01')
+		with self.assertRaisesMessage(CommandError, '--restart'):
+			self.run_command()
+		self.run_command('--restart')
+		self.assertEqual({str(a.impact) for a in Activity.objects.all()}, {'7.00'})
+
+
+class QueryPlanCheckTests(TestCase):
+	def test_hot_queries_use_indexes(self):
+		from io import StringIO
+		from django.core.management import call_command
+		out = StringIO()
+		call_command('check_query_plans', '--verbose-plans', stdout=out)
+		self.assertIn('All checked queries use an index.', out.getvalue())
+
+
 class ActivityUiSelectionSmokeTest(StaticLiveServerTestCase):
 	"""Headless browser smoke test to ensure visual selection is cleared after adding."""
 	@classmethod
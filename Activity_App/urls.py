@@ -8,5 +8,6 @@ urlpatterns = [
     # expose the activity page at /activity/ instead of /activity/activity/
     path('', views.activity, name='activity'),
     path('api/add/', views.add_activity, name='add_activity'),
+    path('api/add/batch/', views.add_activities_batch, name='add_activities_batch'),
     path('api/list/', views.list_activities, name='list_activities'),
 ]
\ No newline at end of file
@@ -1,15 +1,21 @@
 from django.shortcuts import render, get_object_or_404
 from django.http import HttpResponse, JsonResponse
 from django.views.decorators.http import require_POST
-from django.db.models import Sum, Count
 from django.contrib.auth.decorators import login_required
+from decimal import Decimal, InvalidOperation
+import asyncio
 import json
 
+from .impact import compute_impact, get_factor_catalogue
 from .models import Activity
+from .summary import abreakdown, arecent
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on activities accepted by one batch request
+MAX_BATCH_SIZE = 500
+
 
 def activity(request):
     """
@@ -17,120 +23,121 @@ def activity(request):
     """
     context = {
         'user': request.user,
+        # factors for the live impact preview; the server recomputes on save
+        'emission_factors': get_factor_catalogue().current(),
     }
     return render(request, 'Activity_App/activity.html', context)
 
 
-@login_required
-@require_POST
-def add_activity(request):
-    """API endpoint to create an Activity from JSON POST body."""
-    try:
+def _parse_activity(user, data):
+    """Build an unsaved Activity from a JSON payload, or return (None, error)."""
+    if not isinstance(data, dict):
+        return None, 'Invalid activity'
+    category = data.get('category')
+    if not category:
+        return None, 'Missing category'
+
+    subtype = data.get('type') or data.get('subtype')
+    distance = data.get('distance')
+    amount = data.get('amount')
+    date = data.get('date') or None
+    # normalize incoming date string to a date object if provided
+    from datetime import date as _date
+    date_obj = None
+    if date:
         try:
-            data = json.loads(request.body.decode('utf-8'))
+            # expect ISO format YYYY-MM-DD
+            date_obj = _date.fromisoformat(date)
         except Exception:
-            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+            # fallback: leave None (DB will accept null)
+            date_obj = None
 
-        category = data.get('category')
-        if not category:
-            return JsonResponse({'success': False, 'error': 'Missing category'}, status=400)
-
-        subtype = data.get('type') or data.get('subtype')
-        distance = data.get('distance')
-        amount = data.get('amount')
-        impact = data.get('impact') or 0
-        date = data.get('date') or None
-        # normalize incoming date string to a date object if provided
-        from datetime import date as _date
-        date_obj = None
-        if date:
-            try:
-                # expect ISO format YYYY-MM-DD
-                date_obj = _date.fromisoformat(date)
-            except Exception:
-                # fallback: leave None (DB will accept null)
-                date_obj = None
-
-        # Create the Activity record
-        activity_obj = Activity.objects.create(
-            user=request.user,
+    try:
+        activity_obj = Activity(
+            user=user,
             category=category,
             subtype=subtype,
             distance=float(distance) if distance not in (None, '') else None,
             amount=float(amount) if amount not in (None, '') else None,
-            impact=impact,
             date=date_obj if date_obj else None,
         )
-        # Evaluate challenges against this newly created activity and mark any matched ones as completed
+    except (ValueError, TypeError, InvalidOperation):
+        return None, 'Invalid number'
+    # the server owns the emission factors and never trusts a posted impact;
+    # combinations the catalogue doesn't know (e.g. shopping) count 0 and are flagged
+    computed = compute_impact(category, subtype, activity_obj.distance, activity_obj.amount, on=date_obj)
+    if computed is None:
+        activity_obj.impact = Decimal('0.00')
+        activity_obj.impact_unrated = True
+    else:
+        activity_obj.impact = computed
+    # bulk_create skips save(), which normally fills the history sort key
+    activity_obj.set_effective_date()
+    return activity_obj, None
+
+
+def _serialize_activity(activity_obj):
+    return {
+        'id': activity_obj.id,
+        'category': activity_obj.category,
+        'subtype': activity_obj.subtype,
+        'distance': activity_obj.distance,
+        'amount': activity_obj.amount,
+        'impact': str(activity_obj.impact),
+        'impact_unrated': activity_obj.impact_unrated,
+        'date': (activity_obj.date.isoformat() if hasattr(activity_obj.date, 'isoformat') else (str(activity_obj.date) if activity_obj.date else None)),
+        'created_at': activity_obj.created_at.isoformat(),
+    }
+
+
+def _enqueue_evaluation(user):
+    """Queue badge/challenge evaluation for ``user``; returns challenge ids completed inline (sync mode)."""
+    from Dashboard_App.evaluation import enqueue_evaluation
+    try:
+        return enqueue_evaluation(user)
+    except Exception:
+        # the rows stay queued; drain_evaluations picks them up
+        logger.exception('Could not queue evaluation for user %s', user.id)
+        return []
+
+
+def _evaluation_fields(newly_completed):
+    """``evaluation`` for the response, plus the ``challenges_completed`` known so far.
+
+    Queued evaluations ('thread' and 'outbox' modes) finish after the
+    response, so their list is empty and completions only show up in the
+    challenges list.
+    """
+    from Dashboard_App.evaluation import SYNC, evaluation_mode
+    return {
+        'evaluation': 'done' if evaluation_mode() == SYNC else 'queued',
+        'challenges_completed': newly_completed,
+    }
+
+
+@login_required
+@require_POST
+def add_activity(request):
+    """API endpoint to create an Activity from JSON POST body."""
+    try:
         try:
-            from Challenges_App.models import Challenge, UserChallenge
-            from django.utils import timezone
-            from zoneinfo import ZoneInfo
-            import datetime
-
-            def _matches_challenge(activity, challenge):
-                # Simple heuristic rules to match activity to challenge keywords
-                title = (challenge.title or '').lower()
-                cat = (activity.category or '').lower()
-                subtype = (activity.subtype or '').lower() if activity.subtype else ''
-
-                # Transport-related: if challenge mentions 'bike' or 'walk' and activity is transportation with bicycle/walk
-                if 'bike' in title or 'bicycle' in title or 'walk' in title:
-                    return (cat.startswith('transport') or cat == 'transportation') and subtype in ('bicycle', 'bike', 'walk')
-
-                # Diet: vegetarian/vegan/meat/fish keywords
-                if 'vegetarian' in title or 'vegan' in title or 'meat' in title or 'fish' in title:
-                    return cat == 'diet' and (( 'vegetarian' in title and 'vegetarian' in subtype) or ('vegan' in title and 'vegan' in subtype) or ('meat' in title and 'meat' in subtype) or ('fish' in title and 'fish' in subtype))
-
-                # Energy: renewable keyword
-                if 'renewable' in title:
-                    return cat == 'energy' and subtype == 'renewable'
-
-                # fallback: if challenge title words appear in subtype or category
-                for word in title.split():
-                    if word and (word in subtype or word in cat):
-                        return True
-                return False
-
-            newly_completed = []
-            # find active challenges and mark if matched and not already completed today (GMT+8)
-            challenges = Challenge.objects.filter(is_active=True).order_by('-created_at')[:50]
-            # determine today's cutoff at GMT+8 midnight
-            try:
-                tz = ZoneInfo('Asia/Manila')
-            except Exception:
-                tz = ZoneInfo('UTC')
-            now = timezone.now()
-            now_tz = now.astimezone(tz)
-            cutoff_tz = now_tz.replace(hour=0, minute=0, second=0, microsecond=0)
-            cutoff_utc = cutoff_tz.astimezone(datetime.timezone.utc)
-
-            for ch in challenges:
-                if _matches_challenge(activity_obj, ch):
-                    uc, created = UserChallenge.objects.get_or_create(user=request.user, challenge=ch)
-                    # if already completed today, skip
-                    if uc.completed and uc.completed_at and uc.completed_at >= cutoff_utc:
-                        continue
-                    uc.completed = True
-                    uc.completed_at = timezone.now()
-                    uc.save()
-                    newly_completed.append(ch.id)
+            data = json.loads(request.body.decode('utf-8'))
         except Exception:
-            newly_completed = []
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+
+        activity_obj, error = _parse_activity(request.user, data)
+        if error:
+            return JsonResponse({'success': False, 'error': error}, status=400)
+
+        # Create the Activity record; badges and challenges are evaluated off the request path
+        activity_obj.pending_evaluation = True
+        activity_obj.save()
+        newly_completed = _enqueue_evaluation(request.user)
 
         return JsonResponse({
             'success': True,
-            'activity': {
-                'id': activity_obj.id,
-                'category': activity_obj.category,
-                'subtype': activity_obj.subtype,
-                'distance': activity_obj.distance,
-                'amount': activity_obj.amount,
-                'impact': str(activity_obj.impact),
-                'date': (activity_obj.date.isoformat() if hasattr(activity_obj.date, 'isoformat') else (str(activity_obj.date) if activity_obj.date else None)),
-                'created_at': activity_obj.created_at.isoformat(),
-            },
-            'challenges_completed': newly_completed,
+            'activity': _serialize_activity(activity_obj),
+            **_evaluation_fields(newly_completed),
         })
     except Exception as e:
         # log full traceback and return JSON error to caller to avoid 500
@@ -139,36 +146,61 @@ def add_activity(request):
 
 
 @login_required
-def list_activities(request):
-    """Return JSON with breakdown totals and recent activities for the current user."""
-    user = request.user
-    totals_qs = Activity.objects.filter(user=user).values('category').annotate(total=Sum('impact'))
-    breakdown = {'transportation': 0.0, 'diet': 0.0, 'energy': 0.0, 'shopping': 0.0}
-    for t in totals_qs:
-        cat = t['category']
+@require_POST
+def add_activities_batch(request):
+    """API endpoint to create many Activities at once (offline/pending queue replay).
+
+    Expects a JSON array of activity payloads (or ``{"activities": [...]}``).
+    Valid items are inserted with one ``bulk_create`` and queued; badge
+    progress and challenge matching then run once for the whole batch.
+    """
+    try:
         try:
-            breakdown[cat] = float(t['total'] or 0)
+            data = json.loads(request.body.decode('utf-8'))
         except Exception:
-            breakdown[cat] = 0.0
-
-    # counts per category
-    counts_qs = Activity.objects.filter(user=user).values('category').annotate(count=Count('id'))
-    counts = {'transportation': 0, 'diet': 0, 'energy': 0, 'shopping': 0}
-    for c in counts_qs:
-        counts[c['category']] = int(c['count'] or 0)
-
-    recent_qs = Activity.objects.filter(user=user).order_by('-created_at')[:20]
-    recent = []
-    for a in recent_qs:
-        recent.append({
-            'id': a.id,
-            'category': a.category,
-            'subtype': a.subtype,
-            'distance': a.distance,
-            'amount': a.amount,
-            'impact': float(a.impact),
-            'date': a.date.isoformat() if a.date else None,
-            'created_at': a.created_at.isoformat(),
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+        if isinstance(data, dict):
+            data = data.get('activities')
+        if not isinstance(data, list):
+            return JsonResponse({'success': False, 'error': 'Expected a list of activities'}, status=400)
+        if len(data) > MAX_BATCH_SIZE:
+            return JsonResponse({'success': False, 'error': f'At most {MAX_BATCH_SIZE} activities per batch'}, status=400)
+
+        results = []
+        pending = []
+        for index, item in enumerate(data):
+            activity_obj, error = _parse_activity(request.user, item)
+            if error:
+                results.append({'index': index, 'success': False, 'error': error})
+            else:
+                results.append({'index': index, 'success': True})
+                pending.append((index, activity_obj))
+
+        created = []
+        if pending:
+            for _, obj in pending:
+                # bulk_create skips the signals anyway; the whole batch is evaluated in one pass
+                obj.pending_evaluation = True
+            created = Activity.objects.bulk_create([obj for _, obj in pending])
+            for (index, _), activity_obj in zip(pending, created):
+                results[index]['activity'] = _serialize_activity(activity_obj)
+        newly_completed = _enqueue_evaluation(request.user) if created else []
+
+        return JsonResponse({
+            'success': True,
+            'created': len(created),
+            'results': results,
+            **_evaluation_fields(newly_completed),
         })
+    except Exception as e:
+        logger.exception('Error in add_activities_batch')
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
 
-    return JsonResponse({'success': True, 'breakdown': breakdown, 'recent': recent, 'counts': counts})
\ No newline at end of file
+@login_required
+async def list_activities(request):
+    """Return JSON with breakdown totals and recent activities for the current user."""
+    user = await request.auser()
+    # totals and counts come from one grouped query; it and the recent list are independent
+    (breakdown, counts), recent = await asyncio.gather(abreakdown(user), arecent(user, 20))
+    return JsonResponse({'success': True, 'breakdown': breakdown, 'recent': recent, 'counts': counts})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Challenge, UserChallenge
+from .models import Challenge, DailyChallengeAssignment, UserChallenge
 
 
 @admin.register(Challenge)
@@ -14,3 +14,10 @@ class UserChallengeAdmin(admin.ModelAdmin):
 	list_display = ('user', 'challenge', 'completed', 'completed_at')
 	list_filter = ('completed',)
 	search_fields = ('user__username', 'challenge__title')
+
+
+@admin.register(DailyChallengeAssignment)
+class DailyChallengeAssignmentAdmin(admin.ModelAdmin):
+	list_display = ('user', 'day', 'slot', 'challenge')
+	list_filter = ('day',)
+	search_fields = ('user__username', 'challenge__title')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ChallengesAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Challenges_App'
+
+    def ready(self):
+        # Register signal handlers that keep the challenge matcher index fresh
+        import Challenges_App.signals  # noqa: F401
@@ -0,0 +1,174 @@
+"""The three challenge slots each user sees per challenge day.
+
+The selection is a deterministic function of the user, the challenge day
+(the user's local date, see ``EcoTrack.days``) and the challenge catalogue (``daily_selection``). It is computed once per user
+and day and stored in ``DailyChallengeAssignment``: in bulk by
+``manage.py assign_daily_challenges``, or lazily on the user's first visit
+of the day. Reading the slots is then one indexed join, with the day's
+completion status as a correlated subquery, instead of loading the catalogue.
+Slots stay fixed for the day even if the catalogue changes meanwhile, except
+that a slot whose challenge is inactive is not shown: it can't be completed.
+"""
+import random
+from hashlib import sha256
+
+from asgiref.sync import sync_to_async
+from django.db.models import OuterRef, Q, Subquery
+
+from EcoTrack.aio import alist
+from EcoTrack.days import auser_timezone, day_start, local_today
+
+from .models import Challenge, DailyChallengeAssignment, UserChallenge
+
+
+SLOTS = 3
+ASSIGN_BATCH_SIZE = 1000
+
+
+# Prefer challenges that can be achieved via activities (badge-related)
+ACHIEVABLE_KEYS = {'eco_commuter', 'green_eater', 'recycling_champion', 'energy_saver', 'carbon_neutral'}
+
+
+def is_activity_achievable(ch):
+	if getattr(ch, 'key', None):
+		if ch.key.lower() in ACHIEVABLE_KEYS:
+			return True
+	# fallback: check title tokens
+	title = (ch.title or '').lower()
+	for tok in ('eco commuter','bike','commuter','vegetarian','vegan','recycle','recycling','renewable','carbon'):
+		if tok in title:
+			return True
+	return False
+
+
+def daily_selection(user_id, seed_date, active_challenges, fillers):
+	"""Pick the 3 challenge slots shown to ``user_id`` on ``seed_date`` (the challenge day as an ISO date).
+
+	``fillers`` are inactive challenges, newest first; they are only used when
+	there are fewer than 3 active ones. Pure: the same inputs always give the
+	same slots, whether computed lazily or by the nightly command.
+	"""
+	# deterministic per-user-per-day randomization
+	seed_input = f"{user_id}:{seed_date}"
+	seed = int(sha256(seed_input.encode('utf-8')).hexdigest(), 16) & 0xffffffff
+	rnd = random.Random(seed)
+	# Determine a stable, unique set of up to 3 challenges.
+	# Strategy: prefer active challenges (shuffled deterministically), then add inactive fillers
+	# to reach 3 unique items. Only allow duplicates if no other challenges exist.
+	selected = []
+	shuffled_active = list(active_challenges)
+	rnd.shuffle(shuffled_active)
+	# pick active challenges first (unique)
+	for c in shuffled_active:
+		if len(selected) >= 3:
+			break
+		selected.append(c)
+	# if still short, try inactive fillers (newest first) without duplicating
+	for f in fillers:
+		if len(selected) >= 3:
+			break
+		if f.id in {ch.id for ch in selected}:
+			continue
+		selected.append(f)
+	# As a last resort (no active or inactive others), allow deterministic duplication of the available active
+	if len(selected) < 3:
+		if shuffled_active:
+			idx = 0
+			while len(selected) < 3:
+				selected.append(shuffled_active[idx % len(shuffled_active)])
+				idx += 1
+	# Final list to use
+	all_challenges = selected[:3]
+
+	# ensure we always return 3 slots: keep the first seeded choice as primary, then prefer activity-achievable challenges
+	primary = all_challenges[0] if all_challenges else None
+	activity_pool = [c for c in all_challenges if is_activity_achievable(c) and c != primary]
+	other_pool = [c for c in all_challenges if c not in activity_pool and c != primary]
+	challenges = []
+	if primary:
+		challenges.append(primary)
+	# fill remaining slots from activity_pool, then other_pool
+	for pool in (activity_pool, other_pool):
+		for c in pool:
+			if len(challenges) >= 3:
+				break
+			challenges.append(c)
+		if len(challenges) >= 3:
+			break
+	return challenges
+
+
+def challenge_day(now=None, user=None, tz=None):
+	"""The current challenge day: today's date in ``tz`` or ``user``'s zone (the site default without either)."""
+	return local_today(user, now, tz)
+
+
+def challenge_catalogue():
+	"""``(active, fillers)`` for ``daily_selection``; inactive fillers only when there are too few active challenges.
+
+	One query: the active challenges plus the newest ``SLOTS`` inactive ones,
+	which are dropped again when enough are active.
+	"""
+	newest_inactive = Challenge.objects.filter(is_active=False).order_by('-created_at').values('id')[:SLOTS]
+	# daily_selection shuffles the active list with a seeded RNG; it needs a stable order to be deterministic
+	rows = list(Challenge.objects.filter(Q(is_active=True) | Q(id__in=newest_inactive)).order_by('id'))
+	active = [c for c in rows if c.is_active]
+	fillers = []
+	if len(active) < SLOTS:
+		fillers = sorted((c for c in rows if not c.is_active), key=lambda c: c.created_at, reverse=True)[:SLOTS - len(active)]
+	return active, fillers
+
+
+def assign_day(user_ids, day, catalogue=None):
+	"""Store ``day``'s slots for ``user_ids``; slots that already exist are kept. Returns the rows offered."""
+	active, fillers = catalogue or challenge_catalogue()
+	seed_date = day.isoformat()
+	rows = [
+		DailyChallengeAssignment(user_id=user_id, day=day, slot=slot, challenge=challenge)
+		for user_id in user_ids
+		for slot, challenge in enumerate(daily_selection(user_id, seed_date, active, fillers))
+	]
+	DailyChallengeAssignment.objects.bulk_create(rows, ignore_conflicts=True, batch_size=ASSIGN_BATCH_SIZE)
+	return len(rows)
+
+
+def assignments(user_id, day, cutoff):
+	"""``day``'s slots for ``user_id`` with their challenge, annotated with ``completed_at`` (since ``cutoff``) or None."""
+	completed = UserChallenge.objects.filter(
+		user_id=user_id, challenge_id=OuterRef('challenge_id'), completed=True, completed_at__gte=cutoff,
+	)
+	return (
+		DailyChallengeAssignment.objects.filter(user_id=user_id, day=day)
+		.select_related('challenge')
+		.annotate(completed_at=Subquery(completed.values('completed_at')[:1]))
+		.order_by('slot')
+	)
+
+
+async def adaily_challenges(user, now=None):
+	"""Today's challenge slots for ``user`` with their completion status, as JSON-ready dicts."""
+	# completions before the user's local midnight are treated as expired
+	tz = await auser_timezone(user)
+	day = challenge_day(now, tz=tz)
+	cutoff = day_start(tz, day)
+	slots = await alist(assignments(user.id, day, cutoff))
+	if not slots:
+		# first visit of the day and the nightly assignment hasn't covered this user
+		await sync_to_async(assign_day)([user.id], day)
+		slots = await alist(assignments(user.id, day, cutoff))
+
+	data = []
+	for a in slots:
+		c = a.challenge
+		if not c.is_active:
+			# deactivated since it was assigned; toggling it would 404
+			continue
+		data.append({
+			'id': c.id,
+			'title': c.title,
+			'description': c.description,
+			'points': c.points,
+			'completed': a.completed_at is not None,
+			'completed_at': a.completed_at.isoformat() if a.completed_at else None,
+		})
+	return data
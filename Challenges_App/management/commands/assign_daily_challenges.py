@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Challenges_App.daily import ASSIGN_BATCH_SIZE, assign_day, challenge_catalogue, challenge_day
+from Challenges_App.models import DailyChallengeAssignment
+
+
+class Command(BaseCommand):
+	help = (
+		"Store the day's challenge slots for every active user, so the challenge list is a single join. "
+		'Run nightly after midnight in DAY_BOUNDARY_TZ; users already assigned (e.g. lazily on a visit) are left as they are, '
+		'and users in other timezones are assigned lazily on their first visit of their day.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--day', help='Challenge day as YYYY-MM-DD (default: today in DAY_BOUNDARY_TZ).')
+		parser.add_argument('--batch-size', type=int, default=ASSIGN_BATCH_SIZE,
+			help=f'Users per insert batch (default {ASSIGN_BATCH_SIZE}).')
+		parser.add_argument('--keep-days', type=int, default=7,
+			help='Delete assignments older than this many days before --day (default 7).')
+
+	def handle(self, *args, **options):
+		try:
+			day = date.fromisoformat(options['day']) if options['day'] else challenge_day()
+		except ValueError:
+			raise CommandError(f"--day must be YYYY-MM-DD, not {options['day']!r}.")
+		if options['batch_size'] < 1 or options['keep_days'] < 0:
+			raise CommandError('--batch-size must be at least 1 and --keep-days not negative.')
+
+		# one catalogue read for the whole run
+		catalogue = challenge_catalogue()
+		user_ids = get_user_model().objects.filter(is_active=True).order_by('id').values_list('id', flat=True)
+		users = rows = 0
+		last_id = 0
+		while True:
+			batch = list(user_ids.filter(id__gt=last_id)[:options['batch_size']])
+			if not batch:
+				break
+			rows += assign_day(batch, day, catalogue=catalogue)
+			users += len(batch)
+			last_id = batch[-1]
+		pruned, _ = DailyChallengeAssignment.objects.filter(day__lt=day - timedelta(days=options['keep_days'])).delete()
+		self.stdout.write(f'{day}: assigned {rows} slot(s) to {users} user(s); pruned {pruned} old slot(s).')
+		self.stdout.write(self.style.SUCCESS('Daily challenges assigned.'))
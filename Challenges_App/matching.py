@@ -0,0 +1,202 @@
+"""In-process index that maps an activity's (category, subtype) to the active
+challenges it completes.
+
+Challenge titles are compiled into matcher functions once; the matches for a
+given (category, normalized subtype) are then memoized, so logging an activity
+only touches the challenges that can actually match it. The badge -> challenge
+resolution table lives alongside it. Both are dropped by the Challenge
+post_save/post_delete signals. A version number kept in
+Django's cache lets other worker processes notice the change too.
+"""
+import threading
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from EcoTrack.days import day_cutoff
+
+from .models import Challenge, UserChallenge
+
+# Only the newest active challenges take part in activity matching
+MAX_INDEXED_CHALLENGES = 50
+# Bound on memoized (category, subtype) keys; subtypes are free text
+MAX_MEMO_KEYS = 1024
+VERSION_CACHE_KEY = 'challenges:index-version'
+
+
+def normalize(category, subtype):
+	return (category or '').lower(), (subtype or '').lower()
+
+
+def compile_matcher(title):
+	"""Turn a challenge title into a ``(cat, subtype) -> bool`` matcher.
+
+	Mirrors the keyword heuristics that used to run per request: transport
+	bike/walk, diet keywords, renewable energy, then any title word.
+	"""
+	title = (title or '').lower()
+
+	# Transport-related: if challenge mentions 'bike' or 'walk' and activity is transportation with bicycle/walk
+	if 'bike' in title or 'bicycle' in title or 'walk' in title:
+		return lambda cat, subtype: cat.startswith('transport') and subtype in ('bicycle', 'bike', 'walk')
+
+	# Diet: vegetarian/vegan/meat/fish keywords
+	diet_words = [w for w in ('vegetarian', 'vegan', 'meat', 'fish') if w in title]
+	if diet_words:
+		return lambda cat, subtype: cat == 'diet' and any(w in subtype for w in diet_words)
+
+	# Energy: renewable keyword
+	if 'renewable' in title:
+		return lambda cat, subtype: cat == 'energy' and subtype == 'renewable'
+
+	# fallback: if challenge title words appear in subtype or category
+	words = [w for w in title.split() if w]
+	return lambda cat, subtype: any(w in subtype or w in cat for w in words)
+
+
+class ChallengeIndex:
+	"""Compiled matchers for a snapshot of the active challenges."""
+
+	def __init__(self, challenges, version=0):
+		self.version = version
+		self.challenges = {ch.id: ch for ch in challenges}
+		self._matchers = [(ch.id, compile_matcher(ch.title)) for ch in challenges]
+		self._memo = {}
+		self._lock = threading.Lock()
+
+	def match(self, category, subtype):
+		"""Ids of the indexed challenges completed by this kind of activity."""
+		key = normalize(category, subtype)
+		ids = self._memo.get(key)
+		if ids is None:
+			ids = tuple(cid for cid, matcher in self._matchers if matcher(*key))
+			with self._lock:
+				if len(self._memo) >= MAX_MEMO_KEYS:
+					self._memo.clear()
+				self._memo[key] = ids
+		return ids
+
+	def match_activities(self, activities):
+		"""Union of matched challenge ids across ``activities``, in index order."""
+		matched = set()
+		for activity in activities:
+			matched.update(self.match(activity.category, activity.subtype))
+		return [cid for cid, _ in self._matchers if cid in matched]
+
+
+_index = None
+_index_lock = threading.Lock()
+_badge_table = None
+
+
+def _current_version():
+	try:
+		return cache.get(VERSION_CACHE_KEY, 0)
+	except Exception:
+		return 0
+
+
+def get_challenge_index():
+	"""Return the process-wide index, rebuilding it if missing or stale."""
+	global _index
+	version = _current_version()
+	index = _index
+	if index is not None and index.version == version:
+		return index
+	with _index_lock:
+		if _index is None or _index.version != version:
+			challenges = list(Challenge.objects.filter(is_active=True).order_by('-created_at')[:MAX_INDEXED_CHALLENGES])
+			_index = ChallengeIndex(challenges, version=version)
+		return _index
+
+
+def build_badge_challenge_table(badge_tokens):
+	"""Resolve each badge key to the Challenge that awards its points.
+
+	``badge_tokens`` maps badge key -> title tokens. An explicit
+	``Challenge.key`` match wins; otherwise the first challenge (by id) whose
+	title contains a token, trying tokens in order. Returns key -> challenge id
+	for the keys that resolve.
+	"""
+	rows = list(Challenge.objects.order_by('id').values_list('id', 'key', 'title'))
+	by_key = {}
+	for cid, key, _ in rows:
+		if key:
+			by_key.setdefault(key.lower(), cid)
+	table = {}
+	for badge_key, tokens in badge_tokens.items():
+		cid = by_key.get(badge_key.lower())
+		for token in tokens:
+			if cid:
+				break
+			cid = next((rid for rid, _, title in rows if token in (title or '').lower()), None)
+		if cid:
+			table[badge_key] = cid
+	return table
+
+
+def get_badge_challenge_table(badge_tokens):
+	"""Cached ``build_badge_challenge_table``; rebuilt whenever a Challenge changes."""
+	global _badge_table
+	version = _current_version()
+	table = _badge_table
+	if table is not None and table[0] == version:
+		return table[1]
+	with _index_lock:
+		if _badge_table is None or _badge_table[0] != version:
+			_badge_table = (version, build_badge_challenge_table(badge_tokens))
+		return _badge_table[1]
+
+
+def invalidate_challenge_index():
+	"""Drop the local index and bump the shared version for other processes."""
+	global _index, _badge_table
+	with _index_lock:
+		_index = None
+		_badge_table = None
+	try:
+		cache.add(VERSION_CACHE_KEY, 0, timeout=None)
+		cache.incr(VERSION_CACHE_KEY)
+	except Exception:
+		pass
+
+
+def challenge_day_cutoff(now=None, user=None, tz=None):
+	"""Start of the current challenge day (local midnight for ``user``, see ``EcoTrack.days``) as an aware UTC datetime."""
+	return day_cutoff(user, now, tz)
+
+
+def complete_matching_challenges(user, activities, cutoff):
+	"""Mark challenges matched by ``activities`` as completed with one bulk upsert.
+
+	Challenges the user already completed at or after ``cutoff`` (today's
+	midnight) are skipped. Returns the ids of the newly completed challenges.
+	"""
+	matched = get_challenge_index().match_activities(activities)
+	if not matched:
+		return []
+	# guard against a snapshot that predates a rolled-back or cross-process change
+	live = set(Challenge.objects.filter(id__in=matched, is_active=True).values_list('id', flat=True))
+	matched = [cid for cid in matched if cid in live]
+
+	existing = list(UserChallenge.objects.filter(user=user, challenge_id__in=matched).values_list('challenge_id', 'completed', 'completed_at'))
+	done_today = {cid for cid, completed, completed_at in existing if completed and completed_at and completed_at >= cutoff}
+	already_completed = {cid for cid, completed, _ in existing if completed}
+	newly_completed = [cid for cid in matched if cid not in done_today]
+	if not newly_completed:
+		return []
+
+	now = timezone.now()
+	UserChallenge.objects.bulk_create(
+		[UserChallenge(user=user, challenge_id=cid, completed=True, completed_at=now) for cid in newly_completed],
+		update_conflicts=True,
+		unique_fields=['user', 'challenge'],
+		update_fields=['completed', 'completed_at'],
+	)
+	# bulk_create skips post_save, so credit points and drop the snapshot explicitly;
+	# a challenge completed again on a later day was already credited
+	from Dashboard_App.points import credit_challenges
+	from Dashboard_App.snapshot import invalidate_dashboard_snapshot
+	credit_challenges(user.id, [cid for cid in newly_completed if cid not in already_completed])
+	invalidate_dashboard_snapshot(user.id)
+	return newly_completed
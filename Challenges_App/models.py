@@ -29,4 +29,24 @@ class UserChallenge(models.Model):
 		return f"{self.user} - {self.challenge} - {'done' if self.completed else 'open'}"
 
 
+class DailyChallengeAssignment(models.Model):
+	"""The challenge shown in one of a user's slots on one challenge day (the user's local date).
 
+	Filled for a user on their first visit of the day, or for everyone by
+	``manage.py assign_daily_challenges``; both use the same deterministic
+	per-user-per-day selection (``Challenges_App.daily.daily_selection``).
+	"""
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+	day = models.DateField()
+	slot = models.PositiveSmallIntegerField()
+	challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE)
+
+	class Meta:
+		unique_together = ('user', 'day', 'slot')
+		indexes = [
+			# nightly pruning of old days
+			models.Index(fields=['day'], name='daily_challenge_day_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.user} - {self.day} #{self.slot}: {self.challenge_id}"
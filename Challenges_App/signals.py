@@ -0,0 +1,9 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender='Challenges_App.Challenge')
+@receiver(post_delete, sender='Challenges_App.Challenge')
+def invalidate_challenge_index_on_change(sender, instance, **kwargs):
+    from Challenges_App.matching import invalidate_challenge_index
+    invalidate_challenge_index()
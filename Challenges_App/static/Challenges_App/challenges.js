@@ -22,24 +22,15 @@ document.addEventListener('DOMContentLoaded', function() {
       });
   }
 
-  // Populate points from dashboard status API and update the points box
-  function fetchPoints() {
-    fetch('/dashboard/api/status/', { credentials: 'same-origin' })
-      .then(r => r.json())
-      .then(js => {
-        if (!js || !js.success) return;
-        const pts = Number(js.points || 0);
-        const pEl = document.getElementById('userPointsChallenges');
-        if (pEl) pEl.textContent = pts;
-      })
-      .catch(err => {
-        // silently ignore; optional to log
-        // console.warn('Failed to load points', err);
-      });
+  function renderPoints(points) {
+    const pts = Number(points || 0);
+    const pEl = document.getElementById('userPointsChallenges');
+    if (pEl) pEl.textContent = pts;
   }
 
+  // One bootstrap request loads the challenge slots and the points together
   function fetchList() {
-    fetch('/challenges/api/list/', {
+    fetch('/api/bootstrap/?include=challenges,points', {
       method: 'GET',
       credentials: 'same-origin'
     })
@@ -47,8 +38,7 @@ document.addEventListener('DOMContentLoaded', function() {
     .then(json => {
       if (!json.success) return;
       renderList(json.challenges || []);
-      // refresh points after list render to ensure UI shows authoritative value
-      try { fetchPoints(); } catch (e) {}
+      renderPoints(json.points);
     })
     .catch(e => console.warn('Failed to load challenges', e));
   }
@@ -111,8 +101,6 @@ document.addEventListener('DOMContentLoaded', function() {
   }
 
   fetchList();
-  // initial points fetch in case the challenges list fetch doesn't run or is slow
-  try { fetchPoints(); } catch (e) {}
 });
 
 function getActivityIcon(item) {
@@ -28,3 +28,104 @@ class ChallengesApiTests(TestCase):
 		resp3 = self.client.post('/challenges/api/toggle/', data=json.dumps({'challenge_id': self.challenge.id, 'completed': False}), content_type='application/json')
 		self.assertEqual(resp3.status_code, 200)
 		self.assertFalse(UserChallenge.objects.get(user=self.user, challenge=self.challenge).completed)
+
+
+class ChallengeMatcherIndexTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.user = User.objects.create_user(username='matchuser', password='pass')
+		self.bike = Challenge.objects.create(title='Bike to school', points=5)
+		self.vegan = Challenge.objects.create(title='Eat a vegan lunch', points=3)
+		self.client = Client()
+		self.client.login(username='matchuser', password='pass')
+
+	def test_index_matches_by_category_and_subtype(self):
+		from .matching import get_challenge_index
+		index = get_challenge_index()
+		self.assertEqual(index.match('transportation', 'Bicycle'), (self.bike.id,))
+		self.assertEqual(index.match('diet', 'vegan'), (self.vegan.id,))
+		self.assertEqual(index.match('energy', 'grid'), ())
+
+	def test_index_is_rebuilt_after_challenge_changes(self):
+		from .matching import get_challenge_index
+		before = get_challenge_index()
+		renew = Challenge.objects.create(title='Use renewable power', points=4)
+		after = get_challenge_index()
+		self.assertIsNot(before, after)
+		self.assertEqual(after.match('energy', 'renewable'), (renew.id,))
+		renew.delete()
+		self.assertEqual(get_challenge_index().match('energy', 'renewable'), ())
+
+	def test_add_activity_completes_matching_challenge_once_per_day(self):
+		payload = {'category': 'transportation', 'type': 'bicycle', 'distance': '2', 'impact': '0'}
+		resp = self.client.post('/activity/api/add/', data=json.dumps(payload), content_type='application/json')
+		self.assertEqual(resp.json()['challenges_completed'], [self.bike.id])
+		uc = UserChallenge.objects.get(user=self.user, challenge=self.bike)
+		self.assertTrue(uc.completed)
+		self.assertEqual(self.user.points.total_points, 5)
+
+		resp2 = self.client.post('/activity/api/add/', data=json.dumps(payload), content_type='application/json')
+		self.assertEqual(resp2.json()['challenges_completed'], [])
+
+
+class DailyAssignmentTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.user = User.objects.create_user(username='dailytest', password='pass')
+		self.other = User.objects.create_user(username='dailyother', password='pass')
+		self.challenges = [Challenge.objects.create(title=f'Challenge {i}', points=i + 1) for i in range(6)]
+		self.client = Client()
+		self.client.login(username='dailytest', password='pass')
+
+	def _listed_ids(self):
+		return [c['id'] for c in self.client.get('/challenges/api/list/').json()['challenges']]
+
+	def test_first_visit_stores_the_deterministic_selection(self):
+		from .daily import challenge_catalogue, challenge_day, daily_selection
+		from .models import DailyChallengeAssignment
+		day = challenge_day()
+		expected = [c.id for c in daily_selection(self.user.id, day.isoformat(), *challenge_catalogue())]
+		self.assertEqual(self._listed_ids(), expected)
+		stored = DailyChallengeAssignment.objects.filter(user=self.user, day=day).order_by('slot')
+		self.assertEqual([a.challenge_id for a in stored], expected)
+
+	def test_slots_are_fixed_for_the_day_and_read_with_one_query(self):
+		first = self._listed_ids()
+		# catalogue changes mid-day don't reshuffle the slots
+		Challenge.objects.create(title='Late addition', points=9)
+		self._listed_ids()
+		with self.assertNumQueries(3):  # session, user, slots join
+			self.assertEqual(self._listed_ids(), first)
+
+	def test_completion_status_comes_from_todays_completions(self):
+		slot = self._listed_ids()[0]
+		self.client.post('/challenges/api/toggle/', data=json.dumps({'challenge_id': slot, 'completed': True}), content_type='application/json')
+		listed = {c['id']: c for c in self.client.get('/challenges/api/list/').json()['challenges']}
+		self.assertTrue(listed[slot]['completed'])
+		self.assertIsNotNone(listed[slot]['completed_at'])
+
+	def test_deactivated_challenges_drop_out_of_todays_slots(self):
+		first = self._listed_ids()
+		Challenge.objects.filter(pk=first[1]).update(is_active=False)
+		self.assertEqual(self._listed_ids(), [first[0], first[2]])
+
+	def test_catalogue_order_does_not_depend_on_the_database(self):
+		from .daily import challenge_catalogue
+		active, _ = challenge_catalogue()
+		self.assertEqual([c.id for c in active], sorted(c.id for c in self.challenges))
+
+	def test_nightly_command_assigns_every_user_and_prunes(self):
+		from datetime import timedelta
+		from io import StringIO
+		from django.core.management import call_command
+		from .daily import challenge_day, daily_selection, challenge_catalogue
+		from .models import DailyChallengeAssignment
+		day = challenge_day()
+		old = DailyChallengeAssignment.objects.create(user=self.user, day=day - timedelta(days=30), slot=0, challenge=self.challenges[0])
+		call_command('assign_daily_challenges', '--batch-size', '1', stdout=StringIO())
+		self.assertFalse(DailyChallengeAssignment.objects.filter(pk=old.pk).exists())
+		for user in (self.user, self.other):
+			self.assertEqual(DailyChallengeAssignment.objects.filter(user=user, day=day).count(), 3)
+		# the lazy path would have picked the same slots
+		expected = [c.id for c in daily_selection(self.user.id, day.isoformat(), *challenge_catalogue())]
+		self.assertEqual(self._listed_ids(), expected)
@@ -4,9 +4,8 @@ from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.http import require_POST, require_GET
 from django.utils import timezone
 
+from .daily import adaily_challenges
 from .models import Challenge, UserChallenge
-import random
-from hashlib import sha256
 
 
 @login_required
@@ -18,111 +17,9 @@ def challenges_view(request):
 
 @login_required
 @require_GET
-def list_challenges_api(request):
+async def list_challenges_api(request):
 	"""Return JSON list of active challenges and user's completion status."""
-	user = request.user
-	# return exactly 3 challenges per user, randomized per-user-per-day (GMT+8)
-	# start with active challenges; we'll duplicate them if needed to reach 3 slots
-	active_challenges = list(Challenge.objects.filter(is_active=True))
-	all_challenges = list(active_challenges)
-
-	# determine daily cutoff (GMT+8 midnight) — treat completions before cutoff as expired
-	from django.utils import timezone
-	from zoneinfo import ZoneInfo
-	import datetime
-	try:
-		tz = ZoneInfo('Asia/Manila')
-	except Exception:
-		tz = ZoneInfo('UTC')
-	now = timezone.now()
-	now_tz = now.astimezone(tz)
-	# use the date in GMT+8 as the seed element so selection is stable per user per day
-	seed_date = now_tz.date().isoformat()
-
-	# deterministic per-user-per-day randomization
-	seed_input = f"{user.id}:{seed_date}"
-	seed = int(sha256(seed_input.encode('utf-8')).hexdigest(), 16) & 0xffffffff
-	rnd = random.Random(seed)
-	# Determine a stable, unique set of up to 3 challenges.
-	# Strategy: prefer active challenges (shuffled deterministically), then add inactive fillers
-	# to reach 3 unique items. Only allow duplicates if no other challenges exist.
-	selected = []
-	shuffled_active = list(active_challenges)
-	rnd.shuffle(shuffled_active)
-	# pick active challenges first (unique)
-	for c in shuffled_active:
-		if len(selected) >= 3:
-			break
-		selected.append(c)
-	# if still short, try inactive fillers (newest first) without duplicating
-	if len(selected) < 3:
-		fillers = list(Challenge.objects.filter(is_active=False).order_by('-created_at'))
-		for f in fillers:
-			if len(selected) >= 3:
-				break
-			if f.id in {ch.id for ch in selected}:
-				continue
-			selected.append(f)
-	# As a last resort (no active or inactive others), allow deterministic duplication of the available active
-	if len(selected) < 3:
-		if shuffled_active:
-			idx = 0
-			while len(selected) < 3:
-				selected.append(shuffled_active[idx % len(shuffled_active)])
-				idx += 1
-	# Final list to use
-	all_challenges = selected[:3]
-	# Prefer challenges that can be achieved via activities (badge-related)
-	ACHIEVABLE_KEYS = {'eco_commuter', 'green_eater', 'recycling_champion', 'energy_saver', 'carbon_neutral'}
-	def is_activity_achievable(ch):
-		if getattr(ch, 'key', None):
-			if ch.key.lower() in ACHIEVABLE_KEYS:
-				return True
-		# fallback: check title tokens
-		title = (ch.title or '').lower()
-		for tok in ('eco commuter','bike','commuter','vegetarian','vegan','recycle','recycling','renewable','carbon'):
-			if tok in title:
-				return True
-		return False
-
-	# ensure we always return 3 slots: keep the first seeded choice as primary, then prefer activity-achievable challenges
-	primary = all_challenges[0] if all_challenges else None
-	activity_pool = [c for c in all_challenges if is_activity_achievable(c) and c != primary]
-	other_pool = [c for c in all_challenges if c not in activity_pool and c != primary]
-	challenges = []
-	if primary:
-		challenges.append(primary)
-	# fill remaining slots from activity_pool, then other_pool
-	for pool in (activity_pool, other_pool):
-		for c in pool:
-			if len(challenges) >= 3:
-				break
-			challenges.append(c)
-		if len(challenges) >= 3:
-			break
-	data = []
-	# preload userchallenge mapping
-	uc_qs = UserChallenge.objects.filter(user=user, challenge__in=challenges)
-	uc_map = {uc.challenge_id: uc for uc in uc_qs}
-	cutoff_tz = now_tz.replace(hour=0, minute=0, second=0, microsecond=0)
-	cutoff_utc = cutoff_tz.astimezone(datetime.timezone.utc)
-	for c in challenges:
-		uc = uc_map.get(c.id)
-		completed = False
-		completed_at = None
-		if uc and uc.completed and uc.completed_at:
-			# only consider completed if it's after today's GMT+8 midnight
-			if uc.completed_at >= cutoff_utc:
-				completed = True
-				completed_at = uc.completed_at.isoformat()
-		data.append({
-			'id': c.id,
-			'title': c.title,
-			'description': c.description,
-			'points': c.points,
-			'completed': completed,
-			'completed_at': completed_at,
-		})
+	data = await adaily_challenges(await request.auser())
 	return JsonResponse({'success': True, 'challenges': data})
 
 
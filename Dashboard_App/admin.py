@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import UserBadge
+from .models import UserBadge, BadgeProgress, PointsLedger
 
 
 @admin.register(UserBadge)
@@ -9,4 +9,17 @@ class UserBadgeAdmin(admin.ModelAdmin):
 	list_filter = ('key',)
 	search_fields = ('user__username', 'key')
 
-# Register your models here.
+
+@admin.register(BadgeProgress)
+class BadgeProgressAdmin(admin.ModelAdmin):
+	list_display = ('user', 'eco_km', 'eco_max_daily_trips', 'veg_meals', 'renewable_uses', 'recycle_count', 'total_footprint', 'updated_at')
+	search_fields = ('user__username',)
+	readonly_fields = ('updated_at',)
+
+
+@admin.register(PointsLedger)
+class PointsLedgerAdmin(admin.ModelAdmin):
+	list_display = ('user', 'delta', 'reason', 'source_id', 'created_at')
+	list_filter = ('reason',)
+	search_fields = ('user__username',)
+	readonly_fields = ('user', 'delta', 'reason', 'source_id', 'created_at')
@@ -1,37 +1,288 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from Activity_App.models import Activity
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET
+from Activity_App.summary import abreakdown
+from Challenges_App.daily import adaily_challenges
+from Dashboard_App.leaderboard import HIGHER_IS_BETTER, my_rank, top
+from Dashboard_App.models import DailyFootprint
+from Dashboard_App.rollups import aensure_rollup, ensure_rollup, footprint_last_modified
+from Dashboard_App.snapshot import aget_dashboard_snapshot
+from EcoTrack.days import auser_timezone, local_today
 from django.db.models import Sum
-from django.db.models.functions import TruncDay, TruncMonth, TruncYear, TruncWeek
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
+from calendar import timegm
+import asyncio
+import datetime
+import hashlib
+
+# granularity -> (DB truncation of the rollup day, python truncation, step to the next period)
+GRANULARITIES = {
+    'day': (None, lambda d: d, lambda d: d + datetime.timedelta(days=1)),
+    'week': (TruncWeek, lambda d: d - datetime.timedelta(days=d.weekday()), lambda d: d + datetime.timedelta(days=7)),
+    'month': (TruncMonth, lambda d: d.replace(day=1), lambda d: (d.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)),
+    'year': (TruncYear, lambda d: d.replace(month=1, day=1), lambda d: d.replace(year=d.year + 1)),
+}
+# Refuse windows that would gap-fill into an unreasonably long series
+MAX_BUCKETS = 1000
+# Fields the bootstrap API can return; the first three come from the dashboard snapshot
+BOOTSTRAP_FIELDS = ('recent', 'badges', 'points', 'breakdown', 'series', 'challenges')
+SNAPSHOT_FIELDS = {'recent', 'badges', 'points'}
+# Bootstrap series window when the client sends none
+DEFAULT_SERIES_DAYS = 30
+
+
+def _week_start(day):
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def _bucket(daily, key, truncate):
+    """Re-bucket sorted daily totals into coarser periods (week/month/year)."""
+    series = []
+    for row in daily:
+        start = truncate(row['day'])
+        if series and series[-1][key] == start:
+            series[-1]['total'] += row['total']
+        else:
+            series.append({key: start, 'total': row['total']})
+    return series
+
+
+def _daily_rows(user):
+    return DailyFootprint.objects.filter(user=user).values('day').order_by('day').annotate(total=Sum('total'))
+
+
+def daily_totals(user):
+    """Per-day footprint totals for ``user`` read from the DailyFootprint rollup."""
+    ensure_rollup(user.id)
+    return list(_daily_rows(user))
+
+
+async def adaily_totals(user):
+    """``daily_totals`` through the async ORM."""
+    await aensure_rollup(user.id)
+    return [r async for r in _daily_rows(user)]
+
+
+def _parse_day(value):
+    if not value:
+        return None
+    return datetime.date.fromisoformat(value)
+
+
+def _parse_window(request):
+    """``start``/``end`` query parameters as dates; raises ValueError when invalid."""
+    start = _parse_day(request.GET.get('start'))
+    end = _parse_day(request.GET.get('end'))
+    if start and end and start > end:
+        raise ValueError('start is after end')
+    return start, end
+
+
+def _period_rows(user, granularity, start, end):
+    """The grouped rollup query behind ``period_series`` and the name of its period column."""
+    db_trunc = GRANULARITIES[granularity][0]
+    rows = DailyFootprint.objects.filter(user=user)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    if db_trunc is not None:
+        rows = rows.annotate(period=db_trunc('day'))
+        group = 'period'
+    else:
+        group = 'day'
+    return rows.values(group).order_by(group).annotate(total=Sum('total')), group
+
+
+def _fill_periods(totals, granularity, start, end):
+    if not totals and not (start and end):
+        return []
+    _, truncate, step = GRANULARITIES[granularity]
+    first = truncate(start or min(totals))
+    last = truncate(end or max(totals))
+    series = []
+    period = first
+    while period <= last:
+        if len(series) >= MAX_BUCKETS:
+            raise ValueError(f'Window spans more than {MAX_BUCKETS} {granularity}s')
+        series.append({'period': period, 'total': float(totals.get(period) or 0)})
+        period = step(period)
+    return series
+
+
+def period_series(user, granularity, start=None, end=None):
+    """Footprint totals per ``granularity`` period between ``start`` and ``end``.
+
+    Runs a single query over the rollup, grouped in the database, and fills
+    periods without activity with zero. Missing bounds default to the first
+    and last day with data.
+    """
+    ensure_rollup(user.id)
+    rows, group = _period_rows(user, granularity, start, end)
+    totals = {r[group]: r['total'] for r in rows}
+    return _fill_periods(totals, granularity, start, end)
+
+
+async def aperiod_series(user, granularity, start=None, end=None):
+    """``period_series`` through the async ORM."""
+    await aensure_rollup(user.id)
+    rows, group = _period_rows(user, granularity, start, end)
+    totals = {r[group]: r['total'] async for r in rows}
+    return _fill_periods(totals, granularity, start, end)
+
+
+async def _timeseries_validators(request, user):
+    """Quoted ETag and Last-Modified timestamp of the requested series, or ``(None, None)``."""
+    stamp = await sync_to_async(footprint_last_modified)(user.id)
+    if stamp is None:
+        return None, None
+    raw = f"{user.id}:{stamp.isoformat()}:{request.GET.urlencode()}"
+    return quote_etag(hashlib.sha1(raw.encode('utf-8')).hexdigest()), timegm(stamp.utctimetuple())
+
+
+@login_required
+async def carbon_footprint_timeseries(request):
+    """Carbon footprint totals over time for the logged-in user.
+
+    With ``?granularity=day|week|month|year`` (optionally ``start``/``end`` as
+    YYYY-MM-DD) only that gap-filled series is computed. Responses carry an
+    ETag/Last-Modified tied to the user's latest activity change, so an
+    unchanged chart is answered with 304. Without ``granularity`` every
+    series is returned, as before.
+
+    Conditional requests are handled here rather than with ``condition()``,
+    whose validator functions would run the cache/ORM lookups synchronously.
+    """
+    user = await request.auser()
+    granularity = request.GET.get('granularity')
+    if granularity:
+        if granularity not in GRANULARITIES:
+            return JsonResponse({'success': False, 'error': 'Invalid granularity'}, status=400)
+        etag, last_modified = await _timeseries_validators(request, user)
+        if etag is not None:
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return not_modified
+        try:
+            start, end = _parse_window(request)
+            series = await aperiod_series(user, granularity, start, end)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        response = JsonResponse({
+            'success': True,
+            'granularity': granularity,
+            'start': start,
+            'end': end,
+            'series': series,
+        })
+        # let the browser keep the payload but always revalidate it with the ETag
+        patch_cache_control(response, private=True, no_cache=True)
+        if etag is not None and request.method in ('GET', 'HEAD'):
+            response.headers['ETag'] = etag
+            response.headers['Last-Modified'] = http_date(last_modified)
+        return response
+
+    # One rollup query; coarser granularities are folded from the daily rows
+    daily = await adaily_totals(user)
+    return JsonResponse({
+        'success': True,
+        'daily': daily,
+        'weekly': _bucket(daily, 'week', _week_start),
+        'monthly': _bucket(daily, 'month', lambda d: d.replace(day=1)),
+        'yearly': _bucket(daily, 'year', lambda d: d.replace(month=1, day=1)),
+        # Overall (daily series for the full history)
+        'overall': daily,
+    })
+
 
 @login_required
-def carbon_footprint_timeseries(request):
-    user = request.user
-    # Aggregate by day
-    daily = Activity.objects.filter(user=user).annotate(
-        day=TruncDay('date')
-    ).values('day').order_by('day').annotate(total=Sum('impact'))
-    # Aggregate by week
-    weekly = Activity.objects.filter(user=user).annotate(
-        week=TruncWeek('date')
-    ).values('week').order_by('week').annotate(total=Sum('impact'))
-    # Aggregate by month
-    monthly = Activity.objects.filter(user=user).annotate(
-        month=TruncMonth('date')
-    ).values('month').order_by('month').annotate(total=Sum('impact'))
-    # Aggregate by year
-    yearly = Activity.objects.filter(user=user).annotate(
-        year=TruncYear('date')
-    ).values('year').order_by('year').annotate(total=Sum('impact'))
-    # Aggregate overall (cumulative daily series for the full history)
-    overall = Activity.objects.filter(user=user).annotate(
-        day=TruncDay('date')
-    ).values('day').order_by('day').annotate(total=Sum('impact'))
+@require_GET
+async def bootstrap(request):
+    """Everything the dashboard and challenges pages load on open, in one request.
+
+    ``?include=`` is a comma-separated subset of ``BOOTSTRAP_FIELDS`` (default
+    all). ``breakdown`` is the all-time total and count per category,
+    ``recent`` the last 5 activities, and ``series`` takes the
+    carbon-timeseries ``granularity``/``start``/``end`` parameters (default:
+    daily over the last 30 days). Recent activities, badges and points come
+    from the one cached dashboard snapshot and the breakdown from one grouped
+    query, so nothing is computed twice; the parts run concurrently.
+    """
+    include = request.GET.get('include')
+    fields = {f.strip() for f in include.split(',') if f.strip()} if include else set(BOOTSTRAP_FIELDS)
+    unknown = fields - set(BOOTSTRAP_FIELDS)
+    if unknown:
+        return JsonResponse({'success': False, 'error': f"Unknown field(s): {', '.join(sorted(unknown))}"}, status=400)
+
+    user = await request.auser()
+    # resolved once here; the parts below read it from the user instance
+    tz = await auser_timezone(user)
+    # validate before creating any coroutine: an early return would leave them never awaited
+    if 'series' in fields:
+        granularity = request.GET.get('granularity', 'day')
+        if granularity not in GRANULARITIES:
+            return JsonResponse({'success': False, 'error': 'Invalid granularity'}, status=400)
+        try:
+            if {'granularity', 'start', 'end'} & set(request.GET):
+                start, end = _parse_window(request)
+            else:
+                end = local_today(tz=tz)
+                start = end - datetime.timedelta(days=DEFAULT_SERIES_DAYS - 1)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    parts = {}
+    if fields & SNAPSHOT_FIELDS:
+        parts['snapshot'] = aget_dashboard_snapshot(user)
+    if 'breakdown' in fields:
+        parts['breakdown'] = abreakdown(user)
+    if 'challenges' in fields:
+        parts['challenges'] = adaily_challenges(user)
+    if 'series' in fields:
+        parts['series'] = aperiod_series(user, granularity, start, end)
+
+    results = dict(zip(parts, await asyncio.gather(*parts.values(), return_exceptions=True)))
+    for result in results.values():
+        if isinstance(result, ValueError):
+            # a window without explicit bounds can still span too many periods
+            return JsonResponse({'success': False, 'error': str(result)}, status=400)
+        if isinstance(result, BaseException):
+            raise result
+
+    data = {'success': True}
+    snapshot = results.get('snapshot')
+    for field in SNAPSHOT_FIELDS & fields:
+        data[field] = snapshot[field]
+    if 'breakdown' in results:
+        data['breakdown'], data['counts'] = results['breakdown']
+    if 'challenges' in results:
+        data['challenges'] = results['challenges']
+    if 'series' in results:
+        data['series'] = {'granularity': granularity, 'start': start, 'end': end, 'series': results['series']}
+    return JsonResponse(data)
+
+
+@login_required
+def leaderboard(request):
+    """Top-N and the current user's rank on one precomputed board.
+
+    ``?board=`` is one of points_all, points_week, footprint_all,
+    footprint_week (default points_all); ``?n=`` caps the list (default 10).
+    Ranks are refreshed by ``manage.py refresh_leaderboards``.
+    """
+    board = request.GET.get('board', 'points_all')
+    if board not in HIGHER_IS_BETTER:
+        return JsonResponse({'success': False, 'error': 'Invalid board'}, status=400)
+    try:
+        n = max(int(request.GET.get('n', 10)), 1)
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid n'}, status=400)
     return JsonResponse({
         'success': True,
-        'daily': list(daily),
-        'weekly': list(weekly),
-        'monthly': list(monthly),
-        'yearly': list(yearly),
-        'overall': list(overall),
+        'board': board,
+        'top': top(board, n),
+        'me': my_rank(request.user, board),
     })
@@ -0,0 +1,232 @@
+"""Single registry of badge rules shared by the activity signal, dashboard views
+and the post-deletion re-evaluation.
+
+Each rule reads named metrics. Every metric is a conditional aggregate over
+the user's activities, so all rules for a user are evaluated in one query
+(``badge_metrics``). The same metric names are columns on ``BadgeProgress``,
+which lets the activity signal test the rules against the incremental
+counters without touching the Activity table.
+"""
+from django.db.models import Count, F, IntegerField, Max, Q, Subquery, Sum
+from django.utils import timezone
+
+from Activity_App.models import Activity
+
+
+ECO_TRIP_Q = (Q(category='transportation') | Q(category='transport')) & (Q(subtype__iexact='bicycle') | Q(subtype__iexact='walk'))
+VEG_MEAL_Q = Q(category='diet') & (Q(subtype__iexact='vegetarian') | Q(subtype__iexact='vegan'))
+RENEWABLE_Q = Q(category='energy', subtype__icontains='renew')
+RECYCLE_Q = Q(category='shopping') & (Q(subtype__icontains='recycle') | Q(subtype__icontains='reused') | Q(subtype__icontains='upcycle'))
+# the day an eco trip counts towards: its effective date, which the write paths and
+# backfill_effective_dates fill in the user's timezone
+TRIP_DAY = F('effective_date')
+
+# metric name -> aggregate over one user's activities
+METRICS = {
+	'eco_km': Sum('distance', filter=ECO_TRIP_Q),
+	'veg_meals': Count('id', filter=VEG_MEAL_Q),
+	'renewable_uses': Count('id', filter=RENEWABLE_Q),
+	'recycle_count': Count('id', filter=RECYCLE_Q),
+	'total_footprint': Sum('impact'),
+}
+# also a metric, but it needs a per-day (effective date) GROUP BY; see _max_daily_trips()
+MAX_DAILY_TRIPS = 'eco_max_daily_trips'
+METRIC_NAMES = (MAX_DAILY_TRIPS,) + tuple(METRICS)
+
+
+class BadgeRule:
+	"""A badge threshold over one or more metrics.
+
+	``test`` receives a mapping of metric name to value. ``progress`` maps the
+	counters the dashboard shows for this badge to the metric they come from.
+	Non-revocable badges are kept even if the user later stops qualifying.
+	``challenge_tokens`` are tried in order against challenge titles when no
+	Challenge has the badge key; see ``badge_challenges``.
+	"""
+
+	def __init__(self, key, test, progress=None, revocable=True, challenge_tokens=()):
+		self.key = key
+		self.test = test
+		self.progress = progress or {}
+		self.revocable = revocable
+		self.challenge_tokens = tuple(challenge_tokens)
+
+	def qualifies(self, values):
+		try:
+			return bool(self.test(values))
+		except Exception:
+			return False
+
+	def __repr__(self):
+		return f"BadgeRule({self.key!r})"
+
+
+BADGE_RULES = {}
+
+
+def register(rule):
+	BADGE_RULES[rule.key] = rule
+	return rule
+
+
+register(BadgeRule(
+	'eco_commuter',
+	# >=5 bike/walk trips on the same date OR accumulated >=50 km
+	lambda m: m['eco_max_daily_trips'] >= 5 or m['eco_km'] >= 50,
+	progress={'bike_walk_trips': 'eco_max_daily_trips', 'bike_walk_km': 'eco_km'},
+	challenge_tokens=['eco commuter', 'eco-commuter', 'commuter', 'bike', 'eco'],
+))
+register(BadgeRule(
+	'green_eater',
+	lambda m: m['veg_meals'] >= 7,
+	progress={'veg_meals': 'veg_meals'},
+	challenge_tokens=['green eater', 'green-eater', 'vegetarian', 'vegan', 'green'],
+))
+register(BadgeRule(
+	'recycling_champion',
+	lambda m: m['recycle_count'] >= 5,
+	progress={'recycle_actions': 'recycle_count'},
+	challenge_tokens=['recycling champion', 'recycle'],
+))
+register(BadgeRule(
+	'energy_saver',
+	lambda m: m['renewable_uses'] >= 5,
+	progress={'renewable_uses': 'renewable_uses'},
+	challenge_tokens=['energy saver', 'energy-saver', 'renewable', 'energy'],
+))
+register(BadgeRule(
+	'carbon_neutral',
+	lambda m: m['total_footprint'] <= 0.5,
+	# a low footprint only gets easier to keep as activities are removed
+	revocable=False,
+	challenge_tokens=['carbon neutral', 'carbon-neutral', 'carbon', 'neutral'],
+))
+
+
+def _max_daily_trips(activities):
+	busiest_day = (
+		activities.filter(ECO_TRIP_Q)
+		.values(day=TRIP_DAY).annotate(cnt=Count('id')).order_by('-cnt').values('cnt')[:1]
+	)
+	# wrapping the scalar subquery in Max() lets it ride along in the same aggregate()
+	return Max(Subquery(busiest_day, output_field=IntegerField()))
+
+
+def _normalize(values):
+	return {
+		name: (float(values.get(name) or 0) if name in ('eco_km', 'total_footprint') else int(values.get(name) or 0))
+		for name in METRIC_NAMES
+	}
+
+
+def badge_metrics(user, evaluated_only=False):
+	"""Return every rule metric for ``user`` using a single aggregate query.
+
+	``evaluated_only`` leaves out activities still queued for evaluation, so
+	the metrics match what the awarded badges were judged on.
+	"""
+	activities = Activity.objects.filter(user=user)
+	if evaluated_only:
+		activities = activities.filter(pending_evaluation=False)
+	values = activities.aggregate(**{MAX_DAILY_TRIPS: _max_daily_trips(activities)}, **METRICS)
+	return _normalize(values)
+
+
+async def abadge_metrics(user):
+	"""``badge_metrics`` through the async ORM."""
+	activities = Activity.objects.filter(user=user)
+	values = await activities.aaggregate(**{MAX_DAILY_TRIPS: _max_daily_trips(activities)}, **METRICS)
+	return _normalize(values)
+
+
+def progress_metrics(progress):
+	"""Read the rule metrics off a ``BadgeProgress`` row."""
+	return _normalize({name: getattr(progress, name, 0) for name in METRIC_NAMES})
+
+
+def qualified_badges(metrics):
+	"""Keys of every rule the given metrics satisfy, in registry order."""
+	return [key for key, rule in BADGE_RULES.items() if rule.qualifies(metrics)]
+
+
+def badge_status(metrics, earned_keys):
+	"""Build the dashboard badge payload: earned flag plus progress counters.
+
+	A badge shows as earned when it is persisted or when the metrics already
+	meet the rule (covers legacy data where badges weren't created retroactively).
+	"""
+	badges = {}
+	for key, rule in BADGE_RULES.items():
+		entry = {'earned': key in earned_keys or rule.qualifies(metrics)}
+		for label, metric in rule.progress.items():
+			entry[label] = metrics[metric]
+		badges[key] = entry
+	return badges
+
+
+def revoked_badges(metrics, earned_keys, touched=None):
+	"""Earned, revocable badges whose rule the metrics no longer satisfy.
+
+	``touched`` limits the check to rules that read one of those metric names
+	(see ``Dashboard_App.progress.activity_metrics``).
+	"""
+	return [
+		key for key, rule in BADGE_RULES.items()
+		if rule.revocable and key in earned_keys and not rule.qualifies(metrics)
+		and (touched is None or set(rule.progress.values()) & set(touched))
+	]
+
+
+def badge_challenges():
+	"""Cached badge key -> challenge id table for every registered rule."""
+	from Challenges_App.matching import get_badge_challenge_table
+	return get_badge_challenge_table({key: rule.challenge_tokens for key, rule in BADGE_RULES.items()})
+
+
+def badge_points_owed(user, earned_keys):
+	"""Points of the challenges tied to ``earned_keys`` that the user hasn't completed.
+
+	Covers legacy data where a badge was persisted without its challenge being
+	marked completed. One query regardless of how many badges are earned; a
+	challenge shared by several badges is only counted once.
+	"""
+	from Challenges_App.models import Challenge, UserChallenge
+	table = badge_challenges()
+	challenge_ids = {table[key] for key in earned_keys if key in table}
+	if not challenge_ids:
+		return 0
+	completed = UserChallenge.objects.filter(user=user, completed=True).values('challenge_id')
+	owed = Challenge.objects.filter(id__in=challenge_ids).exclude(id__in=completed).aggregate(total=Sum('points'))['total']
+	return int(owed or 0)
+
+
+def complete_badge_challenge(user, key):
+	"""Mark the Challenge tied to a badge as completed so its points are credited."""
+	from Challenges_App.models import Challenge, UserChallenge
+	challenge_id = badge_challenges().get(key)
+	# the table may predate a rolled-back or cross-process change
+	if challenge_id and Challenge.objects.filter(id=challenge_id).exists():
+		uc_obj, _ = UserChallenge.objects.get_or_create(user=user, challenge_id=challenge_id)
+		uc_obj.completed = True
+		uc_obj.completed_at = timezone.now()
+		uc_obj.save()
+
+
+def award_badges(user, metrics):
+	"""Persist a UserBadge for every newly satisfied rule; return the awarded keys."""
+	from Dashboard_App.models import UserBadge
+	keys = qualified_badges(metrics)
+	if not keys:
+		return []
+	already = set(UserBadge.objects.filter(user=user, key__in=keys).values_list('key', flat=True))
+	awarded = []
+	for key in keys:
+		if key in already:
+			continue
+		UserBadge.objects.create(user=user, key=key, earned_at=timezone.now())
+		awarded.append(key)
+		try:
+			complete_badge_challenge(user, key)
+		except Exception:
+			pass
+	return awarded
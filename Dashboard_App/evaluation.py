@@ -0,0 +1,156 @@
+"""Deferred badge and challenge evaluation for newly logged activities.
+
+The activity row is its own outbox entry. The API views insert it with
+``pending_evaluation=True`` and call ``enqueue_evaluation``; outside
+``'sync'`` mode that INSERT is the request's only write.
+``evaluate_user`` later claims every queued row of that user at once and
+applies badge progress, badges, the footprint rollup and challenge matching.
+Nothing is lost on restart: rows stay flagged until evaluated, and
+``manage.py drain_evaluations`` picks up whatever is left.
+
+``settings.EVALUATION_MODE`` selects how queued users are evaluated:
+
+* ``'thread'``: on a background thread pool after the transaction commits.
+  Requests for a user that is already queued or running are coalesced into
+  one more pass.
+* ``'outbox'``: not in-process at all; a scheduled ``drain_evaluations`` does it.
+* ``'sync'``: inline, before the view responds. The test runner uses this.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+
+from Activity_App.models import Activity
+
+
+logger = logging.getLogger(__name__)
+
+THREAD, OUTBOX, SYNC = 'thread', 'outbox', 'sync'
+
+_lock = threading.Lock()
+_executor = None
+# users with a job queued or running, and those that asked again meanwhile
+_scheduled = set()
+_rerun = set()
+
+
+def evaluation_mode():
+	return getattr(settings, 'EVALUATION_MODE', THREAD)
+
+
+def evaluate_user(user_id, user=None):
+	"""Evaluate every queued activity of ``user_id``; returns ``(evaluated, completed_challenge_ids)``.
+
+	``user`` saves a lookup when the caller already has the instance.
+
+	Rows are claimed under ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+	database supports it, so a drain running next to the thread pool never
+	counts a row twice. Everything, challenge matching included, happens in
+	the claiming transaction: if any step raises, the rows stay queued and
+	the next pass (or ``drain_evaluations``) retries them.
+	"""
+	from Challenges_App.matching import challenge_day_cutoff, complete_matching_challenges
+	from Dashboard_App.badges import award_badges, progress_metrics
+	from Dashboard_App.progress import apply_activities
+	from Dashboard_App.rollups import apply_to_rollup
+	from Dashboard_App.snapshot import invalidate_dashboard_snapshot
+
+	with transaction.atomic():
+		pending = list(
+			Activity.objects.select_for_update(skip_locked=True)
+			.filter(user_id=user_id, pending_evaluation=True).order_by('id')
+		)
+		if not pending:
+			return 0, []
+		Activity.objects.filter(id__in=[a.id for a in pending]).update(pending_evaluation=False)
+		for activity in pending:
+			activity.pending_evaluation = False
+		if user is None:
+			user = get_user_model().objects.get(pk=user_id)
+		progress = apply_activities(user_id, pending)
+		award_badges(user, progress_metrics(progress))
+		apply_to_rollup(user_id, pending)
+		completed = complete_matching_challenges(user, pending, challenge_day_cutoff(user=user))
+	invalidate_dashboard_snapshot(user_id)
+	return len(pending), completed
+
+
+def pending_users():
+	"""Ids of the users with queued activities."""
+	return list(Activity.objects.filter(pending_evaluation=True).values_list('user_id', flat=True).distinct().order_by('user_id'))
+
+
+def _get_executor():
+	global _executor
+	with _lock:
+		if _executor is None:
+			_executor = ThreadPoolExecutor(
+				max_workers=getattr(settings, 'EVALUATION_WORKERS', 2),
+				thread_name_prefix='ecotrack-evaluation',
+			)
+		return _executor
+
+
+def _run(user_id):
+	try:
+		while True:
+			try:
+				evaluate_user(user_id)
+			except Exception:
+				# the rows stay queued; drain_evaluations retries them
+				logger.exception('Deferred evaluation failed for user %s', user_id)
+			with _lock:
+				if user_id in _rerun:
+					_rerun.discard(user_id)
+					continue
+				_scheduled.discard(user_id)
+				return
+	finally:
+		connections.close_all()
+
+
+def _submit(user_id):
+	with _lock:
+		if user_id in _scheduled:
+			_rerun.add(user_id)
+			return
+		_scheduled.add(user_id)
+	try:
+		_get_executor().submit(_run, user_id)
+	except RuntimeError:
+		# interpreter shutting down; the outbox keeps the rows
+		with _lock:
+			_scheduled.discard(user_id)
+
+
+def enqueue_evaluation(user):
+	"""Request evaluation of ``user``'s queued activities.
+
+	Returns the ids of the challenges completed in ``'sync'`` mode, else an
+	empty list: the outcome isn't known yet.
+	"""
+	mode = evaluation_mode()
+	if mode == SYNC:
+		return evaluate_user(user.id, user=user)[1]
+	if mode == THREAD:
+		# the worker must see the committed rows
+		user_id = user.id
+		transaction.on_commit(lambda: _submit(user_id))
+	return []
+
+
+def wait_for_idle(timeout=None):
+	"""Block until the thread pool has no queued or running evaluations; returns True when idle."""
+	deadline = None if timeout is None else time.monotonic() + timeout
+	while True:
+		with _lock:
+			if not _scheduled:
+				return True
+		if deadline is not None and time.monotonic() >= deadline:
+			return False
+		time.sleep(0.01)
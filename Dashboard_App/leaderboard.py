@@ -0,0 +1,166 @@
+"""Materialized leaderboards kept in ``LeaderboardEntry``.
+
+``refresh_leaderboards`` runs from a scheduled management command. It only
+recomputes scores for users whose points or activities changed since the
+board was last refreshed. Ranks are renumbered in one ordered pass that
+starts at the best score that changed (old or new) and writes only the
+ranks that moved; entries ahead of it keep theirs, and a refresh where no
+score changed renumbers nothing. Weekly boards start over when a new week
+begins. Page views never rank anything; they read ``top`` and ``my_rank``.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from Dashboard_App.models import BadgeProgress, DailyFootprint, LeaderboardEntry, PointsLedger, UserPoints
+
+
+# board -> True when a higher score ranks first
+HIGHER_IS_BETTER = {
+	LeaderboardEntry.POINTS_ALL: True,
+	LeaderboardEntry.POINTS_WEEK: True,
+	LeaderboardEntry.FOOTPRINT_ALL: False,
+	LeaderboardEntry.FOOTPRINT_WEEK: False,
+}
+WEEKLY_BOARDS = (LeaderboardEntry.POINTS_WEEK, LeaderboardEntry.FOOTPRINT_WEEK)
+MAX_TOP = 100
+
+
+def week_start(day):
+	return day - datetime.timedelta(days=day.weekday())
+
+
+def _week_start_dt(day):
+	return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), datetime.timezone.utc)
+
+
+def _changed_users(board, since, period_start):
+	"""Users whose score on ``board`` may have changed since ``since`` (None: everyone)."""
+	if board == LeaderboardEntry.POINTS_ALL:
+		qs = UserPoints.objects.all()
+		if since is not None:
+			qs = qs.filter(updated_at__gte=since)
+		return set(qs.values_list('user_id', flat=True))
+	if board == LeaderboardEntry.POINTS_WEEK:
+		qs = PointsLedger.objects.filter(created_at__gte=_week_start_dt(period_start))
+		if since is not None:
+			qs = qs.filter(created_at__gte=since)
+		return set(qs.values_list('user_id', flat=True).distinct())
+	# footprint boards: BadgeProgress.updated_at moves on every activity write
+	qs = BadgeProgress.objects.all()
+	if since is not None:
+		qs = qs.filter(updated_at__gte=since)
+	return set(qs.values_list('user_id', flat=True))
+
+
+def _scores(board, user_ids, period_start):
+	"""``{user_id: score}`` for the users that belong on ``board``."""
+	if board == LeaderboardEntry.POINTS_ALL:
+		return {uid: float(points) for uid, points in UserPoints.objects.filter(user_id__in=user_ids).values_list('user_id', 'total_points')}
+	if board == LeaderboardEntry.POINTS_WEEK:
+		rows = (
+			PointsLedger.objects.filter(user_id__in=user_ids, created_at__gte=_week_start_dt(period_start))
+			.values('user_id').annotate(total=Sum('delta')).order_by()
+		)
+		return {row['user_id']: float(row['total'] or 0) for row in rows}
+	days = DailyFootprint.objects.filter(user_id__in=user_ids, count__gt=0)
+	if board == LeaderboardEntry.FOOTPRINT_WEEK:
+		days = days.filter(day__gte=period_start)
+	rows = days.values('user_id').annotate(total=Sum('total'), active_days=Count('day', distinct=True)).order_by()
+	return {row['user_id']: round(float(row['total'] or 0) / row['active_days'], 4) for row in rows if row['active_days']}
+
+
+def _best(board, scores):
+	"""The score in ``scores`` that sorts first on ``board``."""
+	return max(scores) if HIGHER_IS_BETTER[board] else min(scores)
+
+
+def _rerank(board, from_score=None):
+	"""Renumber ranks (ties share a rank) and write only the rows whose rank moved.
+
+	With ``from_score``, entries that sort strictly ahead of it keep their
+	rank; the pass starts at the first entry scoring ``from_score`` or worse.
+	"""
+	higher = HIGHER_IS_BETTER[board]
+	entries = LeaderboardEntry.objects.filter(board=board)
+	ahead = 0
+	if from_score is not None:
+		ahead = entries.filter(**{'score__gt' if higher else 'score__lt': from_score}).count()
+		entries = entries.filter(**{'score__lte' if higher else 'score__gte': from_score})
+	moved = []
+	rank = 0
+	previous = None
+	for position, entry in enumerate(entries.order_by('-score' if higher else 'score', 'user_id').only('id', 'score', 'rank'), start=ahead + 1):
+		if entry.score != previous:
+			rank, previous = position, entry.score
+		if entry.rank != rank:
+			entry.rank = rank
+			moved.append(entry)
+	LeaderboardEntry.objects.bulk_update(moved, ['rank'], batch_size=1000)
+	return len(moved)
+
+
+def refresh_board(board, full=False, now=None):
+	"""Bring one board up to date; returns ``(rescored, reranked)``."""
+	now = now or timezone.now()
+	period_start = week_start(now.date()) if board in WEEKLY_BOARDS else None
+	entries = LeaderboardEntry.objects.filter(board=board)
+	state = entries.aggregate(since=Max('refreshed_at'), period=Max('period_start'))
+	since = None if full or (board in WEEKLY_BOARDS and state['period'] != period_start) else state['since']
+
+	user_ids = _changed_users(board, since, period_start)
+	ordered = sorted(user_ids)
+	scores, old = {}, {}
+	for start in range(0, len(ordered), 500):
+		batch = ordered[start:start + 500]
+		scores.update(_scores(board, batch, period_start))
+		if since is not None:
+			old.update(entries.filter(user_id__in=batch).values_list('user_id', 'score'))
+	# scores that moved, before and after; the board is unchanged ahead of the best of them
+	changed = [score for uid, score in old.items() if scores.get(uid) != score]
+	changed += [score for uid, score in scores.items() if old.get(uid) != score]
+
+	with transaction.atomic():
+		if since is None:
+			# full rebuild (first run, --full, or a new week)
+			entries.delete()
+		else:
+			entries.filter(user_id__in=user_ids - set(scores)).delete()
+		LeaderboardEntry.objects.bulk_create(
+			[LeaderboardEntry(board=board, user_id=uid, score=score, period_start=period_start, refreshed_at=now) for uid, score in scores.items()],
+			update_conflicts=True,
+			unique_fields=['board', 'user'],
+			update_fields=['score', 'period_start', 'refreshed_at'],
+			batch_size=1000,
+		)
+		if since is None:
+			reranked = _rerank(board)
+		elif changed:
+			reranked = _rerank(board, from_score=_best(board, changed))
+		else:
+			reranked = 0
+	return len(scores), reranked
+
+
+def refresh_leaderboards(full=False, now=None):
+	"""Refresh every board; returns ``{board: (rescored, reranked)}``."""
+	now = now or timezone.now()
+	return {board: refresh_board(board, full=full, now=now) for board in HIGHER_IS_BETTER}
+
+
+def _entry(entry):
+	return {'rank': entry.rank, 'username': entry.user.username, 'score': entry.score}
+
+
+def top(board, n=10):
+	"""The first ``n`` entries of ``board``, best first."""
+	qs = LeaderboardEntry.objects.filter(board=board).select_related('user').order_by('rank', 'user_id')[:min(n, MAX_TOP)]
+	return [_entry(e) for e in qs]
+
+
+def my_rank(user, board):
+	"""``user``'s entry on ``board``, or None when they are not ranked."""
+	entry = LeaderboardEntry.objects.filter(board=board, user=user).select_related('user').first()
+	return _entry(entry) if entry else None
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard_App.rollups import backfill_daily_footprint
+
+
+# Users per backfill with --missing; keeps IN (...) lists under SQLite's variable limit
+USER_BATCH = 500
+
+
+class Command(BaseCommand):
+	help = 'Rebuild the per-day footprint rollup used by the dashboard chart from the full Activity table.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--user', action='append', dest='users', default=[],
+			help='Username to backfill (repeatable). Backfills every user when omitted.')
+		parser.add_argument('--missing', action='store_true',
+			help='Only backfill users whose rollup was never built from their history (run on deploy).')
+
+	def handle(self, *args, **options):
+		User = get_user_model()
+		if options['missing']:
+			user_ids = list(User.objects.filter(footprint_rollup__isnull=True).order_by('id').values_list('id', flat=True))
+			written = 0
+			for start in range(0, len(user_ids), USER_BATCH):
+				written += backfill_daily_footprint(user_ids=user_ids[start:start + USER_BATCH])
+			self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily footprint row(s) for {len(user_ids)} user(s).'))
+			return
+		user_ids = None
+		if options['users']:
+			user_ids = list(User.objects.filter(username__in=options['users']).values_list('id', flat=True))
+			if len(user_ids) != len(set(options['users'])):
+				raise CommandError('One or more usernames do not exist.')
+		written = backfill_daily_footprint(user_ids=user_ids)
+		self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily footprint row(s).'))
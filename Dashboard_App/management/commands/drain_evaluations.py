@@ -0,0 +1,53 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard_App.evaluation import evaluate_user, pending_users
+
+
+class Command(BaseCommand):
+	help = (
+		'Evaluate badges and challenges for activities still queued for evaluation '
+		'(left over from a restart, or every activity when EVALUATION_MODE is "outbox").'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--user', action='append', dest='users', default=[],
+			help='Username to drain (repeatable). Drains every user with queued activities when omitted.')
+		parser.add_argument('--loop', action='store_true',
+			help='Keep polling for queued activities instead of exiting once the queue is empty.')
+		parser.add_argument('--interval', type=float, default=2.0,
+			help='Seconds between polls with --loop (default 2).')
+
+	def handle(self, *args, **options):
+		user_ids = None
+		if options['users']:
+			User = get_user_model()
+			user_ids = list(User.objects.filter(username__in=options['users']).values_list('id', flat=True))
+			if len(user_ids) != len(set(options['users'])):
+				raise CommandError('One or more usernames do not exist.')
+		while True:
+			evaluated, users = self._drain(user_ids)
+			if evaluated or not options['loop']:
+				self.stdout.write(f'Evaluated {evaluated} activit(ies) for {users} user(s).')
+			if not options['loop']:
+				break
+			time.sleep(options['interval'])
+		self.stdout.write(self.style.SUCCESS('Evaluation queue drained.'))
+
+	def _drain(self, user_ids):
+		queued = pending_users()
+		if user_ids is not None:
+			queued = [uid for uid in queued if uid in user_ids]
+		evaluated = users = 0
+		for user_id in queued:
+			try:
+				count, _ = evaluate_user(user_id)
+			except Exception as e:
+				# leave the rows queued for the next run
+				self.stderr.write(f'User {user_id}: evaluation failed: {e}')
+				continue
+			evaluated += count
+			users += bool(count)
+		return evaluated, users
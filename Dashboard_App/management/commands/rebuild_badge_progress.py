@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard_App.progress import rebuild_badge_progress
+
+
+class Command(BaseCommand):
+	help = 'Rebuild the per-user badge progress counters from the full Activity table.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--user', action='append', dest='users', default=[],
+			help='Username to rebuild (repeatable). Rebuilds every user when omitted.')
+
+	def handle(self, *args, **options):
+		user_ids = None
+		if options['users']:
+			User = get_user_model()
+			user_ids = list(User.objects.filter(username__in=options['users']).values_list('id', flat=True))
+			if len(user_ids) != len(set(options['users'])):
+				raise CommandError('One or more usernames do not exist.')
+		written = rebuild_badge_progress(user_ids=user_ids)
+		self.stdout.write(self.style.SUCCESS(f'Rebuilt badge progress for {written} user(s).'))
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard_App.points import reconcile_points
+
+
+class Command(BaseCommand):
+	help = 'Check UserPoints totals against the points ledger and completed challenges, and repair any drift.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--user', action='append', dest='users', default=[],
+			help='Username to reconcile (repeatable). Reconciles every user when omitted.')
+		parser.add_argument('--dry-run', action='store_true',
+			help='Report drift without writing anything.')
+
+	def handle(self, *args, **options):
+		user_ids = None
+		if options['users']:
+			User = get_user_model()
+			user_ids = list(User.objects.filter(username__in=options['users']).values_list('id', flat=True))
+			if len(user_ids) != len(set(options['users'])):
+				raise CommandError('One or more usernames do not exist.')
+		entries, fixed = reconcile_points(user_ids=user_ids, dry_run=options['dry_run'])
+		if options['dry_run']:
+			self.stdout.write(f'Drift found: {entries} missing ledger entry(ies), {fixed} points total(s) out of sync.')
+		else:
+			self.stdout.write(self.style.SUCCESS(f'Wrote {entries} ledger entry(ies) and fixed {fixed} points total(s).'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from Dashboard_App.leaderboard import refresh_leaderboards
+
+
+class Command(BaseCommand):
+	help = 'Refresh the materialized leaderboards; only users whose points or activities changed are rescored.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--full', action='store_true',
+			help='Rescore every user instead of only those changed since the last refresh.')
+
+	def handle(self, *args, **options):
+		results = refresh_leaderboards(full=options['full'])
+		for board, (rescored, reranked) in results.items():
+			self.stdout.write(f'{board}: rescored {rescored} user(s), {reranked} rank(s) moved.')
+		self.stdout.write(self.style.SUCCESS('Leaderboards refreshed.'))
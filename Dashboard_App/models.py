@@ -20,8 +20,8 @@ class UserBadge(models.Model):
 class UserPoints(models.Model):
 	"""Store an authoritative, persisted points total for a user.
 
-	Kept in sync with completed `UserChallenge` rows via signals so the
-	application can read a single field instead of aggregating frequently.
+	Running sum of the user's ``PointsLedger`` deltas, so the application can
+	read a single field instead of aggregating frequently.
 	"""
 	user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='points')
 	total_points = models.IntegerField(default=0)
@@ -32,3 +32,146 @@ class UserPoints(models.Model):
 
 	def __str__(self):
 		return f"{self.user} - {self.total_points} pts"
+
+
+class PointsLedger(models.Model):
+	"""Append-only record of every change to a user's points.
+
+	``UserPoints.total_points`` is a running sum of these deltas, updated in
+	place as entries are written. ``source_id`` is the Challenge the entry is
+	for. Check and repair drift with ``manage.py reconcile_points``.
+	"""
+	CHALLENGE_COMPLETED = 'challenge_completed'
+	CHALLENGE_REOPENED = 'challenge_reopened'
+	CHALLENGE_REMOVED = 'challenge_removed'
+	REASON_CHOICES = [
+		(CHALLENGE_COMPLETED, 'Challenge completed'),
+		(CHALLENGE_REOPENED, 'Challenge reopened'),
+		(CHALLENGE_REMOVED, 'Challenge removed'),
+	]
+
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='points_ledger')
+	delta = models.IntegerField()
+	reason = models.CharField(max_length=32, choices=REASON_CHOICES)
+	source_id = models.PositiveIntegerField(blank=True, null=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		ordering = ['created_at']
+		indexes = [
+			models.Index(fields=['user', 'source_id'], name='points_ledger_source_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.user} {self.delta:+d} ({self.reason})"
+
+
+class BadgeProgress(models.Model):
+	"""Running per-user badge counters, updated incrementally as activities change.
+
+	Lets the activity signal check every badge threshold against one row
+	instead of re-aggregating the user's whole activity history. Rebuild from
+	scratch with ``manage.py rebuild_badge_progress``.
+	"""
+	user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='badge_progress')
+	eco_km = models.FloatField(default=0)
+	eco_max_daily_trips = models.IntegerField(default=0)
+	veg_meals = models.IntegerField(default=0)
+	renewable_uses = models.IntegerField(default=0)
+	recycle_count = models.IntegerField(default=0)
+	total_footprint = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"{self.user} progress"
+
+
+class EcoTripDay(models.Model):
+	"""Number of bike/walk trips a user logged on a single day.
+
+	``date`` is the activities' ``effective_date``: undated trips count on the
+	day they were logged. It is never NULL, so ``unique_together`` holds on
+	every database (Postgres treats NULLs as distinct).
+	"""
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='eco_trip_days')
+	date = models.DateField()
+	trips = models.IntegerField(default=0)
+
+	class Meta:
+		unique_together = ('user', 'date')
+
+	def __str__(self):
+		return f"{self.user} - {self.date} - {self.trips} trips"
+
+
+class DailyFootprint(models.Model):
+	"""Per-user, per-day, per-category footprint rollup of Activity rows.
+
+	Kept current by the Activity signals (and the batch insert path) so the
+	dashboard chart can read a few hundred rollup rows instead of grouping the
+	full activity history. Rebuild with ``manage.py backfill_daily_footprint``.
+	"""
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_footprints')
+	day = models.DateField()
+	category = models.CharField(max_length=32)
+	total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+	count = models.IntegerField(default=0)
+
+	class Meta:
+		unique_together = ('user', 'day', 'category')
+		ordering = ['day']
+
+	def __str__(self):
+		return f"{self.user} - {self.day} - {self.category}: {self.total} kg"
+
+
+class FootprintRollupState(models.Model):
+	"""Marks a user whose ``DailyFootprint`` rows cover their whole activity history.
+
+	Created with the user, or by ``backfill_daily_footprint``. A user without
+	one (history from before the rollup existed) is backfilled before their
+	rollup is read; see ``Dashboard_App.rollups.ensure_rollup``.
+	"""
+	user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='footprint_rollup')
+	backfilled_at = models.DateTimeField(default=timezone.now)
+
+	def __str__(self):
+		return f"{self.user} rollup since {self.backfilled_at}"
+
+
+class LeaderboardEntry(models.Model):
+	"""Materialized leaderboard row: one user's score and rank on one board.
+
+	Written only by ``manage.py refresh_leaderboards``, so page views read a
+	precomputed rank: top-N is an index range on (board, rank) and "my rank" a
+	unique-index lookup on (board, user). ``period_start`` is the first day the
+	score covers (the week's Monday for weekly boards).
+	"""
+	POINTS_ALL = 'points_all'
+	POINTS_WEEK = 'points_week'
+	FOOTPRINT_ALL = 'footprint_all'
+	FOOTPRINT_WEEK = 'footprint_week'
+	BOARD_CHOICES = [
+		(POINTS_ALL, 'Points (all time)'),
+		(POINTS_WEEK, 'Points (this week)'),
+		(FOOTPRINT_ALL, 'Lowest footprint per active day (all time)'),
+		(FOOTPRINT_WEEK, 'Lowest footprint per active day (this week)'),
+	]
+
+	board = models.CharField(max_length=32, choices=BOARD_CHOICES)
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='leaderboard_entries')
+	score = models.FloatField()
+	rank = models.PositiveIntegerField(default=0)
+	period_start = models.DateField(blank=True, null=True)
+	refreshed_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		unique_together = ('board', 'user')
+		ordering = ['board', 'rank']
+		indexes = [
+			models.Index(fields=['board', 'rank'], name='leaderboard_rank_idx'),
+			models.Index(fields=['board', 'score'], name='leaderboard_score_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.board} #{self.rank} {self.user} ({self.score})"
@@ -0,0 +1,160 @@
+"""Points ledger: the only code that changes ``UserPoints.total_points``.
+
+A completed challenge is worth its points once. ``credit_challenges`` and
+``reverse_challenges`` look at what the ledger has already credited for each
+challenge and only write the difference. Repeated saves, and a challenge that
+is completed again on a later day, therefore never count twice. Every change
+is appended to ``PointsLedger`` and added to ``UserPoints`` with an F()
+update, with no re-aggregation.
+
+The ledger read, the ledger insert and the total update run in one
+transaction under a row lock on the user's ``UserPoints`` row. The evaluation
+thread pool and ``drain_evaluations`` may credit the same user at once; the
+second one waits and then sees the first one's entries.
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from Challenges_App.models import Challenge
+from Dashboard_App.models import PointsLedger, UserPoints
+
+
+CHALLENGE_REASONS = (
+	PointsLedger.CHALLENGE_COMPLETED,
+	PointsLedger.CHALLENGE_REOPENED,
+	PointsLedger.CHALLENGE_REMOVED,
+)
+
+
+def credited_points(user_id, challenge_ids):
+	"""Net points the ledger has credited ``user_id`` for each challenge."""
+	rows = (
+		PointsLedger.objects.filter(user_id=user_id, source_id__in=challenge_ids, reason__in=CHALLENGE_REASONS)
+		.values('source_id').annotate(net=Sum('delta')).order_by()
+	)
+	return {row['source_id']: row['net'] or 0 for row in rows}
+
+
+def ledger_total(user_id):
+	return int(PointsLedger.objects.filter(user_id=user_id).aggregate(total=Sum('delta'))['total'] or 0)
+
+
+def _lock_points(user_id, create=True):
+	"""Lock ``user_id``'s ``UserPoints`` row for the current transaction, creating it first when ``create``.
+
+	A new row starts at the ledger sum, so entries posted afterwards are added
+	exactly once. An existing row costs the one locking SELECT.
+	"""
+	locked = UserPoints.objects.select_for_update().filter(user_id=user_id).first()
+	if locked is None and create:
+		UserPoints.objects.get_or_create(user_id=user_id, defaults={'total_points': ledger_total(user_id)})
+		locked = UserPoints.objects.select_for_update().filter(user_id=user_id).first()
+	return locked
+
+
+def _post_locked(user_id, entries):
+	# the caller holds the UserPoints lock in its open transaction
+	entries = [e for e in entries if e.delta]
+	if not entries:
+		return 0
+	delta = sum(e.delta for e in entries)
+	PointsLedger.objects.bulk_create(entries)
+	UserPoints.objects.filter(user_id=user_id).update(total_points=F('total_points') + delta, updated_at=timezone.now())
+	return delta
+
+
+def post_entries(user_id, entries, create=True):
+	"""Append ``entries`` and add their sum to the user's points, atomically.
+
+	With ``create=False`` a missing ``UserPoints`` row is left alone. Removal
+	paths use this, because the user may be in the middle of a cascade delete.
+	"""
+	entries = [e for e in entries if e.delta]
+	if not entries:
+		return 0
+	with transaction.atomic():
+		_lock_points(user_id, create)
+		return _post_locked(user_id, entries)
+
+
+def credit_challenges(user_id, challenge_ids):
+	"""Credit each completed challenge's points unless the ledger already has."""
+	challenge_ids = set(challenge_ids)
+	if not challenge_ids:
+		return 0
+	with transaction.atomic():
+		# held until commit: a concurrent credit for this user reads the ledger after our entries
+		_lock_points(user_id)
+		credited = credited_points(user_id, challenge_ids)
+		owed = [cid for cid in challenge_ids if credited.get(cid, 0) <= 0]
+		if not owed:
+			return 0
+		points = dict(Challenge.objects.filter(id__in=owed).values_list('id', 'points'))
+		return _post_locked(user_id, [
+			PointsLedger(user_id=user_id, delta=int(points[cid] or 0) - credited.get(cid, 0), reason=PointsLedger.CHALLENGE_COMPLETED, source_id=cid)
+			for cid in owed if cid in points
+		])
+
+
+def reverse_challenges(user_id, challenge_ids, reason=PointsLedger.CHALLENGE_REOPENED):
+	"""Take back whatever the ledger credited for challenges no longer completed."""
+	challenge_ids = set(challenge_ids)
+	if not challenge_ids:
+		return 0
+	with transaction.atomic():
+		_lock_points(user_id, create=False)
+		credited = credited_points(user_id, challenge_ids)
+		return _post_locked(user_id, [
+			PointsLedger(user_id=user_id, delta=-net, reason=reason, source_id=cid)
+			for cid, net in credited.items() if net > 0
+		])
+
+
+def reconcile_points(user_ids=None, dry_run=False):
+	"""Repair drift between completed challenges, the ledger and ``UserPoints``.
+
+	Challenges completed but never credited (e.g. from before the ledger
+	existed) get their credit entry. Credits left for challenges that are
+	no longer completed are reversed. Then each ``UserPoints`` total is
+	reset to its ledger sum. Returns ``(ledger_entries, totals_fixed)``.
+	Nothing is written with ``dry_run``.
+	"""
+	from Challenges_App.models import UserChallenge
+
+	completed = UserChallenge.objects.filter(completed=True)
+	ledger = PointsLedger.objects.all()
+	points_rows = UserPoints.objects.all()
+	if user_ids is not None:
+		completed = completed.filter(user_id__in=user_ids)
+		ledger = ledger.filter(user_id__in=user_ids)
+		points_rows = points_rows.filter(user_id__in=user_ids)
+
+	credited = {
+		(row['user_id'], row['source_id']): row['net'] or 0
+		for row in ledger.filter(reason__in=CHALLENGE_REASONS).values('user_id', 'source_id').annotate(net=Sum('delta')).order_by()
+	}
+	entries = []
+	done = set()
+	for uid, cid, points in completed.values_list('user_id', 'challenge_id', 'challenge__points'):
+		done.add((uid, cid))
+		net = credited.get((uid, cid), 0)
+		if net <= 0 and points:
+			entries.append(PointsLedger(user_id=uid, delta=int(points) - net, reason=PointsLedger.CHALLENGE_COMPLETED, source_id=cid))
+	for (uid, cid), net in credited.items():
+		if net > 0 and (uid, cid) not in done:
+			entries.append(PointsLedger(user_id=uid, delta=-net, reason=PointsLedger.CHALLENGE_REOPENED, source_id=cid))
+
+	totals = {row['user_id']: row['total'] or 0 for row in ledger.values('user_id').annotate(total=Sum('delta')).order_by()}
+	for e in entries:
+		totals[e.user_id] = totals.get(e.user_id, 0) + e.delta
+	stored = dict(points_rows.values_list('user_id', 'total_points'))
+	drifted = {uid: total for uid, total in totals.items() if stored.get(uid) != total}
+	drifted.update({uid: 0 for uid, total in stored.items() if uid not in totals and total != 0})
+
+	if not dry_run:
+		with transaction.atomic():
+			PointsLedger.objects.bulk_create(entries, batch_size=1000)
+			for uid, total in drifted.items():
+				UserPoints.objects.update_or_create(user_id=uid, defaults={'total_points': total})
+	return len(entries), len(drifted)
@@ -0,0 +1,206 @@
+"""Incremental maintenance of the per-user ``BadgeProgress`` counters.
+
+The activity signals call ``apply_activity`` with ``sign=1`` on create and
+``sign=-1`` on delete (batch inserts use ``apply_activities``) so badge checks
+never have to re-aggregate a user's full history. A user's first activity
+seeds the row from their history (``seed_badge_progress``);
+``rebuild_badge_progress`` recomputes the counters from the Activity table for
+the management command. Eco trips are counted per effective date (the
+activity's ``date``, or the day it was logged), so undated trips share a day
+instead of each getting their own NULL key.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from Activity_App.effective_dates import fill_effective_dates
+from Activity_App.models import Activity
+from Dashboard_App.badges import ECO_TRIP_Q, METRICS, TRIP_DAY
+from Dashboard_App.models import BadgeProgress, EcoTripDay
+
+
+ECO_CATEGORIES = ('transportation', 'transport')
+ECO_SUBTYPES = ('bicycle', 'walk')
+VEG_SUBTYPES = ('vegetarian', 'vegan')
+RECYCLE_TOKENS = ('recycle', 'reused', 'upcycle')
+
+
+def is_eco_trip(category, subtype):
+	return (category or '') in ECO_CATEGORIES and (subtype or '').lower() in ECO_SUBTYPES
+
+
+def is_veg_meal(category, subtype):
+	return category == 'diet' and (subtype or '').lower() in VEG_SUBTYPES
+
+
+def is_renewable(category, subtype):
+	return category == 'energy' and 'renew' in (subtype or '').lower()
+
+
+def is_recycle(category, subtype):
+	return category == 'shopping' and any(tok in (subtype or '').lower() for tok in RECYCLE_TOKENS)
+
+
+def activity_metrics(category, subtype):
+	"""Names of the badge metrics an activity of this kind counts towards."""
+	metrics = {'total_footprint'}
+	if is_eco_trip(category, subtype):
+		metrics.update(('eco_km', 'eco_max_daily_trips'))
+	if is_veg_meal(category, subtype):
+		metrics.add('veg_meals')
+	if is_renewable(category, subtype):
+		metrics.add('renewable_uses')
+	if is_recycle(category, subtype):
+		metrics.add('recycle_count')
+	return metrics
+
+
+def _as_decimal(value):
+	try:
+		return Decimal(str(value or 0))
+	except Exception:
+		return Decimal('0')
+
+
+def trip_day(activity):
+	"""The day an eco trip counts towards: its ``effective_date`` (``TRIP_DAY`` in SQL)."""
+	return activity.effective_date or activity.local_day()
+
+
+def apply_activity(activity, sign=1):
+	"""Add (``sign=1``) or remove (``sign=-1``) one activity from its user's counters."""
+	return apply_activities(activity.user_id, [activity], sign=sign)
+
+
+def apply_activities(user_id, activities, sign=1):
+	"""Add or remove a batch of one user's activities with a single counter update.
+
+	Returns the refreshed ``BadgeProgress`` row, or None when removing from a
+	user that has no counters yet. A user seen for the first time is seeded
+	from their full history instead, which already includes the new activities.
+	"""
+	progress = BadgeProgress.objects.filter(user_id=user_id).first()
+	if progress is None:
+		# never create rows while removing: the user itself may be mid-cascade delete
+		return seed_badge_progress(user_id) if sign > 0 else None
+
+	footprint = Decimal('0')
+	eco_km = 0.0
+	eco_days = {}
+	counts = {'veg_meals': 0, 'renewable_uses': 0, 'recycle_count': 0}
+	for activity in activities:
+		category, subtype = activity.category, activity.subtype
+		footprint += _as_decimal(activity.impact)
+		if is_eco_trip(category, subtype):
+			eco_km += float(activity.distance or 0)
+			day = trip_day(activity)
+			eco_days[day] = eco_days.get(day, 0) + 1
+		if is_veg_meal(category, subtype):
+			counts['veg_meals'] += 1
+		if is_renewable(category, subtype):
+			counts['renewable_uses'] += 1
+		if is_recycle(category, subtype):
+			counts['recycle_count'] += 1
+
+	# queryset.update() skips auto_now; the leaderboard refresh relies on updated_at
+	updates = {'total_footprint': F('total_footprint') + sign * footprint, 'updated_at': timezone.now()}
+	if eco_days:
+		updates['eco_km'] = F('eco_km') + sign * eco_km
+		busiest = 0
+		for date, trips in eco_days.items():
+			day_qs = EcoTripDay.objects.filter(user_id=user_id, date=date)
+			if sign > 0:
+				EcoTripDay.objects.get_or_create(user_id=user_id, date=date)
+			day_qs.update(trips=F('trips') + sign * trips)
+			if sign > 0:
+				busiest = max(busiest, day_qs.values_list('trips', flat=True).first() or 0)
+			else:
+				day_qs.filter(trips__lte=0).delete()
+		if sign > 0:
+			updates['eco_max_daily_trips'] = Greatest(F('eco_max_daily_trips'), Value(busiest))
+		else:
+			updates['eco_max_daily_trips'] = Value(
+				EcoTripDay.objects.filter(user_id=user_id).aggregate(m=Max('trips'))['m'] or 0
+			)
+	for field, n in counts.items():
+		if n:
+			updates[field] = F(field) + sign * n
+
+	BadgeProgress.objects.filter(pk=progress.pk).update(**updates)
+	progress.refresh_from_db()
+	return progress
+
+
+def _progress_rows(activities, user_ids=None):
+	"""``(progress_rows by user id, trip_days)`` aggregated from ``activities``; unsaved."""
+	totals = activities.values('user_id').annotate(**METRICS).order_by()
+	days = activities.filter(ECO_TRIP_Q).values('user_id', day=TRIP_DAY).annotate(trips=Count('id')).order_by()
+
+	trip_days = []
+	max_trips = {}
+	for row in days:
+		trip_days.append(EcoTripDay(user_id=row['user_id'], date=row['day'], trips=row['trips']))
+		max_trips[row['user_id']] = max(max_trips.get(row['user_id'], 0), row['trips'])
+
+	progress_rows = {}
+	for row in totals:
+		progress_rows[row['user_id']] = BadgeProgress(
+			user_id=row['user_id'],
+			eco_km=float(row['eco_km'] or 0),
+			eco_max_daily_trips=max_trips.get(row['user_id'], 0),
+			veg_meals=row['veg_meals'],
+			renewable_uses=row['renewable_uses'],
+			recycle_count=row['recycle_count'],
+			total_footprint=row['total_footprint'] or 0,
+		)
+	for uid in user_ids or ():
+		progress_rows.setdefault(uid, BadgeProgress(user_id=uid))
+	return progress_rows, trip_days
+
+
+def seed_badge_progress(user_id):
+	"""Create ``user_id``'s counters from their evaluated history, once; returns the row."""
+	progress_rows, trip_days = _progress_rows(Activity.objects.filter(user_id=user_id, pending_evaluation=False), [user_id])
+	try:
+		with transaction.atomic():
+			progress = progress_rows[user_id]
+			progress.save(force_insert=True)
+			if trip_days:
+				EcoTripDay.objects.bulk_create(
+					trip_days, update_conflicts=True, unique_fields=['user', 'date'], update_fields=['trips'],
+				)
+	except IntegrityError:
+		# seeded concurrently from the same history
+		return BadgeProgress.objects.get(user_id=user_id)
+	return progress
+
+
+def rebuild_badge_progress(user_ids=None):
+	"""Recompute ``BadgeProgress`` and ``EcoTripDay`` from the Activity table.
+
+	Rebuilds every user when ``user_ids`` is None. Rows still queued for
+	evaluation are left out; evaluating them adds them. Returns the number
+	of progress rows written.
+	"""
+	# trip days group on the stored day; give legacy rows theirs in the user's zone first
+	fill_effective_dates(user_ids)
+	activities = Activity.objects.filter(pending_evaluation=False)
+	if user_ids is not None:
+		activities = activities.filter(user_id__in=user_ids)
+
+	progress_rows, trip_days = _progress_rows(activities, user_ids)
+
+	with transaction.atomic():
+		progress_qs = BadgeProgress.objects.all()
+		days_qs = EcoTripDay.objects.all()
+		if user_ids is not None:
+			progress_qs = progress_qs.filter(user_id__in=user_ids)
+			days_qs = days_qs.filter(user_id__in=user_ids)
+		progress_qs.delete()
+		days_qs.delete()
+		EcoTripDay.objects.bulk_create(trip_days, batch_size=1000)
+		BadgeProgress.objects.bulk_create(progress_rows.values(), batch_size=1000)
+	return len(progress_rows)
@@ -0,0 +1,186 @@
+"""Maintenance of the ``DailyFootprint`` rollup that feeds the timeseries API.
+
+An activity lands in the bucket for its ``effective_date``: its ``date``, or
+the day it was logged in the user's timezone, like the history page.
+
+The incremental updates only cover activities written since the rollup
+existed. ``FootprintRollupState`` marks the users whose rows cover their
+whole history (new users, and users already backfilled); ``ensure_rollup``
+backfills anyone else before their rollup is read.
+"""
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from Activity_App.effective_dates import fill_effective_dates
+from Activity_App.models import Activity
+from Dashboard_App.models import DailyFootprint, FootprintRollupState
+
+
+# Set when the whole rollup is rebuilt; newer than any per-user stamp it overrides them
+REBUILT_AT_KEY = 'footprint:rebuilt-at'
+MARK_BATCH_SIZE = 1000
+
+
+def activity_day(activity):
+	return activity.effective_date or activity.local_day()
+
+
+def _as_decimal(value):
+	try:
+		return Decimal(str(value or 0))
+	except Exception:
+		return Decimal('0')
+
+
+def _last_modified_key(user_id):
+	return f'footprint:last-modified:{user_id}'
+
+
+def touch_footprint(user_id):
+	"""Record that ``user_id``'s footprint data changed (drives ETag/Last-Modified)."""
+	try:
+		cache.set(_last_modified_key(user_id), timezone.now(), timeout=None)
+	except Exception:
+		pass
+
+
+def footprint_last_modified(user_id):
+	"""When ``user_id``'s activity data last changed, or None if they have none.
+
+	Served from the cache so unchanged charts can be answered with a 304
+	without querying; falls back to the newest Activity on a cache miss.
+	"""
+	key = _last_modified_key(user_id)
+	try:
+		stamp, rebuilt_at = cache.get(key), cache.get(REBUILT_AT_KEY)
+	except Exception:
+		stamp = rebuilt_at = None
+	if stamp is None:
+		stamp = Activity.objects.filter(user_id=user_id).aggregate(m=Max('created_at'))['m']
+		if stamp is not None:
+			try:
+				cache.add(key, stamp, timeout=None)
+			except Exception:
+				pass
+	if stamp is not None and rebuilt_at is not None:
+		return max(stamp, rebuilt_at)
+	return stamp
+
+
+def apply_to_rollup(user_id, activities, sign=1):
+	"""Add (``sign=1``) or remove (``sign=-1``) activities from the user's rollup rows."""
+	buckets = {}
+	for activity in activities:
+		key = (activity_day(activity), activity.category)
+		total, count = buckets.get(key, (Decimal('0'), 0))
+		buckets[key] = (total + _as_decimal(activity.impact), count + 1)
+
+	for (day, category), (total, count) in buckets.items():
+		row_qs = DailyFootprint.objects.filter(user_id=user_id, day=day, category=category)
+		if sign > 0:
+			DailyFootprint.objects.get_or_create(user_id=user_id, day=day, category=category)
+		# never create rows on removal: the user itself may be mid-cascade delete
+		row_qs.update(total=F('total') + sign * total, count=F('count') + sign * count)
+		if sign < 0:
+			row_qs.filter(count__lte=0).delete()
+	touch_footprint(user_id)
+
+
+def _complete_key(user_id):
+	return f'footprint:complete:{user_id}'
+
+
+def mark_rollup_complete(user_ids):
+	"""Record that the rollup rows of ``user_ids`` cover their whole history."""
+	FootprintRollupState.objects.bulk_create(
+		[FootprintRollupState(user_id=user_id) for user_id in user_ids],
+		ignore_conflicts=True, batch_size=MARK_BATCH_SIZE,
+	)
+
+
+def ensure_rollup(user_id):
+	"""Backfill ``user_id``'s rollup unless it already covers their history; True if it did.
+
+	The answer is cached once known, so a warm read costs no query.
+	"""
+	key = _complete_key(user_id)
+	try:
+		if cache.get(key):
+			return False
+	except Exception:
+		pass
+	built = not FootprintRollupState.objects.filter(user_id=user_id).exists()
+	if built:
+		backfill_daily_footprint(user_ids=[user_id])
+	try:
+		cache.set(key, True, timeout=None)
+	except Exception:
+		pass
+	return built
+
+
+async def aensure_rollup(user_id):
+	"""``ensure_rollup`` for async views; a cached answer doesn't leave the event loop."""
+	try:
+		if await cache.aget(_complete_key(user_id)):
+			return False
+	except Exception:
+		pass
+	return await sync_to_async(ensure_rollup)(user_id)
+
+
+def backfill_daily_footprint(user_ids=None):
+	"""Rebuild ``DailyFootprint`` from the Activity table; returns rows written.
+
+	The grouped rows are written with a single INSERT ... SELECT, so nothing
+	passes through Python however many activities there are. Rows still
+	queued for evaluation are added when they are evaluated. The users are
+	marked complete (``FootprintRollupState``).
+	"""
+	# bucket by the stored day, so legacy rows get theirs in the user's zone first
+	fill_effective_dates(user_ids)
+	activities = Activity.objects.filter(pending_evaluation=False)
+	if user_ids is not None:
+		activities = activities.filter(user_id__in=user_ids)
+	rows = activities.values('user_id', 'effective_date', 'category').annotate(
+		total=Sum('impact'), count=Count('id'),
+	).order_by()
+	select_sql, params = rows.query.sql_with_params()
+
+	qn = connection.ops.quote_name
+	meta = DailyFootprint._meta
+	targets = ', '.join(qn(meta.get_field(name).column) for name in ('user', 'day', 'category', 'total', 'count'))
+	sources = ', '.join(f'grouped.{qn(alias)}' for alias in ('user_id', 'effective_date', 'category', 'total', 'count'))
+	with transaction.atomic():
+		existing = DailyFootprint.objects.all()
+		if user_ids is not None:
+			existing = existing.filter(user_id__in=user_ids)
+		existing.delete()
+		with connection.cursor() as cursor:
+			cursor.execute(
+				f'INSERT INTO {qn(meta.db_table)} ({targets}) SELECT {sources} FROM ({select_sql}) grouped',
+				params,
+			)
+			written = cursor.rowcount
+		if user_ids is None:
+			missing = get_user_model().objects.filter(footprint_rollup__isnull=True).values_list('id', flat=True)
+			mark_rollup_complete(missing.iterator(chunk_size=MARK_BATCH_SIZE))
+		else:
+			mark_rollup_complete(user_ids)
+	if user_ids is None:
+		# one global stamp instead of touching every user
+		try:
+			cache.set(REBUILT_AT_KEY, timezone.now(), timeout=None)
+		except Exception:
+			pass
+	else:
+		for user_id in user_ids:
+			touch_footprint(user_id)
+	return written
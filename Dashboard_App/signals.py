@@ -1,20 +1,18 @@
+from django.conf import settings
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.db.models import Sum
 
 # import models lazily inside handlers to avoid circular imports at import time
 
+
 @receiver(post_save, sender='Challenges_App.UserChallenge')
 def handle_userchallenge_saved(sender, instance, **kwargs):
     try:
-        from Dashboard_App.models import UserPoints
-        # recompute total from completed UserChallenge rows
-        user = instance.user
-        from Challenges_App.models import UserChallenge as UC
-        total = UC.objects.filter(user=user, completed=True).aggregate(total=Sum('challenge__points'))['total'] or 0
-        up, _ = UserPoints.objects.get_or_create(user=user)
-        up.total_points = int(total)
-        up.save()
+        from Dashboard_App.points import credit_challenges, reverse_challenges
+        if instance.completed:
+            credit_challenges(instance.user_id, [instance.challenge_id])
+        else:
+            reverse_challenges(instance.user_id, [instance.challenge_id])
     except Exception:
         # best-effort: do not raise
         pass
@@ -23,12 +21,35 @@ def handle_userchallenge_saved(sender, instance, **kwargs):
 @receiver(post_delete, sender='Challenges_App.UserChallenge')
 def handle_userchallenge_deleted(sender, instance, **kwargs):
     try:
-        from Dashboard_App.models import UserPoints
-        user = instance.user
-        from Challenges_App.models import UserChallenge as UC
-        total = UC.objects.filter(user=user, completed=True).aggregate(total=Sum('challenge__points'))['total'] or 0
-        up, _ = UserPoints.objects.get_or_create(user=user)
-        up.total_points = int(total)
-        up.save()
+        from Dashboard_App.models import PointsLedger
+        from Dashboard_App.points import reverse_challenges
+        reverse_challenges(instance.user_id, [instance.challenge_id], reason=PointsLedger.CHALLENGE_REMOVED)
+    except Exception:
+        pass
+
+
+# Drop the cached dashboard snapshot whenever something it summarizes changes
+@receiver(post_save, sender='Activity_App.Activity')
+@receiver(post_delete, sender='Activity_App.Activity')
+@receiver(post_save, sender='Challenges_App.UserChallenge')
+@receiver(post_delete, sender='Challenges_App.UserChallenge')
+@receiver(post_save, sender='Dashboard_App.UserBadge')
+@receiver(post_delete, sender='Dashboard_App.UserBadge')
+def invalidate_snapshot_on_change(sender, instance, **kwargs):
+    try:
+        from Dashboard_App.snapshot import invalidate_dashboard_snapshot
+        invalidate_dashboard_snapshot(instance.user_id)
+    except Exception:
+        pass
+
+
+# A new user has no history outside the footprint rollup, so it never needs a backfill
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def mark_new_user_rollup_complete(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    try:
+        from Dashboard_App.rollups import mark_rollup_complete
+        mark_rollup_complete([instance.pk])
     except Exception:
         pass
@@ -0,0 +1,179 @@
+"""Cached per-user dashboard snapshot.
+
+Bundles everything the dashboard page and the status endpoint show
+(today's breakdown, recent activities, badge progress and points) under one
+cache key per user. Signals on Activity, UserChallenge and UserBadge drop the
+key; bulk writes that bypass signals call ``invalidate_dashboard_snapshot``
+themselves. The snapshot is also tagged with the day it was built (the
+user's local date, see ``EcoTrack.days``) so the "today" breakdown never
+outlives midnight. ``aget_dashboard_snapshot`` is the
+same lookup for async views.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from Activity_App.models import Activity
+from Activity_App.summary import serialize_recent
+from Challenges_App.models import UserChallenge
+from Dashboard_App.badges import abadge_metrics, badge_metrics, badge_points_owed, badge_status
+from Dashboard_App.models import UserBadge, UserPoints
+from EcoTrack.aio import alist
+from EcoTrack.days import auser_timezone, local_today, today_q, user_timezone
+
+
+def _snapshot_key(user_id):
+	return f'dashboard:snapshot:{user_id}'
+
+
+def _delete_snapshot(key):
+	try:
+		cache.delete(key)
+	except Exception:
+		pass
+
+
+def invalidate_dashboard_snapshot(user_id):
+	key = _snapshot_key(user_id)
+	_delete_snapshot(key)
+	# delete again once the write commits, so a snapshot rebuilt from
+	# pre-commit data by a concurrent request does not stick around
+	transaction.on_commit(lambda: _delete_snapshot(key))
+
+
+def _completed_challenges(user):
+	return UserChallenge.objects.filter(user=user, completed=True)
+
+
+def _with_owed_points(points_total, user, earned_keys):
+	# If the user has persisted badges but no matching completed UserChallenge rows (legacy data),
+	# include the points of the corresponding challenges so users don't lose points.
+	try:
+		points_total += badge_points_owed(user, earned_keys)
+	except Exception:
+		# fallback should never block rendering
+		pass
+	return points_total
+
+
+def compute_points(user, earned_keys):
+	"""Points from completed challenges, plus points for badges with no completed challenge."""
+	# Prefer persisted UserPoints if available (kept in sync by signals)
+	try:
+		up = UserPoints.objects.filter(user=user).first()
+		if up is not None:
+			points_total = int(up.total_points or 0)
+		else:
+			points_total = int(_completed_challenges(user).aggregate(total=Sum('challenge__points'))['total'] or 0)
+	except Exception:
+		points_total = 0
+	return _with_owed_points(points_total, user, earned_keys)
+
+
+async def acompute_points(user, earned_keys, up):
+	"""``compute_points`` for async callers that already fetched the ``UserPoints`` row (or None)."""
+	try:
+		if up is not None:
+			points_total = int(up.total_points or 0)
+		else:
+			points_total = int((await _completed_challenges(user).aaggregate(total=Sum('challenge__points')))['total'] or 0)
+	except Exception:
+		points_total = 0
+	# badge_points_owed also consults the challenge resolution table, which may have to be rebuilt
+	return await sync_to_async(_with_owed_points)(points_total, user, earned_keys)
+
+
+def _snapshot_querysets(user, tz, now):
+	"""The snapshot's independent queries: today's totals, recent activities and earned badge keys."""
+	return (
+		Activity.objects.filter(today_q('date', now=now, tz=tz), user=user).values('category').annotate(total=Sum('impact')),
+		# recent activities (limit 5 for dashboard)
+		Activity.objects.filter(user=user).order_by('-created_at')[:5],
+		UserBadge.objects.filter(user=user).values_list('key', flat=True),
+	)
+
+
+def _assemble_snapshot(today, totals, recent_qs, metrics, earned_keys, points):
+	breakdown = {'transportation': 0.0, 'diet': 0.0, 'energy': 0.0}
+	for t in totals:
+		cat = t['category']
+		try:
+			breakdown[cat] = float(t['total'] or 0)
+		except Exception:
+			breakdown[cat] = 0.0
+
+	recent = [serialize_recent(a) for a in recent_qs]
+
+	return {
+		'day': today.isoformat(),
+		'breakdown': breakdown,
+		'recent': recent,
+		# Badge earned flags: prefer persisted UserBadge (permanent earn) but also mark
+		# as earned if the user's historical activity already meets the rule.
+		'badges': badge_status(metrics, earned_keys),
+		'points': points,
+	}
+
+
+def build_dashboard_snapshot(user):
+	"""Compute the dashboard snapshot for ``user`` straight from the database."""
+	tz, now = user_timezone(user), timezone.now()
+	totals, recent, earned = _snapshot_querysets(user, tz, now)
+	earned_keys = set(earned)
+	return _assemble_snapshot(
+		local_today(now=now, tz=tz), list(totals), list(recent), badge_metrics(user), earned_keys, compute_points(user, earned_keys),
+	)
+
+
+async def abuild_dashboard_snapshot(user):
+	"""``build_dashboard_snapshot`` on the async ORM; the independent queries are gathered."""
+	tz, now = await auser_timezone(user), timezone.now()
+	totals, recent, earned = _snapshot_querysets(user, tz, now)
+	totals, recent, earned, metrics, up = await asyncio.gather(
+		alist(totals), alist(recent), alist(earned), abadge_metrics(user),
+		UserPoints.objects.filter(user=user).afirst(),
+	)
+	earned_keys = set(earned)
+	points = await acompute_points(user, earned_keys, up)
+	return _assemble_snapshot(local_today(now=now, tz=tz), totals, recent, metrics, earned_keys, points)
+
+
+def get_dashboard_snapshot(user):
+	"""Return the cached snapshot for ``user``, rebuilding it when missing or from another day."""
+	key = _snapshot_key(user.id)
+	today = local_today(user).isoformat()
+	try:
+		snapshot = cache.get(key)
+	except Exception:
+		snapshot = None
+	if snapshot is not None and snapshot.get('day') == today:
+		return snapshot
+	snapshot = build_dashboard_snapshot(user)
+	try:
+		cache.set(key, snapshot, timeout=getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 300))
+	except Exception:
+		pass
+	return snapshot
+
+
+async def aget_dashboard_snapshot(user):
+	"""``get_dashboard_snapshot`` for async views."""
+	key = _snapshot_key(user.id)
+	today = local_today(tz=await auser_timezone(user)).isoformat()
+	try:
+		snapshot = await cache.aget(key)
+	except Exception:
+		snapshot = None
+	if snapshot is not None and snapshot.get('day') == today:
+		return snapshot
+	snapshot = await abuild_dashboard_snapshot(user)
+	try:
+		await cache.aset(key, snapshot, timeout=getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 300))
+	except Exception:
+		pass
+	return snapshot
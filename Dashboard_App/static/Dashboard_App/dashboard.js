@@ -4,24 +4,55 @@ document.addEventListener('DOMContentLoaded', function () {
     const cfLineChartEl = document.getElementById('cfLineChart');
     const cfTimeRange = document.getElementById('cfTimeRange');
 
+    // chart range -> API granularity and how many days back the window reaches (none = full history)
+    const CF_RANGES = {
+        daily: { granularity: 'day', days: 30 },
+        weekly: { granularity: 'week', days: 26 * 7 },
+        monthly: { granularity: 'month', days: 365 },
+        yearly: { granularity: 'year' },
+        overall: { granularity: 'day' }
+    };
+
+    function isoDate(d) {
+        const pad = n => String(n).padStart(2, '0');
+        return `${d.getFullYear()}-${pad(d.getMonth() + 1)}-${pad(d.getDate())}`;
+    }
+
+    // query parameters selecting the series for a chart range
+    function cfSeriesParams(range) {
+        const spec = CF_RANGES[range] || CF_RANGES.daily;
+        const params = new URLSearchParams({ granularity: spec.granularity });
+        if (spec.days) {
+            const end = new Date();
+            const start = new Date(end);
+            start.setDate(end.getDate() - (spec.days - 1));
+            params.set('start', isoDate(start));
+            params.set('end', isoDate(end));
+        }
+        return params;
+    }
+
+    function renderCFSeries(series, range) {
+        const spec = CF_RANGES[range] || CF_RANGES.daily;
+        let labels = [];
+        if (spec.granularity === 'year') {
+            labels = series.map(d => d.period ? d.period.substring(0, 4) : '');
+        } else if (spec.granularity === 'month') {
+            labels = series.map(d => d.period ? d.period.substring(0, 7) : '');
+        } else {
+            labels = series.map(d => d.period ? d.period.substring(0, 10) : '');
+        }
+        const values = series.map(d => d.total ? Number(d.total) : 0);
+        renderCFLineChart(labels, values, range);
+    }
+
     function fetchAndRenderCFLineChart(range) {
-        fetch('/dashboard/api/carbon-timeseries/')
+        // the server answers 304 when nothing changed; the browser then reuses its cached copy
+        fetch('/dashboard/api/carbon-timeseries/?' + cfSeriesParams(range).toString(), { credentials: 'same-origin' })
             .then(r => r.json())
             .then(data => {
                 if (!data.success) return;
-                let chartData = data[range] || [];
-                let labels = [];
-                let values = [];
-                if (range === 'yearly') {
-                    labels = chartData.map(d => d.year ? d.year.substring(0, 4) : '');
-                } else if (range === 'monthly') {
-                    labels = chartData.map(d => d.month ? d.month.substring(0, 7) : '');
-                } else {
-                    // daily or overall
-                    labels = chartData.map(d => d.day ? d.day.substring(0, 10) : '');
-                }
-                values = chartData.map(d => d.total ? Number(d.total) : 0);
-                renderCFLineChart(labels, values, range);
+                renderCFSeries(data.series || [], range);
             });
     }
 
@@ -83,8 +114,7 @@ document.addEventListener('DOMContentLoaded', function () {
         cfTimeRange.addEventListener('change', function () {
             fetchAndRenderCFLineChart(cfTimeRange.value);
         });
-        // Initial load
-        fetchAndRenderCFLineChart(cfTimeRange.value);
+        // the initial series comes with the bootstrap request (refreshFromServer)
     }
 
     // Update chart after activity add
@@ -261,12 +291,18 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
-    // Fetch latest persisted data from server to ensure we display up-to-date values
+    // Fetch latest persisted data from server to ensure we display up-to-date values.
+    // One bootstrap request returns the breakdown, recent activities, points,
+    // badges and the chart series instead of a request for each.
     function refreshFromServer() {
-        fetch('/activity/api/list/', { credentials: 'same-origin' })
+        const params = cfTimeRange ? cfSeriesParams(cfTimeRange.value) : new URLSearchParams();
+        params.set('include', 'breakdown,recent,badges,points' + (cfTimeRange ? ',series' : ''));
+        fetch('/api/bootstrap/?' + params.toString(), { credentials: 'same-origin' })
             .then(r => r.json())
             .then(json => {
                 if (!json.success) return;
+                if (json.series && cfTimeRange) renderCFSeries(json.series.series || [], cfTimeRange.value);
+
                 const bd = json.breakdown || {};
                 state.breakdown.transport = Number(bd.transportation || bd.transport || 0) || 0;
                 state.breakdown.diet = Number(bd.diet || 0) || 0;
@@ -294,45 +330,39 @@ document.addEventListener('DOMContentLoaded', function () {
                 updateUI();
                 evaluateBadges();
 
-                // Also refresh points and authoritative badge earned flags from dashboard API
-                fetch('/dashboard/api/status/', { credentials: 'same-origin' })
-                    .then(r2 => r2.json())
-                    .then(js2 => {
-                        if (!js2.success) return;
-                        try {
-                            const pts = Number(js2.points || 0);
-                            const ptsEl = document.getElementById('userPoints');
-                            if (ptsEl) ptsEl.textContent = pts;
-
-                            // Merge server badges into client state and update UI
-                            if (js2.badges) {
-                                const b = js2.badges;
-                                if (b.eco_commuter) {
-                                    state.badges.eco_commuter.bike_walk_trips = Number(b.eco_commuter.bike_walk_trips || 0);
-                                    state.badges.eco_commuter.bike_walk_km = Number(b.eco_commuter.bike_walk_km || 0);
-                                    state.badges.eco_commuter.earned = Boolean(b.eco_commuter.earned);
-                                }
-                                if (b.green_eater) {
-                                    state.badges.green_eater.veg_meals = Number(b.green_eater.veg_meals || 0);
-                                    state.badges.green_eater.earned = Boolean(b.green_eater.earned);
-                                }
-                                if (b.recycling_champion) {
-                                    state.badges.recycling_champion.recycle_actions = Number(b.recycling_champion.recycle_actions || 0);
-                                    state.badges.recycling_champion.earned = Boolean(b.recycling_champion.earned);
-                                }
-                                if (b.energy_saver) {
-                                    state.badges.energy_saver.renewable_uses = Number(b.energy_saver.renewable_uses || 0);
-                                    state.badges.energy_saver.earned = Boolean(b.energy_saver.earned);
-                                }
-                                if (b.carbon_neutral) {
-                                    state.badges.carbon_neutral.earned = Boolean(b.carbon_neutral.earned);
-                                }
-                                // Update badge UI now that we pulled authoritative earned flags
-                                Object.keys(state.badges).forEach(updateBadgeUI);
-                            }
-                        } catch (e) { /* ignore */ }
-                    })
-                    .catch(() => { });
+                // Also refresh points and authoritative badge earned flags
+                try {
+                    const pts = Number(json.points || 0);
+                    const ptsEl = document.getElementById('userPoints');
+                    if (ptsEl) ptsEl.textContent = pts;
+
+                    // Merge server badges into client state and update UI
+                    if (json.badges) {
+                        const b = json.badges;
+                        if (b.eco_commuter) {
+                            state.badges.eco_commuter.bike_walk_trips = Number(b.eco_commuter.bike_walk_trips || 0);
+                            state.badges.eco_commuter.bike_walk_km = Number(b.eco_commuter.bike_walk_km || 0);
+                            state.badges.eco_commuter.earned = Boolean(b.eco_commuter.earned);
+                        }
+                        if (b.green_eater) {
+                            state.badges.green_eater.veg_meals = Number(b.green_eater.veg_meals || 0);
+                            state.badges.green_eater.earned = Boolean(b.green_eater.earned);
+                        }
+                        if (b.recycling_champion) {
+                            state.badges.recycling_champion.recycle_actions = Number(b.recycling_champion.recycle_actions || 0);
+                            state.badges.recycling_champion.earned = Boolean(b.recycling_champion.earned);
+                        }
+                        if (b.energy_saver) {
+                            state.badges.energy_saver.renewable_uses = Number(b.energy_saver.renewable_uses || 0);
+                            state.badges.energy_saver.earned = Boolean(b.energy_saver.earned);
+                        }
+                        if (b.carbon_neutral) {
+                            state.badges.carbon_neutral.earned = Boolean(b.carbon_neutral.earned);
+                        }
+                        // Update badge UI now that we pulled authoritative earned flags
+                        Object.keys(state.badges).forEach(updateBadgeUI);
+                    }
+                } catch (e) { /* ignore */ }
             })
             .catch(err => console.warn('Failed to refresh dashboard data', err));
     }
@@ -1,6 +1,7 @@
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from Challenges_App.models import Challenge, UserChallenge
+import datetime
 import json
 
 
@@ -25,3 +26,561 @@ class DashboardPointsTests(TestCase):
 		self.assertTrue(data.get('success'))
 		# points should equal the challenge points (7)
 		self.assertEqual(int(data.get('points', 0)), 7)
+
+	def test_badge_points_fallback_is_constant_query(self):
+		from Dashboard_App.models import UserBadge
+		from Dashboard_App.snapshot import compute_points
+		Challenge.objects.create(title='Eco Commuter Week', points=10)
+		Challenge.objects.create(key='green_eater', title='Meatless', points=5)
+		Challenge.objects.create(title='Renewable Month', points=3)
+		UserBadge.objects.create(user=self.user, key='eco_commuter')
+		compute_points(self.user, {'eco_commuter'})  # warm the resolution table
+
+		with self.assertNumQueries(3):  # points row, completed-challenge sum, points owed
+			self.assertEqual(compute_points(self.user, {'eco_commuter'}), 10)
+		with self.assertNumQueries(3):
+			self.assertEqual(compute_points(self.user, {'eco_commuter', 'green_eater', 'energy_saver', 'carbon_neutral'}), 18)
+
+		# once the badge's challenge is completed it is counted through UserPoints only
+		UserChallenge.objects.create(user=self.user, challenge=Challenge.objects.get(key='green_eater'), completed=True)
+		self.assertEqual(compute_points(self.user, {'eco_commuter', 'green_eater'}), 15)
+
+
+class BadgeProgressTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.user = User.objects.create_user(username='progressuser', password='pass')
+
+	def test_counters_follow_creates_and_deletes(self):
+		from Activity_App.models import Activity
+		from Dashboard_App.models import BadgeProgress, UserBadge
+		import datetime
+		day = datetime.date(2025, 11, 22)
+		trips = [Activity.objects.create(user=self.user, category='transportation', subtype='bicycle', distance=2, impact=0, date=day) for _ in range(5)]
+		Activity.objects.create(user=self.user, category='diet', subtype='Vegan', impact='1.25', date=day)
+
+		progress = BadgeProgress.objects.get(user=self.user)
+		self.assertEqual(progress.eco_max_daily_trips, 5)
+		self.assertAlmostEqual(progress.eco_km, 10.0)
+		self.assertEqual(progress.veg_meals, 1)
+		self.assertTrue(UserBadge.objects.filter(user=self.user, key='eco_commuter').exists())
+
+		trips[0].delete()
+		progress.refresh_from_db()
+		self.assertEqual(progress.eco_max_daily_trips, 4)
+		self.assertAlmostEqual(progress.eco_km, 8.0)
+
+	def test_rebuild_command_matches_incremental_state(self):
+		from Activity_App.models import Activity
+		from Dashboard_App.models import BadgeProgress
+		from django.core.management import call_command
+		from io import StringIO
+		Activity.objects.create(user=self.user, category='energy', subtype='renewable', amount=3, impact='0.30')
+		Activity.objects.create(user=self.user, category='shopping', subtype='recycled bottles', impact='0.10')
+		before = BadgeProgress.objects.get(user=self.user)
+		BadgeProgress.objects.filter(user=self.user).update(renewable_uses=99)
+
+		call_command('rebuild_badge_progress', stdout=StringIO())
+		after = BadgeProgress.objects.get(user=self.user)
+		self.assertEqual(after.renewable_uses, 1)
+		self.assertEqual(after.recycle_count, before.recycle_count)
+		self.assertEqual(after.total_footprint, before.total_footprint)
+
+	def test_first_activity_seeds_once_and_undated_trips_share_a_day(self):
+		from Activity_App.models import Activity
+		from Dashboard_App.models import BadgeProgress, EcoTripDay
+		first = Activity.objects.create(user=self.user, category='transportation', subtype='walk', distance=1, impact=0)
+		progress = BadgeProgress.objects.get(user=self.user)
+		for _ in range(2):
+			Activity.objects.create(user=self.user, category='transportation', subtype='walk', distance=1, impact=0)
+		# seeded on the first activity and updated in place afterwards, never recreated
+		self.assertEqual(BadgeProgress.objects.get(user=self.user).pk, progress.pk)
+		days = list(EcoTripDay.objects.filter(user=self.user).values_list('date', 'trips'))
+		self.assertEqual(days, [(first.effective_date, 3)])
+		self.assertEqual(BadgeProgress.objects.get(user=self.user).eco_max_daily_trips, 3)
+
+
+class BadgeRuleTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.user = User.objects.create_user(username='ruleuser', password='pass')
+		self.client = Client()
+
+	def test_metrics_come_from_one_query(self):
+		from Activity_App.models import Activity
+		from Dashboard_App.badges import badge_metrics
+		import datetime
+		day = datetime.date(2025, 11, 22)
+		for _ in range(3):
+			Activity.objects.create(user=self.user, category='transportation', subtype='walk', distance=1.5, impact=0, date=day)
+		Activity.objects.create(user=self.user, category='transportation', subtype='walk', distance=1, impact=0, date=day + datetime.timedelta(days=1))
+		Activity.objects.create(user=self.user, category='energy', subtype='renewable', amount=2, impact='0.20')
+
+		with self.assertNumQueries(1):
+			metrics = badge_metrics(self.user)
+		self.assertEqual(metrics['eco_max_daily_trips'], 3)
+		self.assertAlmostEqual(metrics['eco_km'], 5.5)
+		self.assertEqual(metrics['renewable_uses'], 1)
+		self.assertAlmostEqual(metrics['total_footprint'], 0.2)
+
+	def test_evaluated_only_leaves_out_queued_activities(self):
+		from Activity_App.models import Activity
+		from Dashboard_App.badges import badge_metrics
+		import datetime
+		day = datetime.date(2025, 11, 22)
+		Activity.objects.create(user=self.user, category='transportation', subtype='walk', distance=2, impact=0, date=day)
+		Activity.objects.bulk_create([
+			Activity(user=self.user, category='transportation', subtype='walk', distance=3, impact=0, date=day, effective_date=day, pending_evaluation=True),
+		])
+		self.assertEqual(badge_metrics(self.user)['eco_max_daily_trips'], 2)
+		metrics = badge_metrics(self.user, evaluated_only=True)
+		self.assertEqual(metrics['eco_max_daily_trips'], 1)
+		self.assertAlmostEqual(metrics['eco_km'], 2)
+
+	def test_deletion_uses_trips_per_day_like_awarding(self):
+		from Activity_App.models import Activity
+		from Dashboard_App.models import UserBadge
+		import datetime
+		start = datetime.date(2025, 11, 1)
+		# 6 trips spread over 6 days: never 5 on one date and well under 50 km
+		acts = [Activity.objects.create(user=self.user, category='transportation', subtype='bicycle', distance=1, impact=0, date=start + datetime.timedelta(days=i)) for i in range(6)]
+		UserBadge.objects.create(user=self.user, key='eco_commuter')
+
+		self.client.login(username='ruleuser', password='pass')
+		resp = self.client.post(f'/history/delete/{acts[0].id}/')
+		self.assertEqual(resp.status_code, 200)
+		self.assertFalse(UserBadge.objects.filter(user=self.user, key='eco_commuter').exists())
+
+		status = self.client.get('/dashboard/api/status/').json()
+		self.assertFalse(status['badges']['eco_commuter']['earned'])
+		self.assertEqual(status['badges']['eco_commuter']['bike_walk_trips'], 1)
+
+	def test_deletion_only_rechecks_badges_it_counted_towards(self):
+		from Activity_App.models import Activity
+		from Dashboard_App.models import UserBadge
+		Activity.objects.create(user=self.user, category='transportation', subtype='bicycle', distance=1, impact=0)
+		meal = Activity.objects.create(user=self.user, category='diet', subtype='vegan', impact='1.00')
+		# neither badge is backed by the history any more
+		UserBadge.objects.create(user=self.user, key='eco_commuter')
+		UserBadge.objects.create(user=self.user, key='green_eater')
+
+		self.client.login(username='ruleuser', password='pass')
+		self.client.post(f'/history/delete/{meal.id}/')
+		keys = set(UserBadge.objects.filter(user=self.user).values_list('key', flat=True))
+		self.assertNotIn('green_eater', keys)
+		# a meal says nothing about the commuter badge
+		self.assertIn('eco_commuter', keys)
+
+
+class DailyFootprintRollupTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		User = get_user_model()
+		self.user = User.objects.create_user(username='rollupuser', password='pass')
+		self.client = Client()
+		self.client.login(username='rollupuser', password='pass')
+
+	def test_rollup_follows_activity_writes_and_feeds_timeseries(self):
+		from Activity_App.models import Activity
+		from Dashboard_App.models import DailyFootprint
+		import datetime
+		d1, d2 = datetime.date(2025, 11, 3), datetime.date(2025, 11, 4)
+		Activity.objects.create(user=self.user, category='diet', subtype='meat', impact='2.00', date=d1)
+		Activity.objects.create(user=self.user, category='energy', subtype='grid', impact='1.25', date=d1)
+		extra = Activity.objects.create(user=self.user, category='diet', subtype='meat', impact='3.00', date=d2)
+		self.assertEqual(DailyFootprint.objects.filter(user=self.user).count(), 3)
+		extra.delete()
+		self.assertFalse(DailyFootprint.objects.filter(user=self.user, day=d2).exists())
+
+		with self.assertNumQueries(4):  # session, user, rollup marker, one rollup query
+			data = self.client.get('/dashboard/api/carbon-timeseries/').json()
+		with self.assertNumQueries(3):  # the marker is cached
+			self.client.get('/dashboard/api/carbon-timeseries/')
+		self.assertEqual([(r['day'], float(r['total'])) for r in data['daily']], [('2025-11-03', 3.25)])
+		self.assertEqual([(r['week'], float(r['total'])) for r in data['weekly']], [('2025-11-03', 3.25)])
+		self.assertEqual([(r['year'], float(r['total'])) for r in data['yearly']], [('2025-01-01', 3.25)])
+
+	def test_backfill_rebuilds_from_history(self):
+		from Activity_App.models import Activity
+		from Dashboard_App.models import DailyFootprint, FootprintRollupState
+		from django.core.management import call_command
+		from io import StringIO
+		import datetime
+		# history from before the rollup existed: no rows and no marker
+		Activity.objects.create(user=self.user, category='diet', subtype='meat', impact='2.00', date=datetime.date(2025, 1, 5))
+		DailyFootprint.objects.all().delete()
+		FootprintRollupState.objects.all().delete()
+		# one activity after the deploy gets its incremental row; the old history still has to show
+		Activity.objects.create(user=self.user, category='diet', subtype='meat', impact='1.00', date=datetime.date(2025, 2, 5))
+		data = self.client.get('/dashboard/api/carbon-timeseries/').json()
+		self.assertEqual([(r['month'], float(r['total'])) for r in data['monthly']], [('2025-01-01', 2.0), ('2025-02-01', 1.0)])
+		self.assertTrue(FootprintRollupState.objects.filter(user=self.user).exists())
+
+		FootprintRollupState.objects.all().delete()
+		out = StringIO()
+		call_command('backfill_daily_footprint', '--missing', stdout=out)
+		self.assertIn('for 1 user(s)', out.getvalue())
+		self.assertTrue(FootprintRollupState.objects.filter(user=self.user).exists())
+
+		DailyFootprint.objects.update(total=0)
+		call_command('backfill_daily_footprint', stdout=StringIO())
+		self.assertEqual(sorted(float(t) for t in DailyFootprint.objects.filter(user=self.user).values_list('total', flat=True)), [1.0, 2.0])
+
+
+class TimeseriesGranularityTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		User = get_user_model()
+		self.user = User.objects.create_user(username='seriesuser', password='pass')
+		self.client = Client()
+		self.client.login(username='seriesuser', password='pass')
+
+	def _add(self, day, impact):
+		from Activity_App.models import Activity
+		return Activity.objects.create(user=self.user, category='diet', subtype='meat', impact=impact, date=day)
+
+	def test_week_series_is_windowed_and_gap_filled(self):
+		import datetime
+		self._add(datetime.date(2025, 11, 3), '2.00')
+		self._add(datetime.date(2025, 11, 20), '1.00')
+		self._add(datetime.date(2025, 12, 30), '9.00')
+		resp = self.client.get('/dashboard/api/carbon-timeseries/', {'granularity': 'week', 'start': '2025-11-01', 'end': '2025-11-23'})
+		self.assertEqual(resp.status_code, 200)
+		series = [(r['period'], r['total']) for r in resp.json()['series']]
+		self.assertEqual(series, [('2025-10-27', 0.0), ('2025-11-03', 2.0), ('2025-11-10', 0.0), ('2025-11-17', 1.0)])
+
+	def test_unchanged_series_returns_304_without_queries(self):
+		import datetime
+		self._add(datetime.date(2025, 11, 3), '2.00')
+		url = '/dashboard/api/carbon-timeseries/?granularity=month'
+		first = self.client.get(url)
+		etag = first['ETag']
+		self.assertTrue(first.has_header('Last-Modified'))
+
+		with self.assertNumQueries(2):  # session + user only
+			again = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(again.status_code, 304)
+
+		self._add(datetime.date(2025, 11, 4), '1.00')
+		changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(changed.status_code, 200)
+		self.assertEqual(changed.json()['series'], [{'period': '2025-11-01', 'total': 3.0}])
+
+	def test_rejects_unknown_granularity(self):
+		resp = self.client.get('/dashboard/api/carbon-timeseries/', {'granularity': 'hour'})
+		self.assertEqual(resp.status_code, 400)
+
+
+class DashboardSnapshotTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		User = get_user_model()
+		self.user = User.objects.create_user(username='snapuser', password='pass')
+		self.client = Client()
+		self.client.login(username='snapuser', password='pass')
+
+	def test_status_is_served_from_cache_until_a_write(self):
+		from Activity_App.models import Activity
+		self.client.get('/dashboard/api/status/')
+		with self.assertNumQueries(2):  # session + user; snapshot comes from the cache
+			cached = self.client.get('/dashboard/api/status/').json()
+		self.assertEqual(cached['badges']['green_eater']['veg_meals'], 0)
+
+		Activity.objects.create(user=self.user, category='diet', subtype='vegan', impact='1.00')
+		fresh = self.client.get('/dashboard/api/status/').json()
+		self.assertEqual(fresh['badges']['green_eater']['veg_meals'], 1)
+
+	def test_completing_a_challenge_refreshes_points(self):
+		self.client.get('/dashboard/api/status/')
+		ch = Challenge.objects.create(title='Snapshot Challenge', points=4)
+		UserChallenge.objects.create(user=self.user, challenge=ch, completed=True)
+		self.assertEqual(self.client.get('/dashboard/api/status/').json()['points'], 4)
+		resp = self.client.get('/dashboard/')
+		self.assertEqual(resp.status_code, 200)
+		self.assertContains(resp, '"points": 4')
+
+
+class BootstrapApiTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		from Activity_App.models import Activity
+		cache.clear()
+		User = get_user_model()
+		self.user = User.objects.create_user(username='bootuser', password='pass')
+		for i in range(4):
+			Challenge.objects.create(title=f'Boot Challenge {i}', points=3)
+		Activity.objects.create(user=self.user, category='diet', subtype='vegan', impact='1.50')
+		Activity.objects.create(user=self.user, category='transportation', subtype='bus', distance=4, impact='0.40')
+		self.client = Client()
+		self.client.login(username='bootuser', password='pass')
+
+	def test_matches_the_individual_endpoints(self):
+		data = self.client.get('/api/bootstrap/').json()
+		activities = self.client.get('/activity/api/list/').json()
+		status = self.client.get('/dashboard/api/status/').json()
+		self.assertEqual(data['breakdown'], activities['breakdown'])
+		self.assertEqual(data['counts'], activities['counts'])
+		self.assertEqual(data['recent'], activities['recent'][:5])
+		self.assertEqual((data['points'], data['badges']), (status['points'], status['badges']))
+		self.assertEqual(data['challenges'], self.client.get('/challenges/api/list/').json()['challenges'])
+		self.assertEqual(len(data['series']['series']), 30)
+		self.assertAlmostEqual(sum(p['total'] for p in data['series']['series']), 1.9)
+
+	def test_include_selects_fields(self):
+		data = self.client.get('/api/bootstrap/', {'include': 'points,series', 'granularity': 'month'}).json()
+		self.assertEqual(set(data), {'success', 'points', 'series'})
+		self.assertEqual(data['series']['granularity'], 'month')
+		self.client.get('/api/bootstrap/', {'include': 'points'})
+		with self.assertNumQueries(2):  # session + user; points come from the cached snapshot
+			self.client.get('/api/bootstrap/', {'include': 'points,badges'})
+
+	def test_rejects_unknown_fields(self):
+		resp = self.client.get('/api/bootstrap/', {'include': 'points,secrets'})
+		self.assertEqual(resp.status_code, 400)
+		self.assertIn('secrets', resp.json()['error'])
+
+	def test_rejects_bad_series_parameters_before_starting_any_part(self):
+		import gc
+		import warnings
+		with warnings.catch_warnings(record=True) as caught:
+			warnings.simplefilter('always')
+			resp = self.client.get('/api/bootstrap/', {'granularity': 'fortnight'})
+			gc.collect()
+		self.assertEqual(resp.status_code, 400)
+		self.assertFalse([w for w in caught if 'never awaited' in str(w.message)])
+
+
+class PointsLedgerTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.user = User.objects.create_user(username='ledgeruser', password='pass')
+		self.challenge = Challenge.objects.create(title='Ledger Challenge', points=6)
+
+	def total(self):
+		from Dashboard_App.models import UserPoints
+		return UserPoints.objects.get(user=self.user).total_points
+
+	def test_transitions_append_deltas_once(self):
+		from Dashboard_App.models import PointsLedger
+		uc = UserChallenge.objects.create(user=self.user, challenge=self.challenge, completed=True)
+		uc.save()  # no transition, no second credit
+		self.assertEqual(self.total(), 6)
+		uc.completed = False
+		uc.save()
+		self.assertEqual(self.total(), 0)
+		uc.completed = True
+		uc.save()
+		uc.delete()
+		self.assertEqual(self.total(), 0)
+		self.assertEqual(list(PointsLedger.objects.filter(user=self.user).values_list('delta', flat=True)), [6, -6, 6, -6])
+
+	def test_reconcile_repairs_drift(self):
+		from io import StringIO
+		from django.core.management import call_command
+		from Dashboard_App.models import PointsLedger, UserPoints
+		UserChallenge.objects.create(user=self.user, challenge=self.challenge, completed=True)
+		# drift: a total edited by hand, and a completion that predates the ledger
+		other = Challenge.objects.create(title='Legacy Challenge', points=4)
+		UserChallenge.objects.bulk_create([UserChallenge(user=self.user, challenge=other, completed=True)])
+		UserPoints.objects.filter(user=self.user).update(total_points=99)
+
+		call_command('reconcile_points', '--dry-run', stdout=StringIO())
+		self.assertEqual(self.total(), 99)
+		call_command('reconcile_points', stdout=StringIO())
+		self.assertEqual(self.total(), 10)
+		self.assertEqual(PointsLedger.objects.filter(user=self.user, source_id=other.id).count(), 1)
+		out = StringIO()
+		call_command('reconcile_points', stdout=out)
+		self.assertIn('Wrote 0 ledger entry(ies) and fixed 0', out.getvalue())
+
+	def test_credit_locks_points_row_and_is_atomic(self):
+		from unittest import mock
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		from Dashboard_App.models import PointsLedger
+		from Dashboard_App.points import credit_challenges
+		with CaptureQueriesContext(connection) as ctx:
+			self.assertEqual(credit_challenges(self.user.id, [self.challenge.id]), 6)
+		if connection.features.has_select_for_update:
+			self.assertTrue(any('FOR UPDATE' in q['sql'] for q in ctx.captured_queries))
+		self.assertEqual(credit_challenges(self.user.id, [self.challenge.id]), 0)
+
+		# a failure between the ledger insert and the total update leaves neither written
+		other = Challenge.objects.create(title='Atomic Challenge', points=3)
+		with mock.patch('Dashboard_App.points.timezone.now', side_effect=RuntimeError):
+			with self.assertRaises(RuntimeError):
+				credit_challenges(self.user.id, [other.id])
+		self.assertFalse(PointsLedger.objects.filter(user=self.user, source_id=other.id).exists())
+		self.assertEqual(self.total(), 6)
+
+
+class LeaderboardTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		User = get_user_model()
+		self.users = [User.objects.create_user(username=f'leader{i}', password='pass') for i in range(3)]
+		self.challenges = [Challenge.objects.create(title=f'Leader Challenge {i}', points=10 * (i + 1)) for i in range(3)]
+
+	def complete(self, user, challenge):
+		UserChallenge.objects.create(user=user, challenge=challenge, completed=True)
+
+	def test_refresh_ranks_points_and_footprint(self):
+		from Activity_App.models import Activity
+		from Dashboard_App.leaderboard import my_rank, refresh_leaderboards, top
+		self.complete(self.users[0], self.challenges[0])  # 10
+		self.complete(self.users[1], self.challenges[2])  # 30
+		self.complete(self.users[2], self.challenges[2])  # 30
+		today = datetime.date.today()
+		Activity.objects.create(user=self.users[0], category='diet', subtype='meat', impact='6.00', date=today)
+		Activity.objects.create(user=self.users[1], category='diet', subtype='vegan', impact='1.50', date=today)
+		refresh_leaderboards()
+
+		self.assertEqual([(e['rank'], e['username']) for e in top('points_all')], [(1, 'leader1'), (1, 'leader2'), (3, 'leader0')])
+		self.assertEqual(top('points_week')[0]['score'], 30.0)
+		self.assertEqual([e['username'] for e in top('footprint_all')], ['leader1', 'leader0'])
+		self.assertIsNone(my_rank(self.users[2], 'footprint_all'))
+
+		# incremental: only the changed user is rescored, the others' ranks move
+		self.complete(self.users[0], self.challenges[1])  # 10 + 20
+		self.complete(self.users[0], self.challenges[2])  # + 30 = 60
+		results = refresh_leaderboards()
+		self.assertEqual(results['points_all'][0], 1)
+		self.assertEqual(my_rank(self.users[0], 'points_all')['rank'], 1)
+		self.assertEqual(my_rank(self.users[1], 'points_all')['rank'], 2)
+
+		# a user falling behind renumbers from their old place
+		for _ in range(3):
+			Activity.objects.create(user=self.users[1], category='diet', subtype='meat', impact='6.00', date=today)
+		results = refresh_leaderboards()
+		self.assertEqual([e['username'] for e in top('footprint_all')], ['leader0', 'leader1'])
+		self.assertEqual(results['footprint_all'], (1, 2))
+
+		# nothing changed: no rank is rewritten
+		results = refresh_leaderboards()
+		self.assertEqual({reranked for _, reranked in results.values()}, {0})
+
+	def test_api_serves_top_and_my_rank(self):
+		from django.core.management import call_command
+		from io import StringIO
+		self.complete(self.users[0], self.challenges[0])
+		call_command('refresh_leaderboards', stdout=StringIO())
+		client = Client()
+		client.login(username='leader0', password='pass')
+		with self.assertNumQueries(4):  # session, user, top, me
+			data = client.get('/dashboard/api/leaderboard/', {'board': 'points_all', 'n': 5}).json()
+		self.assertEqual(data['me'], {'rank': 1, 'username': 'leader0', 'score': 10.0})
+		self.assertEqual(client.get('/dashboard/api/leaderboard/', {'board': 'nope'}).status_code, 400)
+
+
+class DeferredEvaluationTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		User = get_user_model()
+		self.user = User.objects.create_user(username='queueuser', password='pass')
+		self.bike = Challenge.objects.create(title='Bike to work', points=5)
+		self.client = Client()
+		self.client.login(username='queueuser', password='pass')
+
+	def _add(self, **payload):
+		return self.client.post('/activity/api/add/', json.dumps(payload), content_type='application/json')
+
+	def test_outbox_mode_acknowledges_with_one_write(self):
+		from io import StringIO
+		from django.core.management import call_command
+		from django.db import connection
+		from django.test import override_settings
+		from django.test.utils import CaptureQueriesContext
+		from Activity_App.models import Activity
+		from Dashboard_App.models import BadgeProgress, DailyFootprint
+
+		with override_settings(EVALUATION_MODE='outbox'), CaptureQueriesContext(connection) as ctx:
+			resp = self._add(category='transportation', type='bicycle', distance=4)
+		self.assertEqual(resp.json()['evaluation'], 'queued')
+		self.assertEqual(resp.json()['challenges_completed'], [])
+		writes = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith('SELECT')]
+		self.assertEqual(len(writes), 1)
+		self.assertTrue(writes[0].startswith('INSERT INTO "Activity_App_activity"'))
+		self.assertTrue(Activity.objects.get(user=self.user).pending_evaluation)
+		self.assertFalse(BadgeProgress.objects.filter(user=self.user).exists())
+
+		out = StringIO()
+		call_command('drain_evaluations', stdout=out)
+		self.assertIn('Evaluated 1 activit(ies) for 1 user(s)', out.getvalue())
+		self.assertFalse(Activity.objects.get(user=self.user).pending_evaluation)
+		self.assertAlmostEqual(BadgeProgress.objects.get(user=self.user).eco_km, 4.0)
+		self.assertEqual(DailyFootprint.objects.get(user=self.user).count, 1)
+		self.assertTrue(UserChallenge.objects.get(user=self.user, challenge=self.bike).completed)
+
+	def test_failed_matching_leaves_rows_queued(self):
+		from unittest import mock
+		from django.test import override_settings
+		from Activity_App.models import Activity
+		from Dashboard_App.evaluation import evaluate_user
+		from Dashboard_App.models import BadgeProgress
+
+		with override_settings(EVALUATION_MODE='outbox'):
+			self._add(category='transportation', type='bicycle', distance=4)
+		with mock.patch('Challenges_App.matching.complete_matching_challenges', side_effect=RuntimeError('boom')):
+			with self.assertRaises(RuntimeError):
+				evaluate_user(self.user.id)
+		self.assertTrue(Activity.objects.get(user=self.user).pending_evaluation)
+		self.assertFalse(BadgeProgress.objects.filter(user=self.user).exists())
+		self.assertEqual(evaluate_user(self.user.id), (1, [self.bike.id]))
+		self.assertFalse(Activity.objects.get(user=self.user).pending_evaluation)
+
+	def test_deleting_a_queued_activity_counts_nothing(self):
+		from django.test import override_settings
+		from Activity_App.models import Activity
+		from Dashboard_App.evaluation import evaluate_user
+		from Dashboard_App.models import BadgeProgress, DailyFootprint
+
+		self._add(category='diet', type='vegan')
+		with override_settings(EVALUATION_MODE='outbox'):
+			self._add(category='diet', type='vegan')
+		Activity.objects.filter(user=self.user, pending_evaluation=True).get().delete()
+		self.assertEqual(evaluate_user(self.user.id), (0, []))
+		self.assertEqual(BadgeProgress.objects.get(user=self.user).veg_meals, 1)
+		self.assertEqual(DailyFootprint.objects.get(user=self.user).count, 1)
+
+	def test_rebuild_leaves_queued_rows_to_the_evaluator(self):
+		from django.test import override_settings
+		from Dashboard_App.evaluation import evaluate_user
+		from Dashboard_App.models import BadgeProgress
+		from Dashboard_App.progress import rebuild_badge_progress
+
+		self._add(category='diet', type='vegan')
+		with override_settings(EVALUATION_MODE='outbox'):
+			self._add(category='diet', type='vegetarian')
+		rebuild_badge_progress(user_ids=[self.user.id])
+		self.assertEqual(BadgeProgress.objects.get(user=self.user).veg_meals, 1)
+		evaluate_user(self.user.id)
+		self.assertEqual(BadgeProgress.objects.get(user=self.user).veg_meals, 2)
+
+	def test_thread_queue_coalesces_requests_per_user(self):
+		import threading
+		from unittest import mock
+		from Dashboard_App import evaluation
+
+		started, release = threading.Event(), threading.Event()
+		calls = []
+
+		def fake_evaluate(user_id, user=None):
+			calls.append(user_id)
+			started.set()
+			release.wait(5)
+			return 0, []
+
+		with mock.patch.object(evaluation, 'evaluate_user', fake_evaluate):
+			evaluation._submit(99)
+			self.assertTrue(started.wait(5))
+			# the first pass is running: any number of new requests collapse into one rerun
+			for _ in range(5):
+				evaluation._submit(99)
+			release.set()
+			self.assertTrue(evaluation.wait_for_idle(timeout=5))
+		self.assertEqual(calls, [99, 99])
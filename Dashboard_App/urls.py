@@ -10,4 +10,5 @@ urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('api/status/', views.dashboard_status, name='dashboard_status'),
     path('api/carbon-timeseries/', api.carbon_footprint_timeseries, name='carbon_footprint_timeseries'),
+    path('api/leaderboard/', api.leaderboard, name='leaderboard'),
 ]
\ No newline at end of file
@@ -0,0 +1,13 @@
+"""Helpers shared by the async (ASGI-native) views.
+
+Django's async ORM runs every query on the request's one database thread,
+so ``asyncio.gather`` over several querysets does not make them run in
+parallel; it does keep the view from blocking the event loop while they
+run, and lets independent queries be issued back to back without waiting
+on each other's Python-side post-processing.
+"""
+
+
+async def alist(queryset):
+    """Evaluate ``queryset`` through the async ORM and return its rows as a list."""
+    return [row async for row in queryset]
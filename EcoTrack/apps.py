@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class EcoTrackConfig(AppConfig):
+    name = 'EcoTrack'
+
+    def ready(self):
+        # once per process, before any request is handled
+        from EcoTrack.middleware import install_template_timing
+        install_template_timing()
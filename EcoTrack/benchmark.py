@@ -0,0 +1,177 @@
+"""In-process benchmark of the hot endpoints.
+
+Requests go through the Django test client, and therefore through the full
+middleware stack. Query counts come from the ``Server-Timing`` header that
+``QueryBudgetMiddleware`` adds. Results are plain dicts, so they can be saved
+as JSON baselines and compared between runs.
+
+``interface='wsgi'`` drives the sync handler one request at a time (async
+views are adapted onto it, as under a WSGI server). ``interface='asgi'``
+drives the async handler with ``concurrency`` requests in flight. The test
+client has no per-request database thread, so concurrent ASGI requests still
+share one connection; the numbers show event-loop overhead and overlap, not
+parallel SQL.
+"""
+import asyncio
+import itertools
+import json
+import re
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient, Client
+
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+# name -> (method, path, JSON body or None)
+ENDPOINTS = {
+    'add_activity': ('post', '/activity/api/add/', {'category': 'transportation', 'type': 'bus', 'distance': 12}),
+    'list_activities': ('get', '/activity/api/list/', None),
+    'dashboard': ('get', '/dashboard/', None),
+    'dashboard_status': ('get', '/dashboard/api/status/', None),
+    'carbon_timeseries': ('get', '/dashboard/api/carbon-timeseries/', None),
+    'history': ('get', '/history/', None),
+    'challenges': ('get', '/challenges/api/list/', None),
+    'bootstrap': ('get', '/api/bootstrap/', None),
+}
+# Default allowed slowdown before a result counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _summary(latencies, queries, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+
+
+def _record(name, method, path, response, queries):
+    if response.status_code >= 400:
+        raise RuntimeError(f'{name}: {method.upper()} {path} returned {response.status_code}')
+    match = QUERIES_RE.search(response.get('Server-Timing', ''))
+    if match:
+        queries.append(int(match.group(1)))
+
+
+def _run_wsgi(users, requests, endpoints, cold_cache, warmup):
+    clients = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+    results = {}
+    for name in endpoints:
+        method, path, body = ENDPOINTS[name]
+        rotation = itertools.cycle(clients)
+
+        def call():
+            client = next(rotation)
+            if method == 'post':
+                return client.post(path, data=json.dumps(body), content_type='application/json')
+            return client.get(path)
+
+        for _ in range(warmup):
+            call()
+        latencies, queries = [], []
+        started = time.perf_counter()
+        for _ in range(requests):
+            if cold_cache:
+                cache.clear()
+            t0 = time.perf_counter()
+            response = call()
+            latencies.append(time.perf_counter() - t0)
+            _record(name, method, path, response, queries)
+        results[name] = _summary(latencies, queries, time.perf_counter() - started)
+    return results
+
+
+async def _run_asgi(users, requests, endpoints, cold_cache, warmup, concurrency):
+    clients = []
+    for user in users:
+        client = AsyncClient()
+        await client.aforce_login(user)
+        clients.append(client)
+    results = {}
+    for name in endpoints:
+        method, path, body = ENDPOINTS[name]
+        rotation = itertools.cycle(clients)
+
+        async def call():
+            client = next(rotation)
+            if method == 'post':
+                return await client.post(path, data=json.dumps(body), content_type='application/json')
+            return await client.get(path)
+
+        for _ in range(warmup):
+            await call()
+        latencies, queries = [], []
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                if cold_cache:
+                    await cache.aclear()
+                t0 = time.perf_counter()
+                response = await call()
+                latencies.append(time.perf_counter() - t0)
+                _record(name, method, path, response, queries)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        results[name] = _summary(latencies, queries, time.perf_counter() - started)
+    return results
+
+
+def run_benchmark(users, requests=50, endpoints=None, cold_cache=False, warmup=2, interface='wsgi', concurrency=1):
+    """Time ``requests`` calls to each endpoint, rotating through ``users``.
+
+    Every user is logged in on its own client. ``cold_cache`` clears Django's
+    cache before each request, so cached paths such as the dashboard
+    snapshot are measured on a miss. ``concurrency`` only applies to
+    ``interface='asgi'``. Returns ``{'vendor', 'interface', 'concurrency',
+    'endpoints': {name: summary}}``.
+    """
+    endpoints = list(endpoints or ENDPOINTS)
+    if interface == 'asgi':
+        results = async_to_sync(_run_asgi)(users, requests, endpoints, cold_cache, warmup, max(concurrency, 1))
+    elif interface == 'wsgi':
+        results = _run_wsgi(users, requests, endpoints, cold_cache, warmup)
+        concurrency = 1
+    else:
+        raise ValueError(f'Unknown interface {interface!r}')
+    return {'vendor': connection.vendor, 'interface': interface, 'concurrency': concurrency, 'endpoints': results}
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Regressions of ``results`` against ``baseline``, as human-readable strings.
+
+    An endpoint regresses when its p95 grows by more than ``tolerance`` or
+    when it runs more queries per request than before.
+    """
+    problems = []
+    for name, current in results['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        if before['p95_ms'] and current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            problems.append(f"{name}: p95 {current['p95_ms']}ms vs baseline {before['p95_ms']}ms")
+        if before.get('queries_per_request') is not None and current['queries_per_request'] is not None \
+                and current['queries_per_request'] > before['queries_per_request']:
+            problems.append(f"{name}: {current['queries_per_request']} queries/request vs baseline {before['queries_per_request']}")
+    return problems
@@ -0,0 +1,132 @@
+"""Day boundaries: where "today" starts for a user.
+
+Every per-day window uses the same boundary: midnight in the user's
+timezone. That covers the dashboard's "today" breakdown and snapshot day,
+the challenge day and its completions, the default end of the footprint
+series, and the day an undated activity counts for (``local_date`` in Python,
+``local_date_expression`` in SQL), which the history order, the footprint
+rollup and the eco-trip days all read from ``Activity.effective_date``. The user's timezone is ``Profile.timezone`` when set, otherwise
+``settings.DAY_BOUNDARY_TZ``, which is GMT+8 (Asia/Manila), the original
+challenge day.
+
+The zone name is read once per request and kept on the user instance. The
+UTC instant of midnight is memoized per (zone, date). ``today_q`` and
+``since_day_start_q`` turn the boundary into plain ``__gte`` filters, which
+the (user, date) indexes serve.
+"""
+import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+DEFAULT_DAY_TZ = 'Asia/Manila'
+# attribute caching the resolved zone name on a user instance (one request)
+_USER_TZ_ATTR = '_day_timezone'
+
+
+def default_timezone_name():
+    return getattr(settings, 'DAY_BOUNDARY_TZ', DEFAULT_DAY_TZ) or 'UTC'
+
+
+@lru_cache(maxsize=256)
+def _zone(name):
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=1)
+def timezone_names():
+    """Every IANA zone name this system knows, sorted (for the profile form)."""
+    return tuple(sorted(available_timezones()))
+
+
+def is_valid_timezone(name):
+    return bool(name) and name in timezone_names()
+
+
+def get_zone(name=None):
+    """``ZoneInfo`` for ``name``; the site default when it is empty or unknown."""
+    return (name and _zone(name)) or _zone(default_timezone_name()) or ZoneInfo('UTC')
+
+
+def user_timezone(user):
+    """Name of the zone whose midnight starts ``user``'s day (profile setting, else the site default)."""
+    name = getattr(user, _USER_TZ_ATTR, None)
+    if name is not None:
+        return name
+    name = ''
+    if user is not None and getattr(user, 'is_authenticated', False):
+        from Profile_App.profiles import get_profile
+        name = get_profile(user).timezone
+    if not name or _zone(name) is None:
+        name = default_timezone_name()
+    if user is not None:
+        try:
+            setattr(user, _USER_TZ_ATTR, name)
+        except AttributeError:
+            pass
+    return name
+
+
+async def auser_timezone(user):
+    """``user_timezone`` for async code; only the first call per user instance leaves the event loop."""
+    name = getattr(user, _USER_TZ_ATTR, None)
+    if name is not None:
+        return name
+    return await sync_to_async(user_timezone)(user)
+
+
+def forget_user_timezone(user):
+    """Drop the zone name kept on ``user`` (after the profile setting changed)."""
+    try:
+        delattr(user, _USER_TZ_ATTR)
+    except AttributeError:
+        pass
+
+
+@lru_cache(maxsize=4096)
+def day_start(tz_name, day):
+    """Midnight starting ``day`` in ``tz_name``, as an aware UTC datetime."""
+    start = datetime.datetime.combine(day, datetime.time.min, tzinfo=get_zone(tz_name))
+    return start.astimezone(datetime.timezone.utc)
+
+
+def local_today(user=None, now=None, tz=None):
+    """Today's date in ``tz`` (a zone name), or in ``user``'s zone when ``tz`` is not given."""
+    tz = tz or user_timezone(user)
+    return (now or timezone.now()).astimezone(get_zone(tz)).date()
+
+
+def local_date(moment, user=None, tz=None):
+    """The date of the aware datetime ``moment`` in ``tz`` or ``user``'s zone."""
+    tz = tz or user_timezone(user)
+    return moment.astimezone(get_zone(tz)).date()
+
+
+def local_date_expression(field, tz):
+    """``local_date`` in SQL: the date of the datetime column ``field`` in ``tz``."""
+    return TruncDate(field, tzinfo=get_zone(tz))
+
+
+def day_cutoff(user=None, now=None, tz=None):
+    """Start of today (local midnight) in ``tz`` or ``user``'s zone, as an aware UTC datetime."""
+    tz = tz or user_timezone(user)
+    return day_start(tz, local_today(now=now, tz=tz))
+
+
+def today_q(field='date', user=None, now=None, tz=None):
+    """``Q(<field>__gte=today)`` for date columns such as ``Activity.date``."""
+    return Q(**{f'{field}__gte': local_today(user, now, tz)})
+
+
+def since_day_start_q(field, user=None, now=None, tz=None):
+    """``Q(<field>__gte=local midnight)`` for datetime columns such as ``UserChallenge.completed_at``."""
+    return Q(**{f'{field}__gte': day_cutoff(user, now, tz)})
@@ -0,0 +1,150 @@
+import json
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from Dashboard_App.evaluation import evaluate_user, pending_users, wait_for_idle
+from EcoTrack.benchmark import DEFAULT_TOLERANCE, ENDPOINTS, compare, run_benchmark
+from EcoTrack.seeding import bulk_activities, bulk_users, rebuild_derived_state
+
+
+BASELINE_DIR = os.path.join(settings.BASE_DIR, 'benchmarks')
+
+
+class Command(BaseCommand):
+	help = (
+		'Seed a throwaway test database with N users x M activities, drive the hot endpoints '
+		'through the test client and report p50/p95/p99 latency, queries per request and throughput. '
+		'Results can be saved as a per-database JSON baseline and checked against it. '
+		'--interface both runs the endpoints through the WSGI and the ASGI handler and compares throughput.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--users', type=int, default=50, help='Users to seed (default 50).')
+		parser.add_argument('--activities', type=int, default=200, help='Activities per user (default 200).')
+		parser.add_argument('--requests', type=int, default=100, help='Timed requests per endpoint (default 100).')
+		parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS),
+			help='Only benchmark this endpoint; repeatable (default: all).')
+		parser.add_argument('--cold-cache', action='store_true',
+			help='Clear the cache before every request so cached views are measured on a miss.')
+		parser.add_argument('--interface', choices=['wsgi', 'asgi', 'both'], default='both',
+			help='Request handler to drive (default both).')
+		parser.add_argument('--concurrency', type=int, default=4,
+			help='Requests in flight at once on the ASGI handler (default 4); WSGI runs one at a time.')
+		parser.add_argument('--evaluation', choices=['outbox', 'sync', 'thread'], default='outbox',
+			help='EVALUATION_MODE during the run (default outbox: the request path only; the queue is drained afterwards, untimed).')
+		parser.add_argument('--seed', type=int, default=327, help='Random seed for the generated data (default 327).')
+		parser.add_argument('--baseline', help='Baseline file (default benchmarks/baseline-<vendor>.json).')
+		parser.add_argument('--save-baseline', action='store_true', help='Write the results to the baseline file.')
+		parser.add_argument('--check', action='store_true',
+			help='Fail when an endpoint regressed against the baseline.')
+		parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+			help=f'Allowed p95 slowdown as a fraction for --check (default {DEFAULT_TOLERANCE}).')
+
+	def handle(self, *args, **options):
+		if min(options['users'], options['activities'], options['requests'], options['concurrency']) < 1:
+			raise CommandError('--users, --activities, --requests and --concurrency must be at least 1.')
+		if options['evaluation'] == 'thread' and connection.vendor == 'sqlite':
+			# the in-memory test database takes table locks; writer threads fail instead of waiting
+			raise CommandError('--evaluation thread needs a database with concurrent writers (e.g. Postgres).')
+		from django.test.runner import DiscoverRunner
+		from django.test.utils import setup_test_environment, teardown_test_environment
+
+		# never touch the real data: everything runs in a test database that is dropped afterwards
+		setup_test_environment(debug=False)
+		runner = DiscoverRunner(verbosity=0, interactive=False)
+		old_config = runner.setup_databases()
+		try:
+			results = self._run(options)
+		finally:
+			runner.teardown_databases(old_config)
+			teardown_test_environment()
+
+		self._report(results)
+		path = options['baseline'] or os.path.join(BASELINE_DIR, f"baseline-{results['vendor']}.json")
+		if options['check']:
+			self._check(results, path, options['tolerance'])
+		if options['save_baseline']:
+			os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+			with open(path, 'w') as fh:
+				json.dump(results, fh, indent=2, sort_keys=True)
+				fh.write('\n')
+			self.stdout.write(f'Baseline written to {path}.')
+
+	def _run(self, options):
+		cache.clear()
+		rng = random.Random(options['seed'])
+		started = time.monotonic()
+		users = bulk_users(options['users'], prefix='bench')
+		user_ids = [u.id for u in users]
+		rows = bulk_activities(user_ids, options['activities'], rng=rng)
+		rebuild_derived_state(user_ids)
+		self.stdout.write(f'Seeded {len(users)} user(s) and {rows} activit(ies) in {time.monotonic() - started:.1f}s.')
+
+		interfaces = ['wsgi', 'asgi'] if options['interface'] == 'both' else [options['interface']]
+		results = {'vendor': connection.vendor, 'interfaces': {}}
+		for interface in interfaces:
+			with override_settings(EVALUATION_MODE=options['evaluation']):
+				run = run_benchmark(
+					users, requests=options['requests'], endpoints=options['endpoint'], cold_cache=options['cold_cache'],
+					interface=interface, concurrency=options['concurrency'],
+				)
+			results['interfaces'][interface] = {'concurrency': run['concurrency'], 'endpoints': run['endpoints']}
+			# every interface starts from the same queue state
+			wait_for_idle(timeout=60)
+			for user_id in pending_users():
+				evaluate_user(user_id)
+		results['config'] = {
+			'users': options['users'],
+			'activities_per_user': options['activities'],
+			'requests': options['requests'],
+			'concurrency': options['concurrency'],
+			'cold_cache': options['cold_cache'],
+			'evaluation': options['evaluation'],
+			'seed': options['seed'],
+			'database': connection.settings_dict['NAME'],
+		}
+		return results
+
+	def _report(self, results):
+		runs = results['interfaces']
+		for interface, run in runs.items():
+			self.stdout.write(f"{interface.upper()} (concurrency {run['concurrency']})")
+			self.stdout.write(f"{'endpoint':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'req/s':>10}")
+			for name, row in run['endpoints'].items():
+				queries = row['queries_per_request']
+				self.stdout.write(
+					f"{name:<20}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+					f"{queries if queries is not None else '-':>10}{row['throughput_rps']:>10}"
+				)
+		if 'wsgi' in runs and 'asgi' in runs:
+			self.stdout.write('Throughput, ASGI vs WSGI')
+			for name, row in runs['asgi']['endpoints'].items():
+				before = runs['wsgi']['endpoints'][name]['throughput_rps']
+				ratio = f"{row['throughput_rps'] / before:.2f}x" if before else '-'
+				self.stdout.write(f"{name:<20}{before:>10}{row['throughput_rps']:>10}{ratio:>10}")
+
+	def _check(self, results, path, tolerance):
+		try:
+			with open(path) as fh:
+				baseline = json.load(fh)
+		except FileNotFoundError:
+			raise CommandError(f'No baseline at {path}; run with --save-baseline first.')
+		except (OSError, ValueError) as e:
+			raise CommandError(f'Unreadable baseline {path}: {e}')
+		if baseline.get('vendor') != results['vendor']:
+			raise CommandError(f"Baseline {path} was recorded on {baseline.get('vendor')}, not {results['vendor']}.")
+		problems = []
+		for interface, run in results['interfaces'].items():
+			before = baseline.get('interfaces', {}).get(interface)
+			if before:
+				problems += [f'{interface}: {p}' for p in compare(run, before, tolerance)]
+		if problems:
+			raise CommandError('Benchmark regressions:\n  ' + '\n  '.join(problems))
+		self.stdout.write(self.style.SUCCESS(f'No regressions against {path}.'))
@@ -0,0 +1,85 @@
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from EcoTrack.seeding import bulk_activities, bulk_challenges, bulk_user_challenges, bulk_users, rebuild_derived_state
+
+
+def _init_worker():
+	import django
+	django.setup()
+
+
+def _seed_shard(index, user_ids, per_user, spread, days, seed, worker=False):
+	"""Insert activities and challenge entries for one slice of users (in-process, or as a pool ``worker``)."""
+	from Challenges_App.models import Challenge
+	rng = random.Random(f'{seed}:{index}')
+	try:
+		activities = bulk_activities(user_ids, per_user, rng=rng, days=days, spread=spread)
+		joined = bulk_user_challenges(user_ids, list(Challenge.objects.all()), rng=rng)
+	finally:
+		if worker:
+			# the pool process outlives this task; the command's own connections stay open
+			connections.close_all()
+	return activities, joined
+
+
+class Command(BaseCommand):
+	help = (
+		'Generate synthetic users, activities, challenges and challenge entries with bulk inserts '
+		'(no per-row signals), then rebuild badge progress, footprint rollups, badges and points once. '
+		'Users named <prefix><n> that already exist are reused.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--users', type=int, default=1000, help='Users to create (default 1000).')
+		parser.add_argument('--activities', type=int, default=100, help='Mean activities per user (default 100).')
+		parser.add_argument('--spread', type=float, default=0.75,
+			help='Log-normal sigma of activities per user; 0 gives every user the same count (default 0.75).')
+		parser.add_argument('--days', type=int, default=365, help='Days of history to spread activities over (default 365).')
+		parser.add_argument('--prefix', default='seed', help="Username prefix (default 'seed').")
+		parser.add_argument('--password', default='ecotrack-seed', help='Password shared by the seeded users.')
+		parser.add_argument('--seed', type=int, default=327, help='Random seed (default 327).')
+		parser.add_argument('--workers', type=int, default=1,
+			help='Insert processes; users are split evenly between them (default 1, in-process).')
+		parser.add_argument('--skip-rebuild', action='store_true',
+			help='Leave derived state stale; run rebuild_badge_progress, backfill_daily_footprint and reconcile_points later.')
+
+	def handle(self, *args, **options):
+		workers = options['workers']
+		if min(options['users'], options['activities'], options['days'], workers) < 1:
+			raise CommandError('--users, --activities, --days and --workers must be at least 1.')
+		if workers > 1 and connections['default'].vendor == 'sqlite':
+			raise CommandError('--workers > 1 needs a database with concurrent writers (e.g. Postgres).')
+		started = time.monotonic()
+
+		challenges = bulk_challenges()
+		users = bulk_users(options['users'], prefix=options['prefix'], password=options['password'])
+		user_ids = [u.id for u in users]
+		self.stdout.write(f'{len(user_ids)} user(s) and {len(challenges)} challenge(s) ready.')
+
+		shard_args = (options['activities'], options['spread'], options['days'], options['seed'])
+		if workers == 1:
+			activities, joined = _seed_shard(0, user_ids, *shard_args)
+		else:
+			# children must not inherit this process's open connections
+			connections.close_all()
+			shards = [user_ids[i::workers] for i in range(workers)]
+			with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+				results = list(pool.map(_seed_shard, range(workers), shards, *[[arg] * workers for arg in (*shard_args, True)]))
+			activities = sum(a for a, _ in results)
+			joined = sum(j for _, j in results)
+		elapsed = max(time.monotonic() - started, 1e-6)
+		self.stdout.write(
+			f'Inserted {activities} activit(ies) and {joined} challenge entr(ies) '
+			f'in {elapsed:.1f}s ({activities / elapsed:,.0f} activities/s).'
+		)
+
+		if not options['skip_rebuild']:
+			rebuild_started = time.monotonic()
+			rebuild_derived_state(user_ids)
+			self.stdout.write(f'Rebuilt derived state in {time.monotonic() - rebuild_started:.1f}s.')
+		self.stdout.write(self.style.SUCCESS('Seeding complete.'))
@@ -0,0 +1,231 @@
+"""Per-request SQL and template timing with per-view query budgets.
+
+``QueryBudgetMiddleware`` counts every query run while a request is handled
+(on all database connections, with or without DEBUG), times them, and times
+template rendering. The numbers go out three ways:
+
+* a ``Server-Timing`` header (``db``, ``tpl`` and ``app`` entries) for the
+  browser devtools;
+* one JSON log line per request on the ``ecotrack.requests`` logger;
+* a warning listing the queries, when a view exceeds its budget in
+  ``settings.QUERY_BUDGETS`` (keyed by URL name, e.g.
+  ``'Dashboard_App:dashboard_status'``).
+
+Both middlewares here run natively under ASGI as well, so async views are
+not pushed back onto a thread by the middleware chain.
+
+Queries run while a streaming response is being sent (e.g. the history
+export) come after the report and are not counted; such log lines carry
+``"streaming": true``.
+"""
+import contextvars
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template as DjangoBackendTemplate
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+logger = logging.getLogger('ecotrack.requests')
+
+# Queries kept in an over-budget warning
+MAX_LOGGED_QUERIES = 50
+
+_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = []  # (sql, seconds)
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.db_time += elapsed
+        stats.queries.append((sql, elapsed))
+
+
+# render() of the backend template before install_template_timing() wrapped it
+_original_render = None
+
+
+def _timed_render(self, context=None, request=None):
+    stats = _stats.get()
+    if stats is None or stats.template_depth:
+        return _original_render(self, context, request)
+    stats.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        stats.template_time += time.perf_counter() - start
+        stats.template_depth -= 1
+
+
+def install_template_timing():
+    """Time the Django template backend's render(); ``EcoTrackConfig.ready()`` calls it once at startup.
+
+    render_to_string()/render() go through the backend template; includes
+    don't, so nothing is counted twice. Outside a request (no stats in the
+    context) the wrapper only forwards the call.
+    """
+    global _original_render
+    if _original_render is None:
+        _original_render = DjangoBackendTemplate.render
+        DjangoBackendTemplate.render = _timed_render
+
+
+def query_budget(view_name):
+    """Configured query budget for a URL name, or None when unbudgeted."""
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+@contextmanager
+def _shared_query_wrapper(conn):
+    # concurrent async requests without a thread of their own share one
+    # connection; one wrapper serves them all, and _record_query credits
+    # each query to the right request through the context variable
+    users = getattr(conn, '_query_budget_users', 0)
+    if not users:
+        conn.execute_wrappers.append(_record_query)
+    conn._query_budget_users = users + 1
+    try:
+        yield
+    finally:
+        conn._query_budget_users -= 1
+        if not conn._query_budget_users:
+            conn.execute_wrappers.remove(_record_query)
+
+
+def _enter_query_wrappers():
+    # wrappers sit on the per-thread connection objects, so they also
+    # cover a database connection that is only opened mid-request
+    stack = ExitStack()
+    for conn in connections.all():
+        stack.enter_context(_shared_query_wrapper(conn))
+    return stack
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that stays on the event loop under ASGI.
+
+    The stock middleware is sync-only, which makes Django run every request
+    behind it on a thread. Here only static files are looked up and served
+    in a thread; everything else goes straight to the async chain.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with _enter_query_wrappers():
+                response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        total = time.perf_counter() - start
+        self.report(request, response, stats, total)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _stats.set(stats)
+        start = time.perf_counter()
+        try:
+            # the ORM runs async queries on the request's sync thread (its own
+            # connection objects), so the wrappers are installed there
+            stack = await sync_to_async(_enter_query_wrappers)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _stats.reset(token)
+        total = time.perf_counter() - start
+        self.report(request, response, stats, total)
+        return response
+
+    def report(self, request, response, stats, total):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        app_time = max(total - stats.db_time - stats.template_time, 0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.query_count} queries"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'app;dur={app_time * 1000:.1f}',
+        ])
+
+        budget = query_budget(view_name)
+        record = {
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.query_count,
+            'db_ms': round(stats.db_time * 1000, 1),
+            'template_ms': round(stats.template_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'budget': budget,
+        }
+        if response.streaming:
+            # the body (and its queries) has not been produced yet
+            record['streaming'] = True
+        if budget is not None and stats.query_count > budget:
+            record['over_budget'] = True
+            record['sql'] = [sql for sql, _ in stats.queries[:MAX_LOGGED_QUERIES]]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+
@@ -0,0 +1,278 @@
+"""Bulk factories for synthetic EcoTrack data.
+
+Rows are written with ``bulk_create`` or, for activities, plain multi-row
+INSERTs, so no per-row signals fire. Call ``rebuild_derived_state`` once at
+the end so the badge counters, the footprint rollup, badges and the points
+ledger match the inserted rows.
+"""
+import datetime
+import math
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from Activity_App.impact import compute_impact, get_factor_catalogue
+from Activity_App.models import Activity
+from Challenges_App.models import Challenge, UserChallenge
+from Profile_App.models import Profile
+
+
+# Users per derived-state rebuild; keeps IN (...) lists under SQLite's variable limit
+USER_BATCH = 500
+# category -> share of activities, and subtype -> (share, quantity range)
+ACTIVITY_MIX = {
+    'transportation': (0.45, {
+        'car': (0.40, (2, 40)),
+        'bus': (0.20, (2, 25)),
+        'train': (0.10, (5, 60)),
+        'bicycle': (0.15, (1, 15)),
+        'walk': (0.15, (0.5, 5)),
+    }),
+    'diet': (0.35, {
+        'meat': (0.40, None),
+        'fish': (0.15, None),
+        'vegetarian': (0.30, None),
+        'vegan': (0.15, None),
+    }),
+    'energy': (0.15, {
+        'electricity': (0.60, (1, 30)),
+        'heating': (0.25, (1, 40)),
+        'renewable': (0.15, (1, 20)),
+    }),
+    'shopping': (0.05, {
+        'recycled bottles': (0.5, None),
+        'reused bag': (0.3, None),
+        'upcycled furniture': (0.2, None),
+    }),
+}
+# how users lean: (category, subtype) -> weight multiplier on top of ACTIVITY_MIX
+PERSONAS = (
+    (0.60, {}),
+    (0.15, {('transportation', 'bicycle'): 3, ('transportation', 'walk'): 3, ('transportation', 'car'): 0.3}),
+    (0.15, {('diet', 'vegetarian'): 3, ('diet', 'vegan'): 3, ('diet', 'meat'): 0.2}),
+    (0.10, {('energy', 'renewable'): 5, ('shopping', 'recycled bottles'): 3}),
+)
+# key, title, description, points; keyed rows back the badges (see Dashboard_App.badges)
+CHALLENGES = (
+    ('eco_commuter', 'Eco Commuter', 'Make 5 bike or walk trips in one day, or 50 km in total.', 50),
+    ('green_eater', 'Green Eater', 'Eat 7 vegetarian or vegan meals.', 40),
+    ('recycling_champion', 'Recycling Champion', 'Log 5 recycling, reuse or upcycling actions.', 40),
+    ('energy_saver', 'Energy Saver', 'Use renewable energy 5 times.', 40),
+    ('carbon_neutral', 'Carbon Neutral', 'Keep your total footprint at or below 0.5 kg CO2.', 60),
+    (None, 'Bike to Work', 'Swap one car trip for the bike.', 10),
+    (None, 'Walk It', 'Walk instead of driving a short distance.', 10),
+    (None, 'Vegan Day', 'Eat a vegan meal.', 10),
+    (None, 'Vegetarian Lunch', 'Have a vegetarian lunch.', 10),
+    (None, 'Renewable Energy Day', 'Power something with renewable energy.', 15),
+)
+BATCH_SIZE = 2000
+# raw activity inserts: rows per transaction, and rows per VALUES statement off SQLite
+INSERT_BATCH = 20000
+ROWS_PER_STATEMENT = 1000
+ACTIVITY_COLUMNS = (
+    'user_id', 'category', 'subtype', 'distance', 'amount', 'impact', 'date', 'effective_date', 'created_at', 'pending_evaluation',
+    'impact_unrated',
+)
+
+
+def bulk_users(count, prefix='seed', password='ecotrack-seed'):
+    """Create ``count`` users named ``<prefix><n>`` sharing one password hash; returns them."""
+    User = get_user_model()
+    hashed = make_password(password)
+    users = [User(username=f'{prefix}{i}', password=hashed) for i in range(count)]
+    User.objects.bulk_create(users, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    names = {u.username for u in users}
+    created = [u for u in User.objects.filter(username__startswith=prefix).order_by('id') if u.username in names]
+    # the post_save receiver that creates profiles does not run for bulk_create
+    Profile.objects.bulk_create([Profile(user=u) for u in created], batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return created
+
+
+def _persona_tables(lean):
+    """Flat ``(category, subtype)`` choices and weights for one persona."""
+    choices, weights = [], []
+    for category, (share, subtypes) in ACTIVITY_MIX.items():
+        for subtype, (sub_share, _) in subtypes.items():
+            choices.append((category, subtype))
+            weights.append(share * sub_share * lean.get((category, subtype), 1))
+    return choices, weights
+
+
+def generate_activities(user_ids, per_user, rng=None, days=365, today=None, spread=0.0):
+    """Yield activity value tuples (``ACTIVITY_COLUMNS`` order) for ``user_ids`` over the last ``days`` days.
+
+    Each user gets ``per_user`` rows, or with ``spread`` > 0 a log-normal count
+    whose mean is ``per_user`` (a few heavy users, many light ones). Users are
+    assigned a persona from ``PERSONAS`` and recent days are more likely
+    than old ones. Values are already adapted for the default database.
+    """
+    rng = rng or random.Random()
+    today = today or datetime.date.today()
+    now = timezone.now()
+    midnight = timezone.make_aware(datetime.datetime.combine(today, datetime.time.min))
+    ops = connection.ops
+    catalogue = get_factor_catalogue()
+    personas = [_persona_tables(lean) for _, lean in PERSONAS]
+    persona_weights = [share for share, _ in PERSONAS]
+    mu = math.log(per_user) - spread ** 2 / 2 if per_user else 0
+    for user_id in user_ids:
+        choices, weights = rng.choices(personas, persona_weights)[0]
+        count = max(int(round(rng.lognormvariate(mu, spread))), 1) if spread else per_user
+        for category, subtype in rng.choices(choices, weights, k=count):
+            quantity_range = ACTIVITY_MIX[category][1][subtype][1]
+            quantity = round(rng.uniform(*quantity_range), 1) if quantity_range else None
+            age = min(int(rng.triangular(0, days, 0)), days - 1)
+            day = today - datetime.timedelta(days=age)
+            distance = quantity if category == 'transportation' else None
+            amount = quantity if category == 'energy' else None
+            impact = compute_impact(category, subtype, distance, amount, on=day, catalogue=catalogue)
+            created_at = min(midnight - datetime.timedelta(days=age, seconds=-rng.randrange(86400)), now)
+            yield (
+                user_id, category, subtype, distance, amount, impact if impact is not None else Decimal('0.00'),
+                ops.adapt_datefield_value(day), ops.adapt_datefield_value(day), ops.adapt_datetimefield_value(created_at), False,
+                impact is None,
+            )
+
+
+def insert_rows(model, columns, rows):
+    """INSERT value tuples for ``columns`` of ``model`` without building model instances.
+
+    ``bulk_create`` spends most of its time compiling each field of each
+    object; seeding millions of rows needs the plain driver path instead.
+    SQLite gets ``executemany``; other backends get multi-row VALUES
+    statements of ``ROWS_PER_STATEMENT`` rows.
+    """
+    if not rows:
+        return 0
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    names = ', '.join(qn(model._meta.get_field(column).column) for column in columns)
+    row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(f'INSERT INTO {table} ({names}) VALUES {row_sql}', rows)
+        else:
+            for start in range(0, len(rows), ROWS_PER_STATEMENT):
+                chunk = rows[start:start + ROWS_PER_STATEMENT]
+                cursor.execute(
+                    f'INSERT INTO {table} ({names}) VALUES ' + ', '.join([row_sql] * len(chunk)),
+                    [value for row in chunk for value in row],
+                )
+    return len(rows)
+
+
+def bulk_activities(user_ids, per_user, rng=None, days=365, spread=0.0):
+    """Insert activities (see ``generate_activities``) in ``INSERT_BATCH`` row transactions; returns rows written."""
+    written = 0
+    batch = []
+    for row in generate_activities(user_ids, per_user, rng=rng, days=days, spread=spread):
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH:
+            written += insert_rows(Activity, ACTIVITY_COLUMNS, batch)
+            batch = []
+    return written + insert_rows(Activity, ACTIVITY_COLUMNS, batch)
+
+
+def bulk_challenges():
+    """Create the ``CHALLENGES`` catalogue rows that don't exist yet; returns every catalogue challenge."""
+    from Challenges_App.matching import invalidate_challenge_index
+
+    existing = set(Challenge.objects.filter(title__in=[title for _, title, _, _ in CHALLENGES]).values_list('title', flat=True))
+    Challenge.objects.bulk_create([
+        Challenge(key=key, title=title, description=description, points=points)
+        for key, title, description, points in CHALLENGES if title not in existing
+    ])
+    # bulk_create skips the receivers that drop the cached matchers and badge table
+    invalidate_challenge_index()
+    return list(Challenge.objects.filter(title__in=[title for _, title, _, _ in CHALLENGES]).order_by('id'))
+
+
+def _insert_user_challenges(rows, user_ids):
+    """``bulk_create`` ``rows`` (entries of ``user_ids``); returns how many were new."""
+    # ignore_conflicts skips existing entries without saying which, so count around it
+    entries = UserChallenge.objects.filter(user_id__in=user_ids)
+    before = entries.count()
+    UserChallenge.objects.bulk_create(rows, ignore_conflicts=True)
+    return entries.count() - before
+
+
+def bulk_user_challenges(user_ids, challenges, rng=None, joined=(0, 4), completion_rate=0.5, days=90):
+    """Join each user to a few of the unkeyed ``challenges``, completing some; returns rows written.
+
+    Keyed (badge) challenges are left to ``rebuild_derived_state``, which
+    completes them for the users that earned the badge. Entries a user
+    already has (a rerun) are kept and not counted.
+    """
+    rng = rng or random.Random()
+    pool = [c.id for c in challenges if not c.key]
+    now = timezone.now()
+    rows = []
+    batch_users = []
+    written = 0
+    for user_id in user_ids:
+        batch_users.append(user_id)
+        for challenge_id in rng.sample(pool, min(rng.randint(*joined), len(pool))):
+            completed = rng.random() < completion_rate
+            rows.append(UserChallenge(
+                user_id=user_id, challenge_id=challenge_id, completed=completed,
+                completed_at=now - datetime.timedelta(days=rng.uniform(0, days)) if completed else None,
+            ))
+        if len(rows) >= BATCH_SIZE or len(batch_users) >= BATCH_SIZE:
+            written += _insert_user_challenges(rows, batch_users)
+            rows, batch_users = [], []
+    if rows:
+        written += _insert_user_challenges(rows, batch_users)
+    return written
+
+
+def bulk_award_badges(user_ids):
+    """Set-based ``award_badges`` for ``user_ids``, read off their ``BadgeProgress`` rows.
+
+    Creates the missing ``UserBadge`` rows and marks each badge's challenge
+    completed. Points are left to ``reconcile_points``. Returns badges awarded.
+    """
+    from Dashboard_App.badges import badge_challenges, progress_metrics, qualified_badges
+    from Dashboard_App.models import BadgeProgress, UserBadge
+
+    earned = set(UserBadge.objects.filter(user_id__in=user_ids).values_list('user_id', 'key'))
+    now = timezone.now()
+    new = [
+        (progress.user_id, key)
+        for progress in BadgeProgress.objects.filter(user_id__in=user_ids)
+        for key in qualified_badges(progress_metrics(progress))
+        if (progress.user_id, key) not in earned
+    ]
+    UserBadge.objects.bulk_create([UserBadge(user_id=uid, key=key, earned_at=now) for uid, key in new], ignore_conflicts=True)
+
+    table = badge_challenges()
+    by_challenge = {}
+    for uid, key in new:
+        if key in table:
+            by_challenge.setdefault(table[key], set()).add(uid)
+    for challenge_id, uids in by_challenge.items():
+        UserChallenge.objects.bulk_create([UserChallenge(user_id=uid, challenge_id=challenge_id) for uid in uids], ignore_conflicts=True)
+        UserChallenge.objects.filter(challenge_id=challenge_id, user_id__in=uids, completed=False).update(completed=True, completed_at=now)
+    return len(new)
+
+
+def rebuild_derived_state(user_ids):
+    """Recompute everything the signals would have maintained for ``user_ids``.
+
+    Badge progress, the footprint rollup, badges (and the challenges they
+    complete) and finally the points ledger, in batches of ``USER_BATCH``.
+    """
+    from Dashboard_App.points import reconcile_points
+    from Dashboard_App.progress import rebuild_badge_progress
+    from Dashboard_App.rollups import backfill_daily_footprint
+
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), USER_BATCH):
+        batch = user_ids[start:start + USER_BATCH]
+        rebuild_badge_progress(user_ids=batch)
+        backfill_daily_footprint(user_ids=batch)
+        bulk_award_badges(batch)
+        reconcile_points(user_ids=batch)
@@ -56,6 +56,46 @@ else:
         }
     }
 
+# Cache: per-process local memory in development. In production set
+# DJANGO_CACHE_BACKEND to 'file' (default when DEBUG is off) or 'db' so every
+# worker shares one cache; 'db' needs `manage.py createcachetable`.
+CACHE_BACKEND = os.environ.get("DJANGO_CACHE_BACKEND", "locmem" if DEBUG else "file").lower()
+if CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': os.environ.get("DJANGO_CACHE_LOCATION", "ecotrack_cache"),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get("DJANGO_CACHE_LOCATION", str(BASE_DIR / '.django_cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a cached per-user dashboard snapshot may live (signals invalidate it sooner)
+DASHBOARD_SNAPSHOT_TTL = int(os.environ.get("DASHBOARD_SNAPSHOT_TTL", "300"))
+# Seconds a cached profile (avatar) may live (Profile signals invalidate it sooner)
+PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", "3600"))
+# Timezone whose midnight starts "today" for users without one on their profile
+# (dashboard day, challenge day; see EcoTrack.days). GMT+8 by default.
+DAY_BOUNDARY_TZ = os.environ.get("DAY_BOUNDARY_TZ", "Asia/Manila")
+
+# Badge/challenge evaluation of newly logged activities (Dashboard_App.evaluation):
+# 'thread' (background pool), 'outbox' (left for manage.py drain_evaluations) or 'sync'
+EVALUATION_MODE = os.environ.get("EVALUATION_MODE", "thread").lower()
+EVALUATION_WORKERS = int(os.environ.get("EVALUATION_WORKERS", "2"))
+# Tests evaluate inline (EVALUATION_MODE='sync'); see EcoTrack.testing
+TEST_RUNNER = 'EcoTrack.testing.EcoTrackTestRunner'
+
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -85,7 +125,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'EcoTrack.middleware.AsyncWhiteNoiseMiddleware',
+    'EcoTrack.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -94,6 +135,46 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Max SQL queries per request, by URL name; QueryBudgetMiddleware logs the
+# queries of any request over budget (see EcoTrack/middleware.py). Each budget
+# is the view's query plan, listed next to it; "zone" is the user's timezone.
+QUERY_BUDGETS = {
+    # session, user, zone, and on a snapshot miss (7): today's totals, recent
+    # activities, earned badges, badge metrics, the points row, its fallback sum
+    # for users without one, the badge/challenge table in a fresh process
+    'Login_App:dashboard': 10,
+    'Dashboard_App:dashboard': 10,
+    'Dashboard_App:dashboard_status': 10,
+    # session, user, the INSERT; zone for an undated activity and the emission
+    # factors in a fresh process. Evaluation runs after the response in the
+    # default 'thread' mode ('sync' runs it inline and is not budgeted)
+    'Activity_App:add_activity': 5,
+    # session, user, one keyset page, the profile for the avatar (until cached)
+    'History_App:history': 4,
+    # session, user, zone, slots; a day without the nightly assignment adds the
+    # catalogue, the INSERT and a re-read
+    'Challenges_App:list_challenges_api': 7,
+    # session, user, zone, the snapshot (7), breakdown, the rollup marker (until
+    # cached) and series, the challenge slots (4)
+    'bootstrap': 17,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # one JSON line per request at INFO; over-budget requests at WARNING
+        'ecotrack.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'EcoTrack.urls'
 
 TEMPLATES = [
@@ -0,0 +1,45 @@
+"""Test helpers shared across the apps."""
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from EcoTrack.middleware import query_budget
+
+
+class EcoTrackTestRunner(DiscoverRunner):
+    """Runs badge/challenge evaluation inline, so tests see its results right after a request.
+
+    Background threads would use their own database connection and could
+    not see the rows of a test's open transaction.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._evaluation_override = override_settings(EVALUATION_MODE='sync')
+        self._evaluation_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._evaluation_override.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetTestMixin:
+    """Assert that a request stays within its ``settings.QUERY_BUDGETS`` entry."""
+
+    def assertWithinQueryBudget(self, view_name, request, *args, **kwargs):
+        """Call ``request(*args, **kwargs)`` (e.g. ``self.client.get``) and check its query count.
+
+        Fails when ``view_name`` has no budget, when the response was served by
+        a different view, or when more queries ran than budgeted. Returns the
+        response.
+        """
+        budget = query_budget(view_name)
+        if budget is None:
+            self.fail(f'No query budget configured for {view_name!r}')
+        with CaptureQueriesContext(connections['default']) as ctx:
+            response = request(*args, **kwargs)
+        self.assertEqual(response.resolver_match.view_name, view_name)
+        if len(ctx) > budget:
+            queries = '\n'.join(f'{i}. {q["sql"]}' for i, q in enumerate(ctx.captured_queries, start=1))
+            self.fail(f'{view_name} ran {len(ctx)} queries, budget is {budget}:\n{queries}')
+        return response
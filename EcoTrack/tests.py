@@ -0,0 +1,268 @@
+import asyncio
+import json
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+
+from Activity_App.models import Activity
+from Challenges_App.models import Challenge, DailyChallengeAssignment, UserChallenge
+from Dashboard_App.badges import badge_challenges
+from Dashboard_App.models import BadgeProgress, DailyFootprint, UserBadge, UserPoints
+from Dashboard_App.points import ledger_total
+from EcoTrack.benchmark import ENDPOINTS, QUERIES_RE, compare, run_benchmark
+from EcoTrack.seeding import bulk_activities, bulk_users, rebuild_derived_state
+from EcoTrack.testing import QueryBudgetTestMixin
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+	def setUp(self):
+		cache.clear()
+		User = get_user_model()
+		self.user = User.objects.create_user(username='budgetuser', password='pass')
+		for i in range(5):
+			Challenge.objects.create(title=f'Bike Challenge {i}', points=5)
+		for _ in range(10):
+			Activity.objects.create(user=self.user, category='diet', subtype='vegan', impact='1.50')
+		self.client = Client()
+		self.client.login(username='budgetuser', password='pass')
+
+	def test_hot_views_stay_within_budget(self):
+		self.assertWithinQueryBudget('Login_App:dashboard', self.client.get, '/dashboard/')
+		cache.clear()
+		self.assertWithinQueryBudget('Dashboard_App:dashboard_status', self.client.get, '/dashboard/api/status/')
+		payload = json.dumps({'category': 'transportation', 'type': 'bicycle', 'distance': 3})
+		# the budget is the request path; evaluation runs after the response in the default mode
+		with override_settings(EVALUATION_MODE='thread'):
+			self.assertWithinQueryBudget('Activity_App:add_activity', self.client.post, '/activity/api/add/', payload, content_type='application/json')
+			self.assertWithinQueryBudget('Activity_App:add_activity', self.client.post, '/activity/api/add/', payload, content_type='application/json')
+		self.assertWithinQueryBudget('History_App:history', self.client.get, '/history/')
+		self.assertWithinQueryBudget('Challenges_App:list_challenges_api', self.client.get, '/challenges/api/list/')
+		cache.clear()
+		DailyChallengeAssignment.objects.filter(user=self.user).delete()
+		self.assertWithinQueryBudget('bootstrap', self.client.get, '/api/bootstrap/')
+
+	def test_server_timing_header(self):
+		from django.template.backends.django import Template
+		from django.template.loader import render_to_string
+		from EcoTrack.middleware import _timed_render, install_template_timing
+		resp = self.client.get('/history/')
+		self.assertRegex(resp['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, app;dur=[\d.]+$')
+		self.assertNotRegex(resp['Server-Timing'], r'tpl;dur=0\.0,')
+		# installed once at startup, not per request; outside a request it only forwards
+		install_template_timing()
+		self.assertIs(Template.render, _timed_render)
+		self.assertIn('<html', render_to_string('History.html', {'history_items': []}).lower())
+
+	@override_settings(QUERY_BUDGETS={'Challenges_App:list_challenges_api': 1})
+	def test_over_budget_request_logs_its_queries(self):
+		with self.assertLogs('ecotrack.requests', level='WARNING') as logs:
+			self.client.get('/challenges/api/list/')
+		record = json.loads(logs.records[0].getMessage())
+		self.assertTrue(record['over_budget'])
+		self.assertEqual(record['view'], 'Challenges_App:list_challenges_api')
+		self.assertEqual(len(record['sql']), record['queries'])
+
+
+class AsyncApiTests(TestCase):
+	urls = ['/activity/api/list/', '/dashboard/api/status/', '/dashboard/api/carbon-timeseries/', '/challenges/api/list/']
+
+	def setUp(self):
+		cache.clear()
+		self.user = get_user_model().objects.create_user(username='asyncuser', password='pass')
+		for i in range(4):
+			Challenge.objects.create(title=f'Bike Challenge {i}', points=5)
+		for subtype in ('bus', 'bicycle', 'vegan'):
+			Activity.objects.create(user=self.user, category='diet' if subtype == 'vegan' else 'transportation',
+				subtype=subtype, impact='1.25')
+		self.client.force_login(self.user)
+
+	def _queries(self, response):
+		return int(QUERIES_RE.search(response['Server-Timing']).group(1))
+
+	def test_asgi_matches_wsgi(self):
+		async_to_sync(self.async_client.aforce_login)(self.user)
+		for url in self.urls:
+			# warm the in-process challenge tables, then compare cold-cache requests
+			self.client.get(url)
+			cache.clear()
+			wsgi = self.client.get(url)
+			cache.clear()
+			asgi = async_to_sync(self.async_client.get)(url)
+			self.assertEqual(asgi.status_code, 200, url)
+			self.assertEqual(asgi.json(), wsgi.json(), url)
+			self.assertEqual(self._queries(asgi), self._queries(wsgi), url)
+
+	def test_concurrent_requests_count_their_own_queries(self):
+		url = '/activity/api/list/'
+		expected = self._queries(self.client.get(url))
+
+		async def burst():
+			await self.async_client.aforce_login(self.user)
+			return await asyncio.gather(*(self.async_client.get(url) for _ in range(4)))
+
+		self.assertEqual([self._queries(r) for r in async_to_sync(burst)()], [expected] * 4)
+
+
+class BenchmarkTests(TestCase):
+	def setUp(self):
+		cache.clear()
+
+	def test_seeded_data_matches_derived_state(self):
+		users = bulk_users(3, prefix='seedtest')
+		self.assertEqual(len(users), 3)
+		self.assertTrue(all(hasattr(u, 'profile') for u in users))
+		user_ids = [u.id for u in users]
+		self.assertEqual(bulk_activities(user_ids, 20), 60)
+		rebuild_derived_state(user_ids)
+		self.assertEqual(BadgeProgress.objects.filter(user_id__in=user_ids).count(), 3)
+		daily = sum(DailyFootprint.objects.filter(user_id__in=user_ids).values_list('count', flat=True))
+		self.assertEqual(daily, 60)
+		self.assertFalse(Activity.objects.filter(effective_date__isnull=True).exists())
+
+	def test_run_and_compare(self):
+		users = bulk_users(2, prefix='benchtest')
+		bulk_activities([u.id for u in users], 5)
+		# the first adds run on cold caches; budgets are covered by QueryBudgetTests
+		with self.settings(QUERY_BUDGETS={}):
+			results = run_benchmark(users, requests=2, warmup=1)
+		self.assertEqual(set(results['endpoints']), set(ENDPOINTS))
+		for row in results['endpoints'].values():
+			self.assertEqual(row['requests'], 2)
+			self.assertIsNotNone(row['queries_per_request'])
+			self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+		self.assertEqual(compare(results, results), [])
+		slower = json.loads(json.dumps(results))
+		slower['endpoints']['history']['p95_ms'] = results['endpoints']['history']['p95_ms'] * 2 + 1
+		slower['endpoints']['dashboard']['queries_per_request'] += 1
+		problems = compare(slower, results)
+		self.assertEqual(len(problems), 2)
+
+	def test_asgi_run_keeps_query_counts(self):
+		users = bulk_users(2, prefix='benchtest')
+		bulk_activities([u.id for u in users], 5)
+		endpoints = ['list_activities', 'dashboard_status', 'challenges']
+		with self.settings(QUERY_BUDGETS={}):
+			# one warmup per user, so every snapshot is cached before timing
+			wsgi = run_benchmark(users, requests=2, endpoints=endpoints, warmup=2)
+			asgi = run_benchmark(users, requests=4, endpoints=endpoints, warmup=2, interface='asgi', concurrency=2)
+		self.assertEqual((asgi['interface'], asgi['concurrency']), ('asgi', 2))
+		for name in endpoints:
+			self.assertEqual(asgi['endpoints'][name]['requests'], 4)
+			self.assertEqual(asgi['endpoints'][name]['queries_per_request'], wsgi['endpoints'][name]['queries_per_request'])
+
+
+class SeedCommandTests(TestCase):
+	def setUp(self):
+		cache.clear()
+
+	def test_seed_builds_consistent_derived_state(self):
+		call_command('seed_ecotrack', users=8, activities=40, stdout=StringIO())
+		users = list(get_user_model().objects.filter(username__startswith='seed'))
+		self.assertEqual(len(users), 8)
+		self.assertEqual(BadgeProgress.objects.count(), 8)
+		self.assertEqual(sum(DailyFootprint.objects.values_list('count', flat=True)), Activity.objects.count())
+		table = badge_challenges()
+		for badge in UserBadge.objects.all():
+			self.assertTrue(UserChallenge.objects.filter(user=badge.user, challenge_id=table[badge.key], completed=True).exists())
+		for user in users:
+			points = UserPoints.objects.filter(user=user).values_list('total_points', flat=True).first() or 0
+			self.assertEqual(points, ledger_total(user.id))
+
+	def test_rerun_reuses_users_and_challenges(self):
+		import re
+		call_command('seed_ecotrack', users=2, activities=5, spread=0, stdout=StringIO())
+		entries = UserChallenge.objects.count()
+		out = StringIO()
+		call_command('seed_ecotrack', users=2, activities=5, spread=0, stdout=out)
+		# same seed: every challenge entry already exists and is not counted again
+		self.assertEqual(int(re.search(r'and (\d+) challenge entr', out.getvalue()).group(1)), 0)
+		self.assertEqual(UserChallenge.objects.count(), entries)
+		self.assertEqual(get_user_model().objects.filter(username__startswith='seed').count(), 2)
+		self.assertEqual(Challenge.objects.filter(key='eco_commuter').count(), 1)
+		self.assertEqual(Activity.objects.count(), 20)
+
+
+class DayBoundaryTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		User = get_user_model()
+		# UTC+14 and UTC-11 are 25 hours apart, so their dates always differ
+		self.ahead = User.objects.create_user(username='dayahead', password='pass')
+		self.behind = User.objects.create_user(username='daybehind', password='pass')
+		from Profile_App.models import Profile
+		Profile.objects.filter(user=self.ahead).update(timezone='Pacific/Kiritimati')
+		Profile.objects.filter(user=self.behind).update(timezone='Pacific/Pago_Pago')
+
+	def test_cutoff_is_local_midnight_and_memoized(self):
+		import datetime
+		from EcoTrack.days import day_cutoff, day_start, local_today
+		now = datetime.datetime(2025, 11, 3, 17, 0, tzinfo=datetime.timezone.utc)
+		# site default is GMT+8: 01:00 on the 4th locally
+		self.assertEqual(local_today(now=now), datetime.date(2025, 11, 4))
+		self.assertEqual(day_cutoff(now=now), datetime.datetime(2025, 11, 3, 16, 0, tzinfo=datetime.timezone.utc))
+		self.assertEqual(local_today(self.behind, now), datetime.date(2025, 11, 3))
+		self.assertEqual(day_cutoff(self.behind, now), datetime.datetime(2025, 11, 3, 11, 0, tzinfo=datetime.timezone.utc))
+		hits = day_start.cache_info().hits
+		day_cutoff(self.behind, now)
+		self.assertEqual(day_start.cache_info().hits, hits + 1)
+
+	def test_unknown_or_blank_zone_falls_back_to_site_default(self):
+		from EcoTrack.days import user_timezone
+		other = get_user_model().objects.create_user(username='daydefault', password='pass')
+		self.assertEqual(user_timezone(other), 'Asia/Manila')
+		with override_settings(DAY_BOUNDARY_TZ='Europe/Berlin'):
+			self.assertEqual(user_timezone(get_user_model().objects.get(pk=other.pk)), 'Europe/Berlin')
+
+	def test_dashboard_today_follows_the_users_zone(self):
+		from Dashboard_App.snapshot import build_dashboard_snapshot
+		from EcoTrack.days import local_today
+		ahead_today = local_today(self.ahead)
+		Activity.objects.create(user=self.ahead, category='diet', subtype='vegan', impact='2.00', date=ahead_today)
+		Activity.objects.create(user=self.behind, category='diet', subtype='vegan', impact='3.00', date=ahead_today)
+		ahead, behind = build_dashboard_snapshot(self.ahead), build_dashboard_snapshot(self.behind)
+		self.assertEqual(ahead['day'], ahead_today.isoformat())
+		self.assertLess(behind['day'], ahead['day'])
+		self.assertEqual(ahead['breakdown']['diet'], 2.0)
+		# still in the future for the user behind, but on or after their today
+		self.assertEqual(behind['breakdown']['diet'], 3.0)
+
+	def test_undated_activities_count_for_the_users_local_day(self):
+		import datetime
+		from Dashboard_App.models import EcoTripDay
+		from Dashboard_App.rollups import backfill_daily_footprint
+		logged = datetime.datetime(2025, 11, 3, 12, 0, tzinfo=datetime.timezone.utc)
+		ahead_day, behind_day = datetime.date(2025, 11, 4), datetime.date(2025, 11, 3)
+		for user in (self.ahead, self.behind):
+			a = Activity.objects.create(user=user, category='transportation', subtype='walk', distance=1, impact=0)
+			Activity.objects.filter(pk=a.pk).update(created_at=logged, effective_date=None)
+		# legacy rows: the backfill fills each user's in their own zone
+		call_command('backfill_effective_dates', stdout=StringIO())
+		backfill_daily_footprint()
+		from Dashboard_App.progress import rebuild_badge_progress
+		rebuild_badge_progress()
+		for user, day in ((self.ahead, ahead_day), (self.behind, behind_day)):
+			self.assertEqual(Activity.objects.get(user=user).effective_date, day)
+			self.assertEqual(list(DailyFootprint.objects.filter(user=user).values_list('day', flat=True)), [day])
+			self.assertEqual(list(EcoTripDay.objects.filter(user=user).values_list('date', flat=True)), [day])
+		# and save() agrees with the backfill
+		a = Activity.objects.get(user=self.ahead)
+		a.created_at = logged
+		a.effective_date = None
+		a.set_effective_date()
+		self.assertEqual(a.effective_date, ahead_day)
+
+	def test_challenge_day_follows_the_users_zone(self):
+		from Challenges_App.models import DailyChallengeAssignment
+		from EcoTrack.days import local_today
+		for i in range(3):
+			Challenge.objects.create(title=f'Day challenge {i}', points=1)
+		for user in (self.ahead, self.behind):
+			client = Client()
+			client.force_login(user)
+			self.assertEqual(client.get('/challenges/api/list/').status_code, 200)
+			days = set(DailyChallengeAssignment.objects.filter(user=user).values_list('day', flat=True))
+			self.assertEqual(days, {local_today(user)})
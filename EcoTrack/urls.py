@@ -15,10 +15,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from Dashboard_App.api import bootstrap
+from Profile_App.views import avatar_file
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('Homepage_App.urls')),
@@ -30,6 +33,10 @@ urlpatterns = [
     path('challenges/', include('Challenges_App.urls')),
     path('recycling/', include('Recycling_App.urls')),
     path('profile/', include('Profile_App.urls')),
+    # one combined load for the dashboard and challenges pages
+    path('api/bootstrap/', bootstrap, name='bootstrap'),
+    # content-addressed avatars and thumbnails, served with far-future cache headers
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}avatars/(?P<name>[0-9a-f]{{32}}(?:-\d+)?\.webp)$', avatar_file, name='avatar_file'),
 ]
 
 # Serve media files during development
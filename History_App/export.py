@@ -0,0 +1,170 @@
+"""Streaming export of a user's whole activity history as CSV or NDJSON.
+
+Rows are read with ``values_list().iterator()`` (``aiterator()`` under
+ASGI) in chunks of ``EXPORT_CHUNK_ROWS``. They are formatted one line at a
+time and handed out in chunks of about ``EXPORT_CHUNK_BYTES``, gzipped on
+the fly when asked. Memory use does not grow with the size of the history.
+
+The export queries run while the response streams, after
+``QueryBudgetMiddleware`` has reported the request, so its numbers for an
+export only cover the session and user lookups.
+"""
+import csv
+import json
+import zlib
+from datetime import date
+
+from Activity_App.models import Activity
+
+
+EXPORT_FIELDS = ('id', 'effective_date', 'category', 'subtype', 'distance', 'amount', 'impact', 'created_at')
+# column names in the file; ``effective_date`` is the date the history page shows
+EXPORT_COLUMNS = ('id', 'date', 'category', 'subtype', 'distance', 'amount', 'impact', 'created_at')
+EXPORT_CHUNK_ROWS = 2000
+EXPORT_CHUNK_BYTES = 64 * 1024
+FORMATS = {
+	'csv': 'text/csv; charset=utf-8',
+	'ndjson': 'application/x-ndjson',
+}
+CATEGORIES = {key for key, _ in Activity.CATEGORY_CHOICES}
+
+
+def _parse_day(value, name):
+	if not value:
+		return None
+	try:
+		return date.fromisoformat(value)
+	except ValueError:
+		raise ValueError(f'{name} must be YYYY-MM-DD')
+
+
+def parse_filters(params):
+	"""``start``/``end`` (inclusive) and ``category`` (repeatable or comma separated) from ``params``.
+
+	Returns ``(start, end, categories)``; raises ValueError when invalid.
+	"""
+	start = _parse_day(params.get('start'), 'start')
+	end = _parse_day(params.get('end'), 'end')
+	if start and end and start > end:
+		raise ValueError('start is after end')
+	categories = {c.strip() for value in params.getlist('category') for c in value.split(',') if c.strip()}
+	unknown = categories - CATEGORIES
+	if unknown:
+		raise ValueError(f"Unknown categor(ies): {', '.join(sorted(unknown))}")
+	return start, end, categories
+
+
+def export_queryset(user, start=None, end=None, categories=None):
+	"""The exported rows as tuples of ``EXPORT_FIELDS``, in history order (newest first)."""
+	from .views import HISTORY_ORDER
+	qs = Activity.objects.filter(user=user)
+	if start:
+		qs = qs.filter(effective_date__gte=start)
+	if end:
+		qs = qs.filter(effective_date__lte=end)
+	if categories:
+		qs = qs.filter(category__in=sorted(categories))
+	# named rows: that iterable is a generator, so aiterator() runs the query on
+	# its worker thread (plain values_list() executes on the event loop in Django 5.2)
+	return qs.order_by(*HISTORY_ORDER).values_list(*EXPORT_FIELDS, named=True)
+
+
+def _plain(value):
+	if value is None:
+		return None
+	if hasattr(value, 'isoformat'):
+		return value.isoformat()
+	return value
+
+
+def _csv_cell(value):
+	value = _plain(value)
+	if value is None:
+		return ''
+	if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+		# free text (subtype) must not be run as a formula by spreadsheets
+		return "'" + value
+	return value
+
+
+class _Echo:
+	"""File-like object for ``csv.writer`` that hands back each line instead of storing it."""
+
+	def write(self, value):
+		return value
+
+
+class LineFormatter:
+	"""Turns exported rows into lines of ``fmt`` (``'csv'`` or ``'ndjson'``)."""
+
+	def __init__(self, fmt):
+		self.fmt = fmt
+		self._csv = csv.writer(_Echo()) if fmt == 'csv' else None
+
+	def header(self):
+		return self._csv.writerow(EXPORT_COLUMNS) if self._csv else ''
+
+	def line(self, row):
+		if self._csv:
+			return self._csv.writerow([_csv_cell(v) for v in row])
+		record = {name: _plain(value) for name, value in zip(EXPORT_COLUMNS, row)}
+		record['impact'] = float(record['impact'] or 0)
+		return json.dumps(record) + '\n'
+
+
+class ChunkEncoder:
+	"""Collects text into byte chunks of about ``chunk_bytes``, gzip-compressed when ``compress``."""
+
+	def __init__(self, compress=False, chunk_bytes=EXPORT_CHUNK_BYTES):
+		self.chunk_bytes = chunk_bytes
+		self._parts = []
+		self._size = 0
+		# wbits 16+: a gzip member (with header and trailer), not a raw zlib stream
+		self._gzip = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+
+	def _encode(self, data):
+		if not self._gzip:
+			return data
+		# sync flush so every chunk reaches the client now instead of sitting in zlib's buffer
+		return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+	def feed(self, text):
+		"""Add ``text``; returns a chunk once enough has been collected, else ``b''``."""
+		data = text.encode('utf-8')
+		self._parts.append(data)
+		self._size += len(data)
+		if self._size < self.chunk_bytes:
+			return b''
+		data = b''.join(self._parts)
+		self._parts, self._size = [], 0
+		return self._encode(data)
+
+	def finish(self):
+		"""Everything still buffered, plus the gzip trailer."""
+		data = self._encode(b''.join(self._parts))
+		self._parts, self._size = [], 0
+		if self._gzip:
+			data += self._gzip.flush()
+		return data
+
+
+def stream_export(queryset, fmt, compress=False):
+	"""Byte chunks of the export of ``queryset``, for a sync (WSGI) ``StreamingHttpResponse``."""
+	formatter, encoder = LineFormatter(fmt), ChunkEncoder(compress)
+	encoder.feed(formatter.header())
+	for row in queryset.iterator(chunk_size=EXPORT_CHUNK_ROWS):
+		chunk = encoder.feed(formatter.line(row))
+		if chunk:
+			yield chunk
+	yield encoder.finish()
+
+
+async def astream_export(queryset, fmt, compress=False):
+	"""``stream_export`` as an async iterator, so ASGI streams it instead of collecting it first."""
+	formatter, encoder = LineFormatter(fmt), ChunkEncoder(compress)
+	encoder.feed(formatter.header())
+	async for row in queryset.aiterator(chunk_size=EXPORT_CHUNK_ROWS):
+		chunk = encoder.feed(formatter.line(row))
+		if chunk:
+			yield chunk
+	yield encoder.finish()
@@ -21,25 +21,51 @@ document.addEventListener('DOMContentLoaded', function () {
       });
   }
   
-  const exportBtn = document.getElementById('export-history-btn');
-  if (exportBtn) {
-    exportBtn.addEventListener('click', function () {
-      // For now, simple client-side CSV export placeholder
-      const rows = Array.from(document.querySelectorAll('.history-table tbody tr'));
-      if (!rows.length) {
-        alert('No history to export.');
-        return;
-      }
-      const csv = rows.map(r => Array.from(r.querySelectorAll('td')).map(td => '"' + td.innerText.replace(/"/g, '""') + '"').join(',')).join('\n');
-      const blob = new Blob([csv], { type: 'text/csv;charset=utf-8;' });
-      const url = URL.createObjectURL(blob);
-      const a = document.createElement('a');
-      a.href = url;
-      a.download = 'history.csv';
-      document.body.appendChild(a);
-      a.click();
-      a.remove();
-      URL.revokeObjectURL(url);
-    });
+  // Infinite scroll: the page ships the first page of rows, the rest come from the history API
+  const historyContainer = document.querySelector('.history-container');
+  const sentinel = document.getElementById('history-sentinel');
+  const tbody = document.querySelector('.history-table tbody');
+  if (historyContainer && sentinel && tbody) {
+    const apiUrl = historyContainer.dataset.historyApi;
+    let nextCursor = historyContainer.dataset.nextCursor || '';
+    let loading = false;
+
+    const appendRow = function (item) {
+      const tr = document.createElement('tr');
+      tr.setAttribute('data-activity-id', item.id);
+      [item.date, item.activity, item.duration].forEach(function (value) {
+        const td = document.createElement('td');
+        td.textContent = value;
+        tr.appendChild(td);
+      });
+      tbody.appendChild(tr);
+    };
+
+    const loadMore = function () {
+      if (loading || !nextCursor) return;
+      loading = true;
+      fetch(apiUrl + '?cursor=' + encodeURIComponent(nextCursor), { credentials: 'same-origin' })
+        .then(function (res) { return res.json(); })
+        .then(function (data) {
+          if (!data.success) throw new Error(data.error || 'Failed to load history');
+          data.items.forEach(appendRow);
+          nextCursor = data.next_cursor || '';
+          if (!nextCursor) {
+            sentinel.hidden = true;
+            observer.disconnect();
+          }
+        })
+        .catch(function (err) {
+          console.error('History load failed', err);
+        })
+        .finally(function () {
+          loading = false;
+        });
+    };
+
+    const observer = new IntersectionObserver(function (entries) {
+      if (entries.some(function (e) { return e.isIntersecting; })) loadMore();
+    }, { rootMargin: '200px' });
+    if (nextCursor) observer.observe(sentinel);
   }
 });
@@ -1,3 +1,148 @@
-from django.test import TestCase
+from datetime import date
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+
+from Activity_App.models import Activity
+
+
+class HistoryPaginationTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.user = User.objects.create_user(username='historyuser', password='pass')
+		self.client = Client()
+		self.client.login(username='historyuser', password='pass')
+		for day in range(1, 8):
+			Activity.objects.create(user=self.user, category='diet', subtype='vegan', impact='1.00', date=date(2025, 1, day))
+		# no date: sorted by the day it was logged, i.e. ahead of the dated ones
+		self.undated = Activity.objects.create(user=self.user, category='energy', amount=3, impact='1.00')
+
+	def test_pages_walk_the_whole_history_in_order(self):
+		seen = []
+		cursor = ''
+		while True:
+			data = self.client.get('/history/api/', {'cursor': cursor, 'limit': 3}).json()
+			self.assertTrue(data['success'])
+			self.assertLessEqual(len(data['items']), 3)
+			seen.extend(item['id'] for item in data['items'])
+			cursor = data['next_cursor']
+			if not cursor:
+				break
+		expected = list(Activity.objects.filter(user=self.user).order_by('-effective_date', '-created_at', '-id').values_list('id', flat=True))
+		self.assertEqual(seen, expected)
+		self.assertEqual(seen[0], self.undated.id)
+		self.assertEqual(len(seen), 8)
+
+	def test_page_only_renders_first_page(self):
+		Activity.objects.bulk_create([
+			Activity(user=self.user, category='diet', subtype='vegan', impact=1, date=date(2024, 6, 1)) for _ in range(60)
+		])
+		# bulk_create skipped save(); rows like these are filled once by the backfill command
+		from io import StringIO
+		from django.core.management import call_command
+		out = StringIO()
+		call_command('backfill_effective_dates', '--chunk-size', '7', stdout=out)
+		self.assertIn('Filled the effective date of 60', out.getvalue())
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		with CaptureQueriesContext(connection) as ctx:
+			resp = self.client.get('/history/')
+		# no write on the read path
+		self.assertFalse([q for q in ctx.captured_queries if not q['sql'].startswith('SELECT')])
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(len(resp.context['history_items']), 50)
+		self.assertTrue(resp.context['next_cursor'])
+
+	def test_legacy_rows_page_after_backfill(self):
+		# rows written before the column existed; build.sh backfills them on deploy
+		Activity.objects.filter(user=self.user).update(effective_date=None)
+		from django.core.management import call_command
+		from io import StringIO
+		call_command('backfill_effective_dates', stdout=StringIO())
+		data = self.client.get('/history/api/', {'limit': 4}).json()
+		self.assertTrue(data['next_cursor'])
+		rest = self.client.get('/history/api/', {'cursor': data['next_cursor'], 'limit': 4}).json()
+		self.assertEqual(len(data['items']) + len(rest['items']), 8)
+		self.assertIsNone(rest['next_cursor'])
+
+	def test_next_page_seeks_to_the_cursor_day(self):
+		from History_App.views import encode_cursor, history_queryset
+		cursor = encode_cursor(Activity.objects.get(date=date(2025, 1, 4)))
+		sql = str(history_queryset(self.user, cursor).query)
+		self.assertIn('"effective_date" <= 2025-01-04', sql)
+
+	def test_rejects_bad_cursor(self):
+		resp = self.client.get('/history/api/', {'cursor': 'not-a-cursor'})
+		self.assertEqual(resp.status_code, 400)
+
+
+class HistoryExportTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.user = User.objects.create_user(username='exportuser', password='pass')
+		self.client = Client()
+		self.client.login(username='exportuser', password='pass')
+		for day in range(1, 6):
+			Activity.objects.create(user=self.user, category='diet', subtype='vegan', impact='1.25', date=date(2025, 3, day))
+		Activity.objects.create(user=self.user, category='transportation', subtype='=HYPERLINK("x")', distance=4, impact='0.50', date=date(2025, 3, 2))
+		self.expected = list(Activity.objects.filter(user=self.user).order_by('-effective_date', '-created_at', '-id').values_list('id', flat=True))
+
+	def _rows(self, path, params=None):
+		import csv, io
+		resp = self.client.get(path, params or {})
+		self.assertEqual(resp.status_code, 200)
+		self.assertTrue(resp.streaming)
+		return list(csv.reader(io.StringIO(b''.join(resp.streaming_content).decode())))
+
+	def test_csv_streams_the_whole_history_in_order(self):
+		import json
+		with self.assertLogs('ecotrack.requests', level='INFO') as logs:
+			resp = self.client.get('/history/export.csv')
+		# the export queries run after the request is reported
+		self.assertTrue(json.loads(logs.records[-1].getMessage())['streaming'])
+		self.assertEqual(resp['Content-Type'], 'text/csv; charset=utf-8')
+		self.assertIn('attachment; filename="ecotrack-activities.csv"', resp['Content-Disposition'])
+		rows = self._rows('/history/export.csv')
+		self.assertEqual(rows[0], ['id', 'date', 'category', 'subtype', 'distance', 'amount', 'impact', 'created_at'])
+		self.assertEqual([int(r[0]) for r in rows[1:]], self.expected)
+		# formula-like free text is neutralised
+		self.assertIn('\'=HYPERLINK("x")', [r[3] for r in rows])
+
+	def test_filters(self):
+		rows = self._rows('/history/export.csv', {'start': '2025-03-02', 'end': '2025-03-03', 'category': 'diet'})
+		self.assertEqual(sorted(r[1] for r in rows[1:]), ['2025-03-02', '2025-03-03'])
+		self.assertEqual(self.client.get('/history/export.csv', {'category': 'gardening'}).status_code, 400)
+		self.assertEqual(self.client.get('/history/export.csv', {'start': '2025-03-05', 'end': '2025-03-01'}).status_code, 400)
+
+	def test_ndjson_and_gzip(self):
+		import gzip, json
+		plain = b''.join(self.client.get('/history/export.ndjson').streaming_content)
+		records = [json.loads(line) for line in plain.decode().splitlines()]
+		self.assertEqual([r['id'] for r in records], self.expected)
+		self.assertEqual(records[-1]['impact'], 1.25)
+		resp = self.client.get('/history/export.ndjson', {'gzip': '1'})
+		self.assertEqual(resp['Content-Type'], 'application/gzip')
+		self.assertIn('ecotrack-activities.ndjson.gz', resp['Content-Disposition'])
+		self.assertEqual(gzip.decompress(b''.join(resp.streaming_content)), plain)
+
+	def test_encoder_emits_bounded_chunks(self):
+		import gzip
+		from .export import ChunkEncoder
+		encoder = ChunkEncoder(compress=True, chunk_bytes=100)
+		chunks = [encoder.feed('x' * 60 + '\n') for _ in range(10)] + [encoder.finish()]
+		self.assertEqual(sum(1 for c in chunks if c), 6)
+		self.assertEqual(gzip.decompress(b''.join(chunks)), ('x' * 60 + '\n').encode() * 10)
+
+	def test_asgi_streams_an_async_iterator(self):
+		from asgiref.sync import async_to_sync
+		from django.test import AsyncClient
+
+		async def fetch():
+			client = AsyncClient()
+			await client.aforce_login(self.user)
+			resp = await client.get('/history/export.csv')
+			self.assertTrue(resp.is_async)
+			return b''.join([chunk async for chunk in resp.streaming_content])
+
+		body = async_to_sync(fetch)().decode()
+		self.assertEqual(len(body.splitlines()), len(self.expected) + 1)
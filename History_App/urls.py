@@ -5,5 +5,8 @@ app_name = 'History_App'
 
 urlpatterns = [
     path('', views.history_view, name='history'),
+    path('api/', views.history_api, name='history_api'),
+    path('export.csv', views.export_activities, {'fmt': 'csv'}, name='export_csv'),
+    path('export.ndjson', views.export_activities, {'fmt': 'ndjson'}, name='export_ndjson'),
     path('delete/<int:activity_id>/', views.delete_activity, name='delete_activity'),
 ]
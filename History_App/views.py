@@ -1,8 +1,11 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
 from django.db.models import Q, Sum
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
 
 from Activity_App.models import Activity
 
@@ -58,67 +61,149 @@ def get_dashboard_data(user):
 	}
 
 
+# Activities per history page; the API accepts ?limit= up to MAX_PAGE_SIZE
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+HISTORY_ORDER = ('-effective_date', '-created_at', '-id')
+
+
+def to_camel_case(s):
+	if not s:
+		return ''
+	return ' '.join([w.capitalize() for w in s.split()])
+
+
+def format_number(n, decimals=1):
+	try:
+		return f"{float(n):,.{decimals}f}"
+	except Exception:
+		return str(n)
+
+
+def history_item(a):
+	"""Row dict with the fields `History.html` and History.js display."""
+	activity_label = to_camel_case(a.category) if a.category else 'Activity'
+	subtype = to_camel_case(a.subtype or '')
+	if a.category == 'transportation' or a.category == 'transport':
+		desc = f"{subtype or 'Transport'}"
+		duration = f"{format_number(a.distance or 0)} km"
+		notes = ''
+	elif a.category == 'diet':
+		desc = f"{subtype or 'Meal'} Meal"
+		duration = '-'
+		notes = ''
+	elif a.category == 'energy':
+		desc = f"{format_number(a.amount or 0)} kWh"
+		duration = '-'
+		notes = ''
+	else:
+		desc = subtype or activity_label
+		duration = '-'
+		notes = ''
+
+	return {
+		'id': a.id,
+		'date': (a.effective_date or a.local_day()).isoformat(),
+		'activity': desc,
+		'duration': duration,
+		'notes': notes,
+	}
+
+
+def encode_cursor(a):
+	raw = f"{a.effective_date.isoformat()}|{a.created_at.isoformat()}|{a.id}"
+	return urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+	"""Return (effective_date, created_at, id) or raise ValueError."""
+	try:
+		raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+		day, created, pk = raw.split('|')
+		return date.fromisoformat(day), datetime.fromisoformat(created), int(pk)
+	except Exception:
+		raise ValueError('Invalid cursor')
+
+
+def history_queryset(user, cursor=None):
+	"""The user's activities after ``cursor``, in history order."""
+	qs = Activity.objects.filter(user=user)
+	if cursor:
+		day, created, pk = decode_cursor(cursor)
+		# the OR alone can't bound an index range; this redundant upper bound
+		# turns it into a (user_id = ? AND effective_date <= ?) seek
+		qs = qs.filter(effective_date__lte=day).filter(
+			Q(effective_date__lt=day)
+			| Q(effective_date=day, created_at__lt=created)
+			| Q(effective_date=day, created_at=created, id__lt=pk)
+		)
+	return qs.order_by(*HISTORY_ORDER)
+
+
+def history_page(user, cursor=None, limit=PAGE_SIZE):
+	"""One page of history, newest first: (items, next_cursor).
+
+	Keyset pagination over (effective_date, created_at, id), which the
+	``activity_history_idx`` index serves: a page starts with an index seek
+	to the cursor instead of skipping the newer rows like OFFSET does.
+	Every row must have ``effective_date`` set; save() and the write paths
+	fill it and build.sh runs ``backfill_effective_dates`` for older rows.
+	"""
+	rows = list(history_queryset(user, cursor)[:limit + 1])
+	next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+	return [history_item(a) for a in rows[:limit]], next_cursor
+
+
 @login_required
 def history_view(request):
-	"""Render the logged-in user's activity history.
+	"""Render the first page of the logged-in user's activity history.
 
-	Returns a list of dicts with fields expected by the `History.html` template:
-	`date`, `activity`, `duration`, `notes`, `id`.
+	Further pages are loaded by History.js from ``history_api``.
 	"""
-	user = request.user
+	history_items, next_cursor = history_page(request.user)
+	return render(request, 'History.html', {'history_items': history_items, 'next_cursor': next_cursor})
 
 
-	# Sort by date descending (most recent first), fallback to created_at if date is null
-	from django.db.models import F, ExpressionWrapper, DateTimeField, Case, When
-	qs = Activity.objects.filter(user=user).annotate(
-		sort_date=Case(
-			When(date__isnull=False, then=F('date')),
-			default=F('created_at'),
-			output_field=DateTimeField()
-		)
-	).order_by('-sort_date', '-created_at')
+@login_required
+def history_api(request):
+	"""JSON page of history: ``?cursor=`` from the previous page, optional ``?limit=``."""
+	try:
+		limit = min(max(int(request.GET.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+	except (TypeError, ValueError):
+		return JsonResponse({'success': False, 'error': 'Invalid limit'}, status=400)
+	cursor = request.GET.get('cursor') or None
+	try:
+		items, next_cursor = history_page(request.user, cursor, limit)
+	except ValueError as e:
+		return JsonResponse({'success': False, 'error': str(e)}, status=400)
+	return JsonResponse({'success': True, 'items': items, 'next_cursor': next_cursor})
 
-	history_items = []
 
-	def to_camel_case(s):
-		if not s:
-			return ''
-		return ' '.join([w.capitalize() for w in s.split()])
-	def format_number(n, decimals=1):
-		try:
-			return f"{float(n):,.{decimals}f}"
-		except Exception:
-			return str(n)
-
-	for a in qs:
-		activity_label = to_camel_case(a.category) if a.category else 'Activity'
-		subtype = to_camel_case(a.subtype or '')
-		if a.category == 'transportation' or a.category == 'transport':
-			desc = f"{subtype or 'Transport'}"
-			duration = f"{format_number(a.distance or 0)} km"
-			notes = ''
-		elif a.category == 'diet':
-			desc = f"{subtype or 'Meal'} Meal"
-			duration = '-'
-			notes = ''
-		elif a.category == 'energy':
-			desc = f"{format_number(a.amount or 0)} kWh"
-			duration = '-'
-			notes = ''
-		else:
-			desc = subtype or activity_label
-			duration = '-'
-			notes = ''
-
-		history_items.append({
-			'id': a.id,
-			'date': a.date.isoformat() if a.date else a.created_at.date().isoformat(),
-			'activity': desc,
-			'duration': duration,
-			'notes': notes,
-		})
+@login_required
+@require_GET
+def export_activities(request, fmt):
+	"""Download the user's whole history as CSV or NDJSON, streamed (see ``History_App.export``).
 
-	return render(request, 'History.html', {'history_items': history_items})
+	Optional ``?start=``/``?end=`` (YYYY-MM-DD, inclusive) and ``?category=``
+	filters; ``?gzip=1`` compresses the file on the fly.
+	"""
+	from .export import FORMATS, astream_export, export_queryset, parse_filters, stream_export
+	try:
+		start, end, categories = parse_filters(request.GET)
+	except ValueError as e:
+		return JsonResponse({'success': False, 'error': str(e)}, status=400)
+	compress = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+	rows = export_queryset(request.user, start, end, categories)
+	# ASGI only streams async iterators; a sync one would be read to the end first
+	stream = astream_export if isinstance(request, ASGIRequest) else stream_export
+	filename = f'ecotrack-activities.{fmt}' + ('.gz' if compress else '')
+	response = StreamingHttpResponse(
+		stream(rows, fmt, compress),
+		content_type='application/gzip' if compress else FORMATS[fmt],
+		headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+	)
+	response['Cache-Control'] = 'private, no-store'
+	return response
 
 
 @login_required
@@ -152,59 +237,37 @@ def delete_activity(request, activity_id):
 
 
 def reevaluate_badges_after_deletion(user, category, subtype):
-	"""Check if user still qualifies for badges after activity deletion."""
+	"""Check if user still qualifies for badges after activity deletion.
+
+	Uses the shared badge rules so revocation applies exactly the thresholds
+	used when awarding. ``category``/``subtype`` describe the deleted activity;
+	only the badges whose metrics it counted towards are re-checked.
+	"""
 	try:
 		from Dashboard_App.models import UserBadge
-		from Challenges_App.models import Challenge, UserChallenge
-		from django.db.models import Sum
-		from django.utils import timezone
-		
-		# ECO COMMUTER: Check if user still qualifies (5 trips or 50km of bike/walk)
-		if category in ['transportation', 'transport'] and subtype and subtype.lower() in ['bicycle', 'walk']:
-			eco_qs = Activity.objects.filter(user=user).filter(
-				Q(category='transportation') | Q(category='transport')
-			).filter(Q(subtype__iexact='bicycle') | Q(subtype__iexact='walk'))
-			eco_trips = eco_qs.count()
-			eco_km = float(eco_qs.aggregate(total_km=Sum('distance'))['total_km'] or 0)
-			
-			if eco_trips < 5 and eco_km < 50:
-				# Remove badge if no longer qualified
-				UserBadge.objects.filter(user=user, key='eco_commuter').delete()
-				# Mark challenge as incomplete
-				ch = Challenge.objects.filter(key__iexact='eco_commuter').first()
-				if ch:
-					UserChallenge.objects.filter(user=user, challenge=ch).update(
-						completed=False, completed_at=None
-					)
-		
-		# GREEN EATER: Check if user still has 7+ veg/vegan meals
-		if category == 'diet' and subtype and subtype.lower() in ['vegetarian', 'vegan']:
-			green_qs = Activity.objects.filter(user=user, category='diet').filter(
-				Q(subtype__iexact='vegetarian') | Q(subtype__iexact='vegan')
-			)
-			green_meals = green_qs.count()
-			
-			if green_meals < 7:
-				UserBadge.objects.filter(user=user, key='green_eater').delete()
-				ch = Challenge.objects.filter(key__iexact='green_eater').first()
-				if ch:
-					UserChallenge.objects.filter(user=user, challenge=ch).update(
-						completed=False, completed_at=None
-					)
-		
-		# RECYCLING CHAMPION: Check if user still has 5+ recycle activities
-		if category == 'shopping' and subtype and any(word in subtype.lower() for word in ['recycle', 'reused', 'upcycle']):
-			recycle_qs = Activity.objects.filter(user=user, category='shopping').filter(
-				Q(subtype__icontains='recycle') | Q(subtype__icontains='reused') | Q(subtype__icontains='upcycle')
+		from Dashboard_App.badges import badge_challenges, badge_metrics, revoked_badges
+		from Dashboard_App.progress import activity_metrics
+		from Challenges_App.models import UserChallenge
+
+		earned_keys = set(UserBadge.objects.filter(user=user).values_list('key', flat=True))
+		if not earned_keys:
+			return
+
+		revoked = revoked_badges(badge_metrics(user, evaluated_only=True), earned_keys, touched=activity_metrics(category, subtype))
+		if revoked:
+			# Remove badges no longer qualified for and reopen their challenges
+			UserBadge.objects.filter(user=user, key__in=revoked).delete()
+			table = badge_challenges()
+			reopened = sorted({table[key] for key in revoked if key in table})
+			UserChallenge.objects.filter(user=user, challenge_id__in=reopened).update(
+				completed=False, completed_at=None
 			)
-			if recycle_qs.count() < 5:
-				UserBadge.objects.filter(user=user, key='recycling_champion').delete()
-				ch = Challenge.objects.filter(key__iexact='recycling_champion').first()
-				if ch:
-					UserChallenge.objects.filter(user=user, challenge=ch).update(
-						completed=False, completed_at=None
-					)
-		
+			# queryset update() skips signals: take the points back and drop the dashboard snapshot here
+			from Dashboard_App.points import reverse_challenges
+			from Dashboard_App.snapshot import invalidate_dashboard_snapshot
+			reverse_challenges(user.id, reopened)
+			invalidate_dashboard_snapshot(user.id)
+
 	except Exception:
 		# Best effort - don't raise errors
 		pass
@@ -74,7 +74,10 @@ def logout_view(request):
 
 @login_required
 def dashboard(request):
-    return render(request, 'Dashboard_App/dashboard.html')
+    # /dashboard/ resolves here first (Login_App urls are included before Dashboard_App),
+    # so hand off to the real dashboard view to get its snapshot-backed context
+    from Dashboard_App.views import dashboard as dashboard_view
+    return dashboard_view(request)
 
 
 
@@ -4,5 +4,5 @@ from .models import Profile
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
-	list_display = ('user', 'avatar')
+	list_display = ('user', 'avatar', 'timezone')
 	search_fields = ('user__username', 'user__email')
@@ -0,0 +1,120 @@
+"""Avatar upload pipeline.
+
+Uploads are validated with Pillow, turned upright (EXIF orientation), cropped
+square and re-encoded as WebP, which drops EXIF/XMP/ICC metadata. The result
+and its fixed-size thumbnails are stored under the hash of the encoded image::
+
+    avatars/<hash>.webp          the cleaned image, at most MASTER_SIZE px
+    avatars/<hash>-<size>.webp   one per THUMBNAIL_SIZES
+
+A name never changes content, so ``views.avatar_file`` serves these with
+far-future cache headers, and identical uploads share one set of files.
+Avatars uploaded before this pipeline keep their original file and have no
+thumbnails; ``avatar_url`` falls back to the original for them.
+"""
+import hashlib
+import io
+import re
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+AVATAR_DIR = 'avatars'
+THUMBNAIL_SIZES = (32, 64, 128)
+MASTER_SIZE = 512
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+# a 4096 px square: about 64 MB decoded as RGBA, and far more than MASTER_SIZE needs
+MAX_PIXELS = 4096 * 4096
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+WEBP_QUALITY = 85
+# <hash>.webp or <hash>-<size>.webp, without the directory
+CONTENT_NAME_RE = re.compile(r'^(?P<hash>[0-9a-f]{32})(?:-(?P<size>\d+))?\.webp$')
+
+
+class AvatarError(ValueError):
+	"""The upload is not an acceptable avatar image; the message is user-facing."""
+
+
+def _open(upload):
+	if upload.size and upload.size > MAX_UPLOAD_BYTES:
+		raise AvatarError(f'Avatar images must be at most {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.')
+	try:
+		upload.seek(0)
+		with Image.open(upload) as probe:
+			if probe.format not in ALLOWED_FORMATS:
+				raise AvatarError('Avatars must be JPEG, PNG, GIF or WebP images.')
+			if probe.width * probe.height > MAX_PIXELS:
+				raise AvatarError('That image is too large.')
+			probe.verify()
+		# verify() leaves the image unusable; decode it again from the start
+		upload.seek(0)
+		image = Image.open(upload)
+		# JPEGs can be decoded at 1/2, 1/4 or 1/8 scale; take the smallest that still covers the master
+		image.draft(image.mode, (MASTER_SIZE, MASTER_SIZE))
+		image.load()
+	except AvatarError:
+		raise
+	except (UnidentifiedImageError, OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+		raise AvatarError('That file is not a valid image.')
+	return image
+
+
+def _encode(image):
+	out = io.BytesIO()
+	image.save(out, format='WEBP', quality=WEBP_QUALITY, method=6)
+	return out.getvalue()
+
+
+def _store(storage, name, data):
+	# content-addressed: an existing file already has these exact bytes
+	if not storage.exists(name):
+		storage.save(name, ContentFile(data))
+
+
+def process_avatar(upload, storage=None):
+	"""Validate ``upload``, store it and its thumbnails; returns the name to put in ``Profile.avatar``.
+
+	Raises ``AvatarError`` for anything that isn't an acceptable image.
+	"""
+	storage = storage or default_storage
+	image = ImageOps.exif_transpose(_open(upload))
+	has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+	image = image.convert('RGBA' if has_alpha else 'RGB')
+	side = min(min(image.size), MASTER_SIZE)
+	master = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+	# nothing from the upload's metadata may ride along into the stored files
+	master.info.clear()
+
+	data = _encode(master)
+	digest = hashlib.sha256(data).hexdigest()[:32]
+	name = f'{AVATAR_DIR}/{digest}.webp'
+	for size in THUMBNAIL_SIZES:
+		_store(storage, f'{AVATAR_DIR}/{digest}-{size}.webp', _encode(master.resize((size, size), Image.Resampling.LANCZOS)))
+	_store(storage, name, data)
+	return name
+
+
+def content_hash(name):
+	"""The content hash in a pipeline-generated avatar name, or None for legacy uploads."""
+	if not name:
+		return None
+	directory, _, base = name.rpartition('/')
+	match = CONTENT_NAME_RE.match(base)
+	if directory != AVATAR_DIR or not match:
+		return None
+	return match.group('hash')
+
+
+def avatar_url(profile, size=64, storage=None):
+	"""URL of the smallest stored variant at least ``size`` px wide, or None without an avatar."""
+	field = getattr(profile, 'avatar', None)
+	name = getattr(field, 'name', None)
+	if not name:
+		return None
+	digest = content_hash(name)
+	if digest is None:
+		return field.url
+	fit = next((s for s in THUMBNAIL_SIZES if s >= size), THUMBNAIL_SIZES[-1])
+	return (storage or default_storage).url(f'{AVATAR_DIR}/{digest}-{fit}.webp')
@@ -1,16 +1,23 @@
-from .models import Profile
+from django.utils.functional import SimpleLazyObject
+
+from .profiles import get_profile
 
 
 def profile(request):
     """Expose a `profile` variable to all templates for authenticated users.
 
     This centralizes avatar access so headers across the site can show the
-    persisted avatar image when available.
+    persisted avatar image when available. The profile is lazy: nothing is
+    looked up (not even the user) unless a template actually uses it, and
+    then it comes from the per-user cache in ``Profile_App.profiles``.
     """
-    if not request.user or not request.user.is_authenticated:
-        return {}
-    try:
-        prof, _ = Profile.objects.get_or_create(user=request.user)
-        return { 'profile': prof }
-    except Exception:
-        return {}
+    def load():
+        user = getattr(request, 'user', None)
+        if not user or not user.is_authenticated:
+            return None
+        try:
+            return get_profile(user)
+        except Exception:
+            return None
+
+    return {'profile': SimpleLazyObject(load)}
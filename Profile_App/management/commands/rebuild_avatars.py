@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from Profile_App.avatars import AvatarError, content_hash, process_avatar
+from Profile_App.models import Profile
+
+
+class Command(BaseCommand):
+	help = (
+		'Run avatars uploaded before the thumbnail pipeline through it: validate, strip metadata, '
+		'store under content-hash names and generate the thumbnails. The original files are left in place.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--dry-run', action='store_true', help='Only count the avatars that would be processed.')
+
+	def handle(self, *args, **options):
+		legacy = [p for p in Profile.objects.exclude(avatar='').exclude(avatar__isnull=True) if content_hash(p.avatar.name) is None]
+		if options['dry_run']:
+			self.stdout.write(f'{len(legacy)} avatar(s) to process.')
+			return
+		done = failed = 0
+		for profile in legacy:
+			try:
+				with profile.avatar.open('rb') as fh:
+					name = process_avatar(fh)
+			except (AvatarError, OSError) as e:
+				failed += 1
+				self.stderr.write(f'{profile.user_id}: {profile.avatar.name}: {e}')
+				continue
+			profile.avatar.name = name
+			# save() so the cached profile is dropped too
+			profile.save(update_fields=['avatar'])
+			done += 1
+		self.stdout.write(self.style.SUCCESS(f'Processed {done} avatar(s); {failed} could not be read.'))
@@ -1,13 +1,15 @@
 from django.db import models
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
 class Profile(models.Model):
-	"""User profile with optional avatar image."""
+	"""User profile with optional avatar image and the timezone their days start in."""
 	user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile')
 	avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+	# IANA zone name; blank means settings.DAY_BOUNDARY_TZ (see EcoTrack.days)
+	timezone = models.CharField(max_length=64, blank=True, default='')
 
 	def __str__(self):
 		return f"{self.user.username} profile"
@@ -21,3 +23,9 @@ def create_user_profile(sender, instance, created, **kwargs):
 		except Exception:
 			pass
 
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+	from .profiles import invalidate_profile
+	invalidate_profile(instance.user_id)
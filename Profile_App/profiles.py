@@ -0,0 +1,51 @@
+"""Cached per-user profile lookup.
+
+Headers on every page may show the avatar, and every per-day query needs the
+timezone, so the profile is read far more often than it changes. ``get_profile`` serves it from Django's cache; the
+Profile post_save/post_delete signals drop the key. A user without a profile
+row gets an unsaved ``Profile`` instead of an INSERT on the read path; the
+row is created when the user is (see ``create_user_profile``) or when the
+profile is first written to.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Profile
+
+
+def _profile_key(user_id):
+	return f'profile:{user_id}'
+
+
+def _delete_profile(key):
+	try:
+		cache.delete(key)
+	except Exception:
+		pass
+
+
+def invalidate_profile(user_id):
+	key = _profile_key(user_id)
+	_delete_profile(key)
+	# again after commit, in case a concurrent read cached the old row meanwhile
+	transaction.on_commit(lambda: _delete_profile(key))
+
+
+def get_profile(user):
+	"""``user``'s Profile, from the cache when possible; unsaved if the row is missing."""
+	key = _profile_key(user.id)
+	try:
+		cached = cache.get(key)
+	except Exception:
+		cached = None
+	if cached is None:
+		cached = (
+			Profile.objects.filter(user_id=user.id).values('id', 'avatar', 'timezone').first()
+			or {'id': None, 'avatar': '', 'timezone': ''}
+		)
+		try:
+			cache.set(key, cached, timeout=getattr(settings, 'PROFILE_CACHE_TTL', 3600))
+		except Exception:
+			pass
+	return Profile(id=cached['id'], user=user, avatar=cached['avatar'] or None, timezone=cached.get('timezone') or '')
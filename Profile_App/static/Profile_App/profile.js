@@ -105,10 +105,6 @@ document.addEventListener('DOMContentLoaded', function() {
                 // replace initials div with an img
                 var newImg = document.createElement('img');
                 newImg.id = 'profileAvatarImg';
-                newImg.style.width = '96px';
-                newImg.style.height = '96px';
-                newImg.style.borderRadius = '50%';
-                newImg.style.objectFit = 'cover';
                 newImg.src = evt.target.result;
                 initials.parentNode.replaceChild(newImg, initials);
             }
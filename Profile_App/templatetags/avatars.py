@@ -0,0 +1,36 @@
+from django import template
+
+from Profile_App import avatars
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(profile, size=64):
+	"""``{% avatar_url profile 128 as url %}``: the smallest stored variant at least ``size`` px, or ''."""
+	return avatars.avatar_url(profile, int(size)) or ''
+
+
+@register.inclusion_tag('Profile_App/avatar.html', takes_context=True)
+def avatar(context, size=45, fallback='Guest'):
+	"""The header avatar for the current user at ``size`` CSS px: thumbnail image or initials.
+
+	Uses the lazy ``profile`` from the context processor, so the profile is
+	only looked up when this tag renders.
+	"""
+	user = context.get('user')
+	url = url_2x = None
+	if user is not None and user.is_authenticated:
+		profile = context.get('profile')
+		url = avatars.avatar_url(profile, size)
+		if url:
+			url_2x = avatars.avatar_url(profile, size * 2)
+	return {
+		'user': user,
+		'size': size,
+		'url': url,
+		# no srcset when the 2x variant is the same file
+		'url_2x': url_2x if url_2x != url else None,
+		'fallback': fallback,
+	}
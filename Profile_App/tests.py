@@ -1,3 +1,142 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase, override_settings
+from PIL import Image
+
+from .avatars import THUMBNAIL_SIZES, AvatarError, process_avatar
+from .context_processors import profile as profile_context
+from .models import Profile
+
+
+class ProfileContextTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = get_user_model().objects.create_user(username='profileuser', password='pass')
+		self.request = RequestFactory().get('/')
+		self.request.user = self.user
+
+	def test_profile_is_lazy_and_cached(self):
+		with self.assertNumQueries(0):
+			context = profile_context(self.request)
+		with self.assertNumQueries(1):
+			self.assertEqual(context['profile'].id, self.user.profile.id)
+		with self.assertNumQueries(0):
+			self.assertFalse(profile_context(self.request)['profile'].avatar)
+
+	def test_save_invalidates_the_cache(self):
+		profile_context(self.request)['profile'].avatar  # prime the cache
+		prof = Profile.objects.get(user=self.user)
+		prof.avatar = 'avatars/me.png'
+		prof.save()
+		self.assertEqual(profile_context(self.request)['profile'].avatar.name, 'avatars/me.png')
+
+	def test_missing_profile_is_not_inserted_on_read(self):
+		Profile.objects.filter(user=self.user).delete()
+		prof = profile_context(self.request)['profile']
+		self.assertIsNone(prof.id)
+		self.assertFalse(Profile.objects.filter(user=self.user).exists())
+
+		client = Client()
+		client.force_login(self.user)
+		self.assertEqual(client.get('/profile/').status_code, 200)
+		self.assertFalse(Profile.objects.filter(user=self.user).exists())
+
+	def test_timezone_setting_is_validated_and_saved(self):
+		client = Client()
+		client.force_login(self.user)
+		form = {'username': 'profileuser', 'email': 'profile@example.com'}
+		client.post('/profile/', {**form, 'timezone': 'Mars/Olympus_Mons'})
+		self.assertEqual(Profile.objects.get(user=self.user).timezone, '')
+		client.post('/profile/', {**form, 'timezone': 'Europe/Berlin'})
+		self.assertEqual(Profile.objects.get(user=self.user).timezone, 'Europe/Berlin')
+		from EcoTrack.days import user_timezone
+		self.assertEqual(user_timezone(get_user_model().objects.get(pk=self.user.pk)), 'Europe/Berlin')
+
+
+def _jpeg(size=(300, 200), color='green', **save_kwargs):
+	buf = io.BytesIO()
+	Image.new('RGB', size, color).save(buf, 'JPEG', **save_kwargs)
+	return SimpleUploadedFile('me.jpg', buf.getvalue(), content_type='image/jpeg')
+
+
+class AvatarPipelineTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.media = tempfile.mkdtemp()
+		override = override_settings(MEDIA_ROOT=self.media)
+		override.enable()
+		self.addCleanup(override.disable)
+		self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+		self.user = get_user_model().objects.create_user(username='avataruser', password='pass')
+		self.client = Client()
+		self.client.force_login(self.user)
+
+	def test_upload_is_cleaned_and_thumbnailed(self):
+		exif = Image.Exif()
+		exif[0x010f] = 'CameraMaker'
+		name = process_avatar(_jpeg(exif=exif.tobytes()))
+		self.assertRegex(name, r'^avatars/[0-9a-f]{32}\.webp$')
+		with default_storage.open(name) as fh, Image.open(fh) as master:
+			self.assertEqual((master.format, master.size), ('WEBP', (200, 200)))
+			self.assertEqual(dict(master.getexif()), {})
+		for size in THUMBNAIL_SIZES:
+			with default_storage.open(name.replace('.webp', f'-{size}.webp')) as fh, Image.open(fh) as thumb:
+				self.assertEqual(thumb.size, (size, size))
+		# same bytes, same name
+		self.assertEqual(process_avatar(_jpeg(exif=exif.tobytes())), name)
+
+	def test_rejects_non_images(self):
+		with self.assertRaises(AvatarError):
+			process_avatar(SimpleUploadedFile('me.jpg', b'not an image', content_type='image/jpeg'))
+		buf = io.BytesIO()
+		Image.new('RGB', (10, 10)).save(buf, 'BMP')
+		with self.assertRaises(AvatarError):
+			process_avatar(SimpleUploadedFile('me.bmp', buf.getvalue()))
+
+	def test_rejects_oversized_and_downscales_large_jpegs_while_decoding(self):
+		from .avatars import MAX_PIXELS, _open
+		buf = io.BytesIO()
+		Image.new('RGB', (4097, 4096)).save(buf, 'PNG')
+		self.assertGreater(4097 * 4096, MAX_PIXELS)
+		with self.assertRaises(AvatarError):
+			process_avatar(SimpleUploadedFile('huge.png', buf.getvalue()))
+		# decoded at 1/4 scale: still at least MASTER_SIZE on the short side
+		self.assertEqual(_open(_jpeg(size=(2400, 2048))).size, (600, 512))
+
+	def test_profile_upload_serves_small_immutable_thumbnail(self):
+		resp = self.client.post('/profile/', {
+			'username': 'avataruser', 'email': 'avatar@example.com', 'avatar': _jpeg(),
+		})
+		self.assertEqual(resp.status_code, 302)
+		name = Profile.objects.get(user=self.user).avatar.name
+		thumb = '/media/' + name.replace('.webp', '-64.webp')
+		page = self.client.get('/history/')
+		self.assertContains(page, f'src="{thumb}"')
+		served = self.client.get(thumb)
+		self.assertEqual(served.status_code, 200)
+		self.assertEqual(served['Content-Type'], 'image/webp')
+		self.assertIn('immutable', served['Cache-Control'])
+		self.assertEqual(self.client.get('/media/avatars/' + 'f' * 32 + '-64.webp').status_code, 404)
+
+	def test_rejected_avatar_is_not_reported_as_success(self):
+		resp = self.client.post('/profile/', {
+			'username': 'avataruser', 'email': 'avatar@example.com',
+			'avatar': SimpleUploadedFile('me.jpg', b'not an image', content_type='image/jpeg'),
+		}, follow=True)
+		messages = [str(m) for m in resp.context['messages']]
+		self.assertNotIn('Profile updated successfully.', messages)
+		self.assertIn('Profile details updated; your avatar was not changed.', messages)
+		self.assertFalse(Profile.objects.filter(user=self.user).exclude(avatar='').exists())
+
+	def test_rebuild_avatars_converts_legacy_uploads(self):
+		legacy = default_storage.save('avatars/legacy.jpg', _jpeg())
+		Profile.objects.filter(user=self.user).update(avatar=legacy)
+		call_command('rebuild_avatars', stdout=io.StringIO())
+		self.assertRegex(Profile.objects.get(user=self.user).avatar.name, r'^avatars/[0-9a-f]{32}\.webp$')
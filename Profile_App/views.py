@@ -5,7 +5,22 @@ from django.contrib.auth.models import User
 from django.contrib.auth import update_session_auth_hash
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET
+from Dashboard_App.snapshot import invalidate_dashboard_snapshot
+from EcoTrack.days import default_timezone_name, forget_user_timezone, is_valid_timezone, timezone_names
+from .avatars import AVATAR_DIR, AvatarError, content_hash, process_avatar
 from .models import Profile
+from .profiles import get_profile
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Avatar files are named by their content, so browsers and CDNs may keep them for a year
+AVATAR_MAX_AGE = 365 * 24 * 60 * 60
+
 
 @login_required
 def profile(request):
@@ -25,6 +40,7 @@ def profile(request):
         current_password = request.POST.get('current_password', '')
         new_password = request.POST.get('new_password', '')
         confirm_new_password = request.POST.get('confirm_new_password', '')
+        tz_name = request.POST.get('timezone', '').strip()
         
         errors = []
         
@@ -44,6 +60,8 @@ def profile(request):
             errors.append('Username already exists.')
         if email and User.objects.filter(email=email).exclude(id=user.id).exists():
             errors.append('An account with this email already exists.')
+        if tz_name and not is_valid_timezone(tz_name):
+            errors.append('Please choose a valid timezone.')
         
         # Password change validation
         if new_password or confirm_new_password:
@@ -68,22 +86,54 @@ def profile(request):
                 user.set_password(new_password)
                 update_session_auth_hash(request, user)  # Keep user logged in after password change
             user.save()
+            # "today" (dashboard day, challenge day) starts at midnight in this zone
+            if 'timezone' in request.POST and tz_name != get_profile(user).timezone:
+                Profile.objects.update_or_create(user=user, defaults={'timezone': tz_name})
+                forget_user_timezone(user)
+                invalidate_dashboard_snapshot(user.id)
             # Handle avatar upload if provided
+            avatar_saved = True
             try:
-                profile, _ = Profile.objects.get_or_create(user=user)
                 avatar = request.FILES.get('avatar')
                 if avatar:
-                    profile.avatar = avatar
+                    name = process_avatar(avatar)
+                    # a missing profile row is only created when something is written to it
+                    profile, _ = Profile.objects.get_or_create(user=user)
+                    profile.avatar.name = name
                     profile.save()
+            except AvatarError as e:
+                avatar_saved = False
+                messages.error(request, str(e))
             except Exception:
                 # don't block profile update on avatar errors
-                pass
-            messages.success(request, 'Profile updated successfully.')
+                avatar_saved = False
+                logger.exception('Avatar upload failed for user %s', user.id)
+                messages.error(request, 'Your avatar could not be saved.')
+            if avatar_saved:
+                messages.success(request, 'Profile updated successfully.')
+            else:
+                messages.success(request, 'Profile details updated; your avatar was not changed.')
             return redirect('Profile_App:profile')
     
     # GET: Render form with current data
     context = {
         'user': user,
-        'profile': Profile.objects.get_or_create(user=user)[0],
+        'profile': get_profile(user),
+        'timezones': timezone_names(),
+        'default_timezone': default_timezone_name(),
     }
-    return render(request, 'Profile_App/profile.html', context)
\ No newline at end of file
+    return render(request, 'Profile_App/profile.html', context)
+
+
+@require_GET
+def avatar_file(request, name):
+    """Serve a content-addressed avatar file (see ``Profile_App.avatars``) with far-future caching."""
+    if content_hash(f'{AVATAR_DIR}/{name}') is None:
+        raise Http404('Not an avatar file')
+    try:
+        fh = default_storage.open(f'{AVATAR_DIR}/{name}', 'rb')
+    except (FileNotFoundError, OSError):
+        raise Http404('Avatar not found')
+    response = FileResponse(fh, content_type='image/webp')
+    patch_cache_control(response, public=True, max_age=AVATAR_MAX_AGE, immutable=True)
+    return response
@@ -8,6 +8,11 @@ pip install -r requirements.txt
 echo "==> Running migrations"
 python EcoTrack/manage.py makemigrations
 python EcoTrack/manage.py migrate --noinput
+python EcoTrack/manage.py createcachetable
+
+echo "==> Backfilling derived data"
+python EcoTrack/manage.py backfill_effective_dates
+python EcoTrack/manage.py backfill_daily_footprint --missing
 
 echo "==> Collecting static files"
 python EcoTrack/manage.py collectstatic --noinput